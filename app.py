@@ -1,6 +1,24 @@
-from flask import Flask, flash, render_template, request, redirect, url_for, session
-from datetime import datetime
+import click
+from flask import Flask, Response, flash, jsonify, render_template, request, redirect, url_for, session
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+import hashlib
+import json
+import time
+from werkzeug.http import is_resource_modified
+import cache
+import cambios_habitaciones
 import database
+import exportacion
+import importacion
+import metricas
+import migraciones
+import ocupacion
+import os
+import planificador
+import reportes
+import tablero
+import tarifas
 import logging
 from decimal import Decimal
 
@@ -9,9 +27,68 @@ from decimal import Decimal
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+logger_peticiones = logging.getLogger('peticiones')
+
 app = Flask(__name__)
 app.secret_key = 'clave_secreta_demo_2024'  # Cambiar en producción
 
+# METRICAS POR PETICION (consultas, Server-Timing y log estructurado)
+@app.before_request
+def iniciar_metricas():
+    metricas.iniciar_peticion()
+
+@app.after_request
+def registrar_metricas(respuesta):
+    ruta = f"{request.method} {request.url_rule.rule if request.url_rule else '<sin ruta>'}"
+    peticion, total_ms = metricas.terminar_peticion(ruta, respuesta.status_code)
+    if peticion is None:
+        return respuesta
+    respuesta.headers['Server-Timing'] = peticion.server_timing(total_ms)
+    logger_peticiones.info(json.dumps({
+        'ruta': ruta,
+        'path': request.path,
+        'estado': respuesta.status_code,
+        'duracion_ms': round(total_ms, 2),
+        'consultas': peticion.cantidad,
+        'db_ms': round(peticion.duracion_ms, 2),
+        'filas': peticion.filas,
+        'funciones': peticion.funciones_mas_lentas(),
+    }, ensure_ascii=False))
+    if logger_peticiones.isEnabledFor(logging.DEBUG):
+        logger_peticiones.debug(json.dumps({'path': request.path, 'detalle': peticion.consultas}, ensure_ascii=False))
+    return respuesta
+
+# CACHE DE ENTIDADES POR PETICION (un cliente o reserva se lee una vez por petición)
+@app.before_request
+def iniciar_cache_peticion():
+    cache.iniciar_peticion()
+
+@app.teardown_request
+def terminar_cache_peticion(error=None):
+    cache.terminar_peticion()
+
+# LECTURAS EN REPLICAS (después de escribir, la sesión lee del primario unos segundos)
+@app.before_request
+def leer_tras_escritura():
+    # El contexto del hilo se reutiliza entre peticiones: siempre se fija desde la sesión
+    database.fijar_primario_hasta(session.get('primario_hasta'))
+
+@app.after_request
+def recordar_escritura(respuesta):
+    hasta = database.primario_hasta()
+    if hasta > time.time() and hasta != session.get('primario_hasta'):
+        session['primario_hasta'] = hasta
+    return respuesta
+
+# PLANIFICADOR DE TRANSICIONES (PLANIFICADOR=hilo lo corre dentro de cada proceso web)
+PLANIFICADOR_EN_HILO = os.environ.get('PLANIFICADOR') == 'hilo'
+
+@app.before_request
+def iniciar_planificador():
+    # Se arranca con la primera petición para que cada worker lo cree después del fork
+    if PLANIFICADOR_EN_HILO:
+        planificador.iniciar_en_proceso()
+
 @app.route('/')
 def index():
     return redirect(url_for('admin_login'))
@@ -47,17 +124,9 @@ def admin_panel():
     
     # Obtener estadísticas básicas
     try:
-        clientes = database.listar_clientes()
-        reservas = database.listar_reservas()
-        habitaciones = database.listar_todas_habitaciones()
-        
-        stats = {
-            'total_clientes': len(clientes),
-            'total_reservas': len(reservas),
-            'total_habitaciones': len(habitaciones),
-            'habitaciones_disponibles': len([h for h in habitaciones if h['estado'] == 'disponible']),
-            'habitaciones_ocupadas': len([h for h in habitaciones if h['estado'] == 'ocupada'])
-        }
+        stats = database.obtener_estadisticas()
+        if not stats:
+            flash("Error al cargar estadísticas", "error")
         
         return render_template('admin_panel.html', stats=stats)
     except Exception as e:
@@ -65,6 +134,64 @@ def admin_panel():
         flash("Error al cargar estadísticas", "error")
         return render_template('admin_panel.html', stats={})
 
+# METRICAS DEL POOL DE CONEXIONES
+@app.route('/admin/pool')
+def admin_pool():
+    if not session.get('admin'):
+        return redirect(url_for('admin_login'))
+    return jsonify(database.estadisticas_pool())
+
+# HISTOGRAMAS DE CONSULTAS Y RUTAS
+@app.route('/admin/metrics')
+def admin_metricas():
+    if not session.get('admin'):
+        return redirect(url_for('admin_login'))
+    datos = metricas.resumen()
+    datos['pool'] = database.estadisticas_pool()
+    datos['cache'] = database.estadisticas_cache()
+    datos['bloqueos'] = database.estadisticas_bloqueos()
+    datos['replicas'] = database.estadisticas_replicas()
+    datos['planificador'] = planificador.estado()
+    datos['tablero'] = tablero.estado()
+    return jsonify(datos)
+
+# GRILLA DE OCUPACION (habitaciones x días u horas)
+@app.route('/admin/ocupacion')
+def admin_ocupacion():
+    if not session.get('admin'):
+        return redirect(url_for('admin_login'))
+
+    resolucion = request.args.get('resolucion', 'dia')
+    try:
+        desde = datetime.strptime(request.args['desde'], "%Y-%m-%d") if request.args.get('desde') else datetime.now()
+        dias = int(request.args.get('dias', 30))
+        inicio, columnas = ocupacion.ventana(desde, dias, resolucion)
+        habitaciones, reservas = database.reservas_para_ocupacion(inicio, inicio + timedelta(days=dias))
+        if reservas is None:
+            return jsonify({'error': "Error al consultar las reservas"}), 500
+        grilla = ocupacion.construir_grilla(habitaciones, reservas, inicio, columnas, resolucion)
+    except ValueError as e:
+        return jsonify({'error': f"Parámetros inválidos: {e}"}), 400
+    return jsonify(grilla.como_dict())
+
+# REPORTES DE INGRESOS Y OCUPACION (leen sólo el resumen diario)
+@app.route('/admin/reportes')
+def admin_reportes():
+    if not session.get('admin'):
+        return redirect(url_for('admin_login'))
+
+    try:
+        hasta = datetime.strptime(request.args['hasta'], "%Y-%m-%d") if request.args.get('hasta') else datetime.now() + timedelta(days=1)
+        desde = datetime.strptime(request.args['desde'], "%Y-%m-%d") if request.args.get('desde') else hasta - timedelta(days=30)
+        agrupacion = request.args.get('agrupar', 'dia')
+        datos = database.resumen_ingresos(reportes.como_fecha(desde), reportes.como_fecha(hasta), agrupacion,
+                                          request.args.get('tipo') or None)
+    except ValueError as e:
+        return jsonify({'error': f"Parámetros inválidos: {e}"}), 400
+    if datos is None:
+        return jsonify({'error': "Error al consultar el resumen"}), 500
+    return jsonify(datos)
+
 # LOGOUT
 @app.route('/logout')
 def logout():
@@ -119,8 +246,17 @@ def reservar_habitacion(id_cliente):
     if not session.get('admin'):
         return redirect(url_for('admin_login'))
 
+    # Cliente y búsqueda de disponibilidad son lecturas independientes: se ejecutan a la vez
+    tareas = {'cliente': (database.obtener_cliente, id_cliente)}
+    if (request.method == 'POST' and 'habitacion' not in request.form
+            and request.form.get('fecha_entrada', '').strip() and request.form.get('fecha_salida', '').strip()):
+        tareas['habitaciones'] = (database.listar_habitaciones_disponibles,
+                                  request.form.get('fecha_entrada', '').strip(),
+                                  request.form.get('fecha_salida', '').strip())
+    lecturas = database.ejecutar_en_paralelo(tareas)
+
     # Verificar que el cliente existe
-    cliente = database.obtener_cliente(id_cliente)
+    cliente = lecturas['cliente']
     if not cliente:
         flash("Cliente no encontrado", "error")
         return redirect(url_for('lista_clientes'))
@@ -158,53 +294,235 @@ def reservar_habitacion(id_cliente):
         # Si ya seleccionó habitación, confirmar reserva
         if 'habitacion' in request.form:
             id_habitacion = request.form['habitacion']
-            habitacion = database.obtener_habitacion(id_habitacion)
-            
-            if not habitacion:
-                error = "Habitación no encontrada"
-                habitaciones = database.listar_habitaciones_disponibles(fecha_entrada, fecha_salida)
+            porcentaje_anticipo = request.form.get('porcentaje_anticipo', '30').strip() or '30'
+
+            # Verificación, reserva y anticipo en una sola transacción
+            reserva = database.crear_reserva_con_anticipo(id_cliente, id_habitacion, fecha_entrada, fecha_salida, porcentaje_anticipo)
+            if reserva:
+                flash(f"Reserva confirmada para {cliente['nombre']} {cliente['apellido']}. Días: {reserva['dias']}, Total: ${reserva['monto_total']:,.2f}, Anticipo: ${reserva['monto_anticipo']:,.2f} ({reserva['porcentaje_anticipo']}%)", "success")
+                return redirect(url_for('lista_reservas'))
             else:
-                precio = float(habitacion['precio_por_noche'])
-                monto_total = dias * precio
-                
-                # Obtener porcentaje de anticipo
-                porcentaje_anticipo = float(request.form.get('porcentaje_anticipo', 30))
-                monto_anticipo = (monto_total * porcentaje_anticipo) / 100
-
-                reserva_id = database.reservar_habitacion(id_cliente, id_habitacion, fecha_entrada, fecha_salida, monto_total)
-                if reserva_id:
-                    anticipo_info = database.crear_anticipo(reserva_id, porcentaje_anticipo)
-                    if anticipo_info:
-                        flash(f"Reserva confirmada para {cliente['nombre']} {cliente['apellido']}. Días: {dias}, Total: ${monto_total:,.2f}, Anticipo: ${monto_anticipo:,.2f} ({porcentaje_anticipo}%)", "success")
-                    else:
-                        flash(f"Reserva confirmada para {cliente['nombre']} {cliente['apellido']}. Días: {dias}, Total: ${monto_total:,.2f}", "success")
-                    return redirect(url_for('lista_reservas'))
-                else:
-                    error = "Habitación no disponible en esas fechas"
-                    habitaciones = database.listar_habitaciones_disponibles(fecha_entrada, fecha_salida)
+                error = "Habitación no disponible en esas fechas"
+                habitaciones = database.listar_habitaciones_disponibles(fecha_entrada, fecha_salida)
         else:
-            # Solo buscar habitaciones disponibles
-            habitaciones = database.listar_habitaciones_disponibles(fecha_entrada, fecha_salida)
+            # Solo buscar habitaciones disponibles (ya consultadas junto con el cliente)
+            habitaciones = lecturas.get('habitaciones') or []
             if not habitaciones:
                 error = "No hay habitaciones disponibles para las fechas seleccionadas"
+        # Total de cada habitación con las tarifas vigentes, el mismo que se cobra al confirmar
+        habitaciones = database.cotizar_habitaciones(habitaciones or [], f1, f2)
 
     return render_template('reservar_habitacion.html', habitaciones=habitaciones, error=error, dias=dias, monto=monto, cliente=cliente)
 
 
+# RESERVA DE GRUPOS (varias habitaciones en una sola operación)
+def _precio_max():
+    valor = request.values.get('precio_max', '').strip()
+    return Decimal(valor) if valor else None
+
+@app.route('/habitaciones/grupo')
+def buscar_grupo():
+    if not session.get('admin'):
+        return redirect(url_for('admin_login'))
+    fecha_entrada = request.args.get('fecha_entrada', '').strip()
+    fecha_salida = request.args.get('fecha_salida', '').strip()
+    try:
+        resultado = database.buscar_habitaciones_grupo(fecha_entrada, fecha_salida,
+                                                       request.args.get('requisito', ''), _precio_max())
+    except (ValueError, ArithmeticError) as e:
+        return jsonify({'error': f"Parámetros inválidos: {e}"}), 400
+    return jsonify(resultado)
+
+# FECHAS FLEXIBLES ("3 noches cualquier día de noviembre")
+def _ventana_flexible():
+    """Primer y último día de entrada a partir de `mes` (AAAA-MM) o de `desde`/`hasta` (AAAA-MM-DD)"""
+    mes = request.args.get('mes', '').strip()
+    if mes:
+        desde = datetime.strptime(mes, "%Y-%m")
+        siguiente = (desde + timedelta(days=32)).replace(day=1)
+        return desde.date(), (siguiente - timedelta(days=1)).date()
+    desde = datetime.strptime(request.args['desde'], "%Y-%m-%d").date() if request.args.get('desde') else datetime.now().date()
+    hasta = datetime.strptime(request.args['hasta'], "%Y-%m-%d").date() if request.args.get('hasta') else desde + timedelta(days=30)
+    return desde, hasta
+
+@app.route('/habitaciones/flexible')
+def buscar_flexible():
+    if not session.get('admin'):
+        return redirect(url_for('admin_login'))
+    try:
+        desde, hasta = _ventana_flexible()
+        estadias = database.buscar_estadias_flexibles(
+            desde, hasta, int(request.args.get('noches', 1)), request.args.get('tipo', '').strip() or None,
+            request.args.get('orden', 'primera'), min(int(request.args.get('limite', 20)), 200))
+    except ValueError as e:
+        return jsonify({'error': f"Parámetros inválidos: {e}"}), 400
+    if estadias is None:
+        return jsonify({'error': "Error al consultar la disponibilidad"}), 500
+    formato = "%Y-%m-%dT%H:%M"
+    for e in estadias:
+        e['fecha_entrada'] = e['fecha_entrada'].strftime(formato)
+        e['fecha_salida'] = e['fecha_salida'].strftime(formato)
+        e['tramos'] = [[a.strftime(formato), b.strftime(formato)] for a, b in e['tramos']]
+    return jsonify({'desde': desde.isoformat(), 'hasta': hasta.isoformat(), 'estadias': estadias})
+
+@app.route('/reservar/<int:id_cliente>/grupo', methods=['GET', 'POST'])
+def reservar_grupo(id_cliente):
+    if not session.get('admin'):
+        return redirect(url_for('admin_login'))
+
+    cliente = database.obtener_cliente(id_cliente)
+    if not cliente:
+        flash("Cliente no encontrado", "error")
+        return redirect(url_for('lista_clientes'))
+
+    resultado = None
+    error = None
+    if request.method == 'POST':
+        fecha_entrada = request.form.get('fecha_entrada', '').strip()
+        fecha_salida = request.form.get('fecha_salida', '').strip()
+
+        # Si ya eligió un conjunto, reservarlo completo en una transacción
+        if request.form.get('habitaciones'):
+            ids = request.form['habitaciones'].split(',')
+            porcentaje_anticipo = request.form.get('porcentaje_anticipo', '30').strip() or '30'
+            reservas = database.crear_reserva_grupo(id_cliente, ids, fecha_entrada, fecha_salida, porcentaje_anticipo)
+            if reservas:
+                total = sum(r['monto_total'] for r in reservas)
+                anticipo = sum(r['monto_anticipo'] for r in reservas)
+                numeros = ", ".join(r['numero_habitacion'] for r in reservas)
+                flash(f"Reserva de grupo confirmada para {cliente['nombre']} {cliente['apellido']}. Habitaciones: {numeros}, Total: ${total:,.2f}, Anticipo: ${anticipo:,.2f}", "success")
+                return redirect(url_for('lista_reservas'))
+            error = "Alguna habitación del conjunto ya no está disponible; vuelva a buscar"
+
+        try:
+            resultado = database.buscar_habitaciones_grupo(fecha_entrada, fecha_salida,
+                                                           request.form.get('requisito', ''), _precio_max())
+            if not resultado['factible'] and not error:
+                faltan = ", ".join(f"{n} {tipo}" for tipo, n in resultado['faltantes'].items())
+                error = f"No hay suficientes habitaciones libres: faltan {faltan}"
+        except (ValueError, ArithmeticError) as e:
+            error = str(e) if isinstance(e, ValueError) else "Precio máximo inválido"
+
+    return render_template('reservar_grupo.html', cliente=cliente, resultado=resultado, error=error)
+
+
+# PARAMETROS DE LISTADOS (filtros + paginación por clave)
+LIMITE_PAGINA = 50
+LIMITE_PAGINA_MAXIMO = 500
+
+def _parametros_listado():
+    """Lee de la query string los filtros, el cursor y el tamaño de página de un listado"""
+    filtros = {}
+    for campo in ('desde', 'hasta'):
+        valor = request.args.get(campo, '').strip()
+        if valor:
+            try:
+                filtros[campo] = datetime.strptime(valor, "%Y-%m-%d")
+            except ValueError:
+                flash(f"Fecha '{valor}' inválida, use AAAA-MM-DD", "error")
+    estado = request.args.get('estado', '').strip()
+    if estado:
+        filtros['estado'] = estado
+    for campo, clave in (('habitacion', 'id_habitacion'), ('cliente', 'id_cliente')):
+        valor = request.args.get(campo, '').strip()
+        if valor.isdigit():
+            filtros[clave] = int(valor)
+        elif valor:
+            flash(f"El filtro {campo} debe ser un número", "error")
+    try:
+        limite = int(request.args.get('limite', LIMITE_PAGINA))
+    except ValueError:
+        limite = LIMITE_PAGINA
+    limite = min(max(limite, 1), LIMITE_PAGINA_MAXIMO)
+    return filtros, request.args.get('cursor') or None, limite
+
+def _parametros_sin_cursor():
+    """Query string actual sin el cursor, para armar los enlaces de paginación"""
+    return {k: v for k, v in request.args.items() if k != 'cursor' and v}
+
+@lru_cache(maxsize=None)
+def _huella_plantilla(*plantillas):
+    # Entra en el ETag para que un cambio de plantilla no se responda con 304
+    fuentes = (app.jinja_env.loader.get_source(app.jinja_env, p)[0] for p in plantillas)
+    return hashlib.sha1(''.join(fuentes).encode()).hexdigest()
+
+def _listado(nombre, tablas, cargar):
+    """Responde lista_<nombre>.html reutilizando la tabla renderizada mientras no cambien `tablas`.
+
+    `cargar` consulta la base y devuelve el contexto de tabla_<nombre>.html y el momento (epoch)
+    desde el que la tabla queda vieja aunque nadie escriba, o None. La tabla se guarda en la
+    caché con la versión de los datos y la query string en la clave; con la tabla guardada y el
+    ETag del navegador vigente se responde 304 sin consultar la base ni renderizar.
+
+    Sólo se guarda con versiones compartidas (DB_CACHE=sqlite): con la caché por proceso una
+    escritura de otro worker o de un comando flask no cambia la versión de este, y la tabla
+    guardada se serviría vieja hasta vencer. Sin guardarla se consulta y renderiza siempre, y el
+    ETag, calculado sobre la tabla recién armada, sigue evitando reenviar una página igual.
+    """
+    version = database.version_datos(*tablas) if database.cache_entidades.versiones_compartidas else None
+    clave = json.dumps([nombre, version, sorted(request.args.items(multi=True))]) if version is not None else None
+    # Con réplicas, una tabla guardada puede venir de una réplica atrasada: la sesión que acaba de
+    # escribir no la usa (lee del primario) y las que se arman desde una réplica duran poco
+    replicas = bool(database.obtener_replicas())
+    tras_escritura = replicas and time.time() < database.primario_hasta()
+    fragmento = database.cache_entidades.leer('fragmento', clave) if clave and not tras_escritura else None
+    if fragmento is None or (fragmento['vence'] and fragmento['vence'] <= time.time()):
+        contexto, vence = cargar()
+        if replicas and not tras_escritura:
+            vence = min(vence or float('inf'), time.time() + database.LEER_PRIMARIO_TRAS_ESCRITURA)
+        html = render_template(f'tabla_{nombre}.html', **contexto)
+        huella = _huella_plantilla(f'lista_{nombre}.html', f'tabla_{nombre}.html')
+        fragmento = {'html': html, 'generado': time.time(), 'vence': vence,
+                     'etag': hashlib.sha1(f"{huella}{request.query_string!r}{html}".encode()).hexdigest()}
+        # Sin filas puede ser un error de la base (las funciones de listado devuelven []): no se guarda
+        if clave and any(contexto.get(nombre)):
+            database.cache_entidades.guardar('fragmento', clave, fragmento,
+                                             ttl=vence - time.time() if vence else None)
+
+    # Last-Modified tiene resolución de segundos; los navegadores envían además If-None-Match, que manda
+    modificado = datetime.fromtimestamp(int(fragmento['generado']), timezone.utc)
+    if is_resource_modified(request.environ, etag=fragmento['etag'], last_modified=modificado):
+        respuesta = app.make_response(render_template(f'lista_{nombre}.html', tabla=fragmento['html']))
+    else:
+        respuesta = Response(status=304)
+    respuesta.set_etag(fragmento['etag'])
+    respuesta.last_modified = modificado
+    respuesta.headers['Cache-Control'] = 'private, no-cache'
+    respuesta.headers['Vary'] = 'Cookie'
+    return respuesta
 
 # LISTAR CLIENTES
 @app.route('/clientes')
 def lista_clientes():
     if not session.get('admin'):
         return redirect(url_for('admin_login'))
-    
+
+    def cargar():
+        filtros, cursor_pagina, limite = _parametros_listado()
+        pagina = database.pagina_clientes(filtros, cursor_pagina, limite)
+        return {'clientes': pagina['filas'], 'siguiente': pagina['siguiente'],
+                'parametros': _parametros_sin_cursor()}, None
     try:
-        clientes = database.listar_clientes()
-        return render_template('lista_clientes.html', clientes=clientes)
+        return _listado('clientes', ('clientes', 'reservas', 'habitaciones'), cargar)
     except Exception as e:
         logger.error(f"Error al listar clientes: {e}")
         flash("Error al cargar lista de clientes", "error")
-        return render_template('lista_clientes.html', clientes=[])
+        tabla = render_template('tabla_clientes.html', clientes=[], siguiente=None, parametros={})
+        return render_template('lista_clientes.html', tabla=tabla)
+
+# BUSCAR CLIENTES (mostrador: nombre, apellido, documento, email o teléfono)
+@app.route('/clientes/buscar')
+def buscar_clientes():
+    if not session.get('admin'):
+        return redirect(url_for('admin_login'))
+    try:
+        limite = min(max(int(request.args.get('limite', 10)), 1), 50)
+    except ValueError:
+        limite = 10
+    clientes = database.buscar_clientes(request.args.get('q', ''), limite)
+    for c in clientes:
+        c['url_reservar'] = url_for('reservar_habitacion', id_cliente=c['id_cliente'])
+    return jsonify({'clientes': clientes})
 
 # LISTAR RESERVAS
 @app.route('/reservas')
@@ -212,26 +530,60 @@ def lista_reservas():
     if not session.get('admin'):
         return redirect(url_for('admin_login'))
     
+    def cargar():
+        filtros, cursor_pagina, limite = _parametros_listado()
+        pagina = database.pagina_reservas(filtros, cursor_pagina, limite)
+        return {'reservas': pagina['filas'], 'siguiente': pagina['siguiente'],
+                'parametros': _parametros_sin_cursor()}, None
     try:
-        reservas = database.listar_reservas_con_anticipos()
-        return render_template('lista_reservas.html', reservas=reservas)
+        return _listado('reservas', ('reservas', 'clientes', 'habitaciones'), cargar)
     except Exception as e:
         logger.error(f"Error al listar reservas: {e}")
         flash("Error al cargar lista de reservas", "error")
-        return render_template('lista_reservas.html', reservas=[])
+        tabla = render_template('tabla_reservas.html', reservas=[], siguiente=None, parametros={})
+        return render_template('lista_reservas.html', tabla=tabla)
+
+# EXPORTACIONES (CSV o JSON-lines en streaming, con los filtros de los listados)
+@app.route('/admin/exportar/<nombre>')
+def exportar(nombre):
+    if not session.get('admin'):
+        return redirect(url_for('admin_login'))
+
+    formato = request.args.get('formato', 'csv')
+    filtros, _, _ = _parametros_listado()
+    comprimir = request.accept_encodings['gzip'] > 0
+    try:
+        cuerpo = exportacion.exportar(nombre, formato, filtros, gzip=comprimir)
+    except ValueError as e:
+        return jsonify({'error': f"Parámetros inválidos: {e}"}), 400
+    except Exception as e:
+        logger.error(f"Error al exportar {nombre}: {e}")
+        return jsonify({'error': "Error al consultar la base de datos"}), 500
+
+    respuesta = Response(cuerpo, content_type=exportacion.FORMATOS[formato])
+    archivo = f"{nombre}_{datetime.now():%Y%m%d_%H%M}.{formato}"
+    respuesta.headers['Content-Disposition'] = f'attachment; filename="{archivo}"'
+    respuesta.headers['Vary'] = 'Accept-Encoding'
+    if comprimir:
+        respuesta.headers['Content-Encoding'] = 'gzip'
+    return respuesta
 
 @app.route('/habitaciones')
 def lista_habitaciones():
     if not session.get('admin'):
         return redirect(url_for('admin_login'))
     
-    try:
+    def cargar():
         habitaciones = database.listar_todas_habitaciones()
-        return render_template('lista_habitaciones.html', habitaciones=habitaciones)
+        # Sólo se muestran las reservas que no terminaron: la tabla cambia con la primera salida
+        salidas = [r['fecha_salida'] for h in habitaciones for r in h['reservas']]
+        return {'habitaciones': habitaciones}, min(salidas).timestamp() if salidas else None
+    try:
+        return _listado('habitaciones', ('habitaciones', 'reservas'), cargar)
     except Exception as e:
         logger.error(f"Error al listar habitaciones: {e}")
         flash("Error al cargar lista de habitaciones", "error")
-        return render_template('lista_habitaciones.html', habitaciones=[])
+        return render_template('lista_habitaciones.html', tabla=render_template('tabla_habitaciones.html', habitaciones=[]))
 
 @app.route('/habitaciones/estado', methods=['GET', 'POST'])
 def cambiar_estado_habitaciones():
@@ -334,6 +686,239 @@ def modificar_precio():
 
     return redirect(url_for('lista_habitaciones'))
 
+# CAMBIO DE PRECIO Y ESTADO EN LOTE
+def _leer_cambio_en_lote():
+    """Filtro, regla de precio, estado y simulación desde el JSON o el formulario; lanza ValueError"""
+    if request.is_json:
+        datos = request.get_json(silent=True) or {}
+        return (cambios_habitaciones.leer_filtro(datos.get('filtro') or {}),
+                cambios_habitaciones.leer_regla_precio(datos.get('precio') or {}),
+                cambios_habitaciones.leer_estado(datos.get('estado')),
+                bool(datos.get('simular')))
+    filtro = {clave: request.form.get(clave) for clave in ('numeros', 'pisos', 'numero_desde', 'numero_hasta', 'todas')}
+    filtro['tipos'] = request.form.getlist('tipos')
+    precio = {
+        'modo': request.form.get('precio_modo'),
+        'valor': request.form.get('precio_valor'),
+        'precios': {clave[len('precio_tipo_'):]: valor for clave, valor in request.form.items()
+                    if clave.startswith('precio_tipo_')},
+    }
+    return (cambios_habitaciones.leer_filtro(filtro), cambios_habitaciones.leer_regla_precio(precio),
+            cambios_habitaciones.leer_estado(request.form.get('nuevo_estado')),
+            request.form.get('accion') != 'aplicar')
+
+def _tipos_de_habitacion():
+    return sorted({h['tipo'] for h in database.listar_habitaciones_basico()})
+
+@app.route('/habitaciones/lote', methods=['GET', 'POST'])
+def cambiar_habitaciones_en_lote():
+    if not session.get('admin'):
+        return redirect(url_for('admin_login'))
+
+    if request.method == 'GET':
+        return render_template('cambiar_habitaciones_lote.html', tipos=_tipos_de_habitacion(),
+                               estados=cambios_habitaciones.ESTADOS)
+
+    error = None
+    codigo = 200
+    resultado = None
+    simular = True
+    try:
+        filtro, regla_precio, estado, simular = _leer_cambio_en_lote()
+        if regla_precio is None and estado is None:
+            raise ValueError("Indique una regla de precio, un estado nuevo o ambos")
+        resultado = database.cambiar_habitaciones_en_lote(filtro, regla_precio, estado, simular=simular)
+        if resultado is None:
+            error, codigo = "Error al actualizar las habitaciones", 500
+    except ValueError as e:
+        error, codigo = f"Parámetros inválidos: {e}", 400
+
+    if request.is_json:
+        if error:
+            return jsonify({'error': error}), codigo
+        return jsonify({**resultado, 'simulado': simular})
+    if not error and not simular:
+        flash(f"{resultado['actualizadas']} habitaciones actualizadas", "success")
+    return render_template('cambiar_habitaciones_lote.html', tipos=_tipos_de_habitacion(), estados=cambios_habitaciones.ESTADOS,
+                           resultado=resultado, simulado=simular, error=error)
+
+# TABLERO EN VIVO (habitaciones y reservas por Server-Sent Events)
+@app.route('/habitaciones/tablero')
+def tablero_habitaciones():
+    if not session.get('admin'):
+        return redirect(url_for('admin_login'))
+    habitaciones = database.listar_habitaciones_basico()
+    return render_template('tablero_habitaciones.html', habitaciones=habitaciones)
+
+@app.route('/habitaciones/tablero/eventos')
+def tablero_eventos():
+    if not session.get('admin'):
+        return redirect(url_for('admin_login'))
+    # El navegador manda Last-Event-ID al reconectarse; ?desde= sirve para clientes sin EventSource
+    desde = request.headers.get('Last-Event-ID') or request.args.get('desde')
+    try:
+        desde = int(desde) if desde else None
+    except ValueError:
+        return jsonify({'error': f"Parámetros inválidos: desde={desde!r}"}), 400
+    flujo = tablero.difusor_del_proceso().flujo(desde)
+    return Response(flujo, mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+# IMPORTACION MASIVA DE RESERVAS
+@app.route('/admin/importar', methods=['GET', 'POST'])
+def importar_reservas():
+    if not session.get('admin'):
+        return redirect(url_for('admin_login'))
+
+    if request.method == 'POST':
+        archivo = request.files.get('archivo')
+        if not archivo or not archivo.filename:
+            return render_template('importar_reservas.html', error="Seleccione un archivo CSV o JSON")
+        formato = 'json' if archivo.filename.lower().endswith(('.json', '.jsonl')) else 'csv'
+        try:
+            filas = importacion.leer_filas(archivo.read(), formato)
+            resultado = importacion.importar(filas)
+            flash(f"Importación terminada: {resultado['resumen']}", "success")
+            return render_template('importar_reservas.html', resultado=resultado)
+        except (ValueError, UnicodeDecodeError) as e:
+            return render_template('importar_reservas.html', error=f"Archivo inválido: {e}")
+        except Exception as e:
+            logger.error(f"Error al importar reservas: {e}")
+            return render_template('importar_reservas.html', error="Error interno al importar")
+
+    return render_template('importar_reservas.html')
+
+# COMANDOS DE MANTENIMIENTO (flask --app app <comando>)
+@app.cli.command('importar-reservas')
+@click.argument('archivo', type=click.Path(exists=True, dir_okay=False))
+@click.option('--formato', type=click.Choice(['csv', 'json']), default=None, help="Por defecto según la extensión")
+@click.option('--lote', default=500, show_default=True, help="Reservas por transacción")
+@click.option('--salida', type=click.Path(dir_okay=False), default=None, help="Archivo JSON con el resultado por fila")
+def importar_reservas_comando(archivo, formato, lote, salida):
+    """Importa clientes y reservas desde un archivo CSV o JSON"""
+    formato = formato or ('json' if archivo.lower().endswith(('.json', '.jsonl')) else 'csv')
+    with open(archivo, 'rb') as f:
+        filas = importacion.leer_filas(f.read(), formato)
+    try:
+        resultado = importacion.importar(filas, lote=lote)
+    except RuntimeError as e:
+        raise click.ClickException(str(e))
+    if salida:
+        with open(salida, 'w', encoding='utf-8') as f:
+            json.dump(resultado, f, ensure_ascii=False, indent=2)
+    else:
+        for fila in resultado['resultados']:
+            if fila['estado'] not in ('importada', 'cliente'):
+                click.echo(f"Fila {fila['fila']}: {fila['estado']} - {fila['mensaje']}")
+    click.echo(f"{len(filas)} filas procesadas: {resultado['resumen']}")
+
+@app.cli.command('exportar')
+@click.argument('nombre', type=click.Choice(database.EXPORTACIONES))
+@click.argument('salida', type=click.Path(dir_okay=False))
+@click.option('--formato', type=click.Choice(list(exportacion.FORMATOS)), default='csv', show_default=True)
+@click.option('--gzip', 'comprimir', is_flag=True, help="Comprime la salida en gzip")
+def exportar_comando(nombre, salida, formato, comprimir):
+    """Exporta reservas, clientes o anticipos a un archivo sin cargarlos en memoria"""
+    try:
+        cuerpo = exportacion.exportar(nombre, formato, gzip=comprimir)
+        with open(salida, 'wb') as f:
+            for bloque in cuerpo:
+                f.write(bloque)
+    except Exception as e:
+        raise click.ClickException(f"Error al exportar {nombre}: {e}")
+    click.echo(f"{nombre} exportadas en {salida}")
+
+@app.cli.command('reconstruir-indice')
+def reconstruir_indice_comando():
+    """Recarga el índice de disponibilidad desde la base de datos"""
+    if not database.reconstruir_indice_disponibilidad():
+        raise click.ClickException("No se pudo reconstruir el índice de disponibilidad")
+    click.echo("Índice de disponibilidad reconstruido")
+
+@app.cli.command('verificar-indice')
+def verificar_indice_comando():
+    """Compara el índice de disponibilidad con la base de datos"""
+    diferencias = database.verificar_indice_disponibilidad()
+    if diferencias is None:
+        raise click.ClickException("No se pudo consultar la base de datos")
+    for diferencia in diferencias:
+        click.echo(diferencia)
+    if diferencias:
+        raise click.ClickException(f"{len(diferencias)} diferencias entre el índice y la base de datos")
+    click.echo("Índice de disponibilidad consistente")
+
+@app.cli.command('migrar')
+@click.option('--hasta', type=int, default=None, help="Última versión a aplicar (por defecto todas)")
+def migrar_comando(hasta):
+    """Crea o actualiza el esquema aplicando las migraciones pendientes"""
+    aplicadas = migraciones.migrar(hasta)
+    click.echo(f"Migraciones aplicadas: {aplicadas}" if aplicadas else "El esquema ya está al día")
+
+@app.cli.command('revertir')
+@click.option('--hasta', type=int, required=True, help="Versión que queda aplicada (0 borra todo el esquema)")
+def revertir_comando(hasta):
+    """Revierte las migraciones posteriores a la versión indicada"""
+    revertidas = migraciones.revertir(hasta)
+    click.echo(f"Migraciones revertidas: {revertidas}" if revertidas else "Nada que revertir")
+
+@app.cli.command('estado-migraciones')
+def estado_migraciones_comando():
+    """Muestra qué migraciones están aplicadas"""
+    for version, descripcion, aplicada in migraciones.estado():
+        click.echo(f"{version:>3}  {'aplicada ' if aplicada else 'pendiente'}  {descripcion}")
+
+@app.cli.command('verificar-consultas')
+def verificar_consultas_comando():
+    """Ejecuta EXPLAIN sobre las consultas de database.py y falla si alguna recorre una tabla completa"""
+    problemas = migraciones.verificar_planes()
+    for problema in problemas:
+        click.echo(f"{problema['funcion']}: {problema['detalle']}")
+    if problemas:
+        raise click.ClickException(f"{len(problemas)} consultas sin índice utilizable")
+    click.echo("Todas las consultas usan índices")
+
+@app.cli.command('recalcular-resumen')
+@click.option('--desde', type=click.DateTime(formats=['%Y-%m-%d']), default=None, help="Primera fecha (por defecto todo)")
+@click.option('--hasta', type=click.DateTime(formats=['%Y-%m-%d']), default=None, help="Fecha siguiente a la última")
+def recalcular_resumen_comando(desde, hasta):
+    """Reconstruye el resumen diario de ingresos y ocupación desde reservas, anticipos y pagos"""
+    filas = database.recalcular_resumen(desde, hasta)
+    if filas is None:
+        raise click.ClickException("No se pudo recalcular el resumen diario")
+    click.echo(f"Resumen diario recalculado: {filas} filas")
+
+@app.cli.command('cargar-tarifas')
+@click.argument('archivo', type=click.Path(exists=True, dir_okay=False))
+def cargar_tarifas_comando(archivo):
+    """Reemplaza las tarifas y descuentos por estadía con los de un archivo JSON"""
+    with open(archivo, encoding='utf-8') as f:
+        datos = json.load(f)
+    try:
+        reglas = [tarifas.leer_regla(regla) for regla in datos.get('reglas', [])]
+        descuentos = [tarifas.leer_descuento(descuento) for descuento in datos.get('descuentos', [])]
+    except (ValueError, TypeError) as e:
+        raise click.ClickException(f"Tarifas inválidas: {e}")
+    if not database.guardar_tarifas(reglas, descuentos):
+        raise click.ClickException("No se pudieron guardar las tarifas")
+    click.echo(f"Tarifas cargadas: {len(reglas)} reglas, {len(descuentos)} descuentos")
+
+@app.cli.command('planificador')
+@click.option('--una-vez', is_flag=True, help="Aplica las transiciones pendientes y termina (para cron)")
+def planificador_comando(una_vez):
+    """Aplica las entradas, salidas y vencimientos de reservas a su hora"""
+    if una_vez:
+        resultado = database.aplicar_transiciones()
+        if resultado is None:
+            raise click.ClickException("No se pudieron aplicar las transiciones")
+        click.echo(f"Transiciones aplicadas: {resultado}")
+        return
+    click.echo("Planificador en marcha (Ctrl+C para detener)")
+    try:
+        # Los índices en memoria son de cada proceso web; aquí sólo corre la purga de cambios
+        planificador.Planificador({'cambios': (planificador.PURGA_CAMBIOS, database.purgar_cambios)}).bucle()
+    except KeyboardInterrupt:
+        click.echo("Planificador detenido")
+
 
 if __name__ == '__main__':
     app.run(debug=True)
@@ -0,0 +1,104 @@
+"""Compara listar_todas_habitaciones consultando por habitación (N+1) contra la carga por lotes.
+
+Uso: python -m benchmarks.bench_habitaciones [--escalas 100 1000 10000] [--latencia-ms 0.2]
+"""
+import argparse
+from datetime import datetime, timedelta
+from decimal import Decimal
+import json
+import random
+import statistics
+import time
+
+import database
+from benchmarks.sqlite_local import BaseLocal
+
+
+def poblar(base, habitaciones, reservas_por_habitacion=3, semilla=1):
+    azar = random.Random(semilla)
+    conn = base.conectar()
+    cursor = conn.cursor()
+    cursor.execute("INSERT INTO clientes (nombre, apellido, dni_pasaporte_cpf) VALUES ('Ana', 'Gómez', '30111222')")
+    id_cliente = cursor.lastrowid
+    cursor.executemany(
+        "INSERT INTO habitaciones (numero_habitacion, tipo, precio_por_noche, estado) VALUES (%s, %s, %s, %s)",
+        [(f"{i:05d}", azar.choice(['simple', 'doble', 'suite']), Decimal('40000.00'), 'disponible')
+         for i in range(1, habitaciones + 1)])
+    ahora = datetime.now().replace(second=0, microsecond=0)
+    filas = []
+    for id_habitacion in range(1, habitaciones + 1):
+        entrada = ahora + timedelta(days=azar.randint(1, 10))
+        for _ in range(reservas_por_habitacion):
+            salida = entrada + timedelta(days=azar.randint(1, 5))
+            filas.append((id_cliente, id_habitacion, entrada, salida, Decimal('80000.00')))
+            entrada = salida + timedelta(days=azar.randint(0, 7))
+    cursor.executemany(
+        "INSERT INTO reservas (id_cliente, id_habitacion, fecha_entrada, fecha_salida, monto) VALUES (%s, %s, %s, %s, %s)",
+        filas)
+    conn.commit()
+    cursor.close()
+    conn.close()
+
+
+def listar_n_mas_1():
+    """Implementación anterior: una consulta de reservas por cada habitación"""
+    conn = database.conectar()
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute("SELECT * FROM habitaciones ORDER BY numero_habitacion")
+        habitaciones = cursor.fetchall()
+        for hab in habitaciones:
+            cursor.execute("""
+                SELECT fecha_entrada, fecha_salida, estado
+                FROM reservas
+                WHERE id_habitacion = %s
+                  AND fecha_salida >= NOW()
+                  AND estado = 'confirmada'
+                ORDER BY fecha_entrada
+            """, (hab['id'],))
+            hab['reservas'] = cursor.fetchall()
+        return habitaciones
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def medir(base, funcion, repeticiones):
+    tiempos = []
+    consultas = 0
+    for _ in range(repeticiones):
+        base.contador.reiniciar()
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append(time.perf_counter() - inicio)
+        consultas = base.contador.consultas
+    return {'consultas': consultas, 'mediana_ms': round(statistics.median(tiempos) * 1000, 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--escalas', type=int, nargs='+', default=[100, 1000, 10000])
+    parser.add_argument('--latencia-ms', type=float, default=0.2,
+                        help="latencia simulada por viaje a la base (red local a MySQL)")
+    parser.add_argument('--repeticiones', type=int, default=3)
+    args = parser.parse_args()
+
+    resultados = []
+    for habitaciones in args.escalas:
+        base = BaseLocal(latencia=args.latencia_ms / 1000)
+        try:
+            poblar(base, habitaciones)
+            database.configurar_pool(fabrica=base.conectar, minimo=1, maximo=2)
+            antes = medir(base, listar_n_mas_1, args.repeticiones)
+            despues = medir(base, database.listar_todas_habitaciones, args.repeticiones)
+            resultados.append({'habitaciones': habitaciones, 'n_mas_1': antes, 'por_lotes': despues})
+            print(f"{habitaciones:>6} habitaciones | N+1: {antes['consultas']:>6} consultas {antes['mediana_ms']:>9} ms"
+                  f" | por lotes: {despues['consultas']:>2} consultas {despues['mediana_ms']:>9} ms")
+        finally:
+            database.obtener_pool().cerrar_todas()
+            base.eliminar()
+    print(json.dumps(resultados, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""Compara la grilla de ocupación vectorizada (NumPy), el respaldo con bytearray y un bucle por noche.
+
+Uso: python -m benchmarks.bench_ocupacion [--habitaciones 1000] [--dias 365]
+"""
+import argparse
+from datetime import datetime
+import json
+import random
+import statistics
+import time
+
+import ocupacion
+
+
+def intervalos_sinteticos(habitaciones, dias, semilla=1):
+    """Estadías consecutivas por habitación como (id, segundos de entrada, segundos de salida)"""
+    azar = random.Random(semilla)
+    intervalos = []
+    for id_habitacion in range(1, habitaciones + 1):
+        t = -azar.randint(0, 5) * 86400
+        while t < dias * 86400:
+            entrada = t + azar.randint(0, 72) * 3600
+            salida = entrada + azar.randint(1, 7) * 86400 - 4 * 3600
+            intervalos.append((id_habitacion, entrada, salida))
+            t = salida
+    return intervalos
+
+
+def grilla_con_bucles(habitaciones, intervalos, desde, dias):
+    """Implementación directa: recorre cada noche de cada reserva"""
+    posicion = {h['id']: i for i, h in enumerate(habitaciones)}
+    filas = [[0] * dias for _ in habitaciones]
+    for id_habitacion, entrada, salida in intervalos:
+        for k in range(dias):
+            medianoche = (k + 1) * 86400
+            if entrada <= medianoche < salida:
+                filas[posicion[id_habitacion]][k] = 1
+    return filas
+
+
+def medir(funcion, repeticiones):
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    return round(statistics.median(tiempos) * 1000, 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--habitaciones', type=int, default=1000)
+    parser.add_argument('--dias', type=int, default=365)
+    parser.add_argument('--repeticiones', type=int, default=5)
+    parser.add_argument('--bucles', action='store_true', help="incluir la versión con bucles (lenta)")
+    args = parser.parse_args()
+
+    desde = datetime(2025, 1, 1)
+    habitaciones = [{'id': i, 'numero_habitacion': str(i), 'tipo': 'doble', 'estado': 'disponible'}
+                    for i in range(1, args.habitaciones + 1)]
+    intervalos = intervalos_sinteticos(args.habitaciones, args.dias)
+    resultado = {'habitaciones': args.habitaciones, 'dias': args.dias, 'reservas': len(intervalos)}
+
+    numpy = ocupacion.np
+    if numpy is not None:
+        resultado['numpy_ms'] = medir(lambda: ocupacion.construir_grilla(habitaciones, intervalos, desde, args.dias),
+                                      args.repeticiones)
+    ocupacion.np = None
+    try:
+        resultado['bytearray_ms'] = medir(lambda: ocupacion.construir_grilla(habitaciones, intervalos, desde, args.dias),
+                                          args.repeticiones)
+    finally:
+        ocupacion.np = numpy
+    if args.bucles:
+        resultado['bucles_ms'] = medir(lambda: grilla_con_bucles(habitaciones, intervalos, desde, args.dias), 1)
+    print(json.dumps(resultado, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,187 @@
+"""Carga concurrente de reservas: muchos hilos reservan a la vez las mismas habitaciones y otras distintas.
+
+Reporta reservas por segundo, rechazos, errores, reintentos por bloqueo y, al final, cuántos pares
+de reservas confirmadas se superponen en una misma habitación (tiene que ser cero).
+
+Con --tipos uno todas las habitaciones son del mismo tipo y las reservas que comparten noches se
+esperan en las filas (fecha, tipo) de resumen_diario aunque sean de habitaciones distintas; con
+--tipos distintos cada habitación tiene su tipo y esa espera desaparece. La diferencia entre las dos
+corridas en modo distintas es lo que cuesta actualizar el resumen dentro de la transacción.
+
+Uso: python -m benchmarks.carga_concurrente [--hilos 16] [--segundos 10] [--modo mixto] [--tipos uno] [--latencia-ms 0.3]
+     python -m benchmarks.carga_concurrente --mysql   # contra la base de DB_HOST/DB_NAME (sólo una base de prueba)
+
+Con SQLite una transacción de escritura bloquea toda la base: las reservas quedan en fila aunque sean de
+habitaciones distintas. El bloqueo por habitación sólo se nota contra MySQL.
+"""
+import argparse
+from datetime import datetime, timedelta
+from decimal import Decimal
+import json
+import logging
+import random
+import statistics
+import threading
+import time
+
+import database
+from benchmarks.sqlite_local import BaseLocal
+
+MODOS = ('mismas', 'distintas', 'mixto')
+TIPOS = ('uno', 'distintos')
+FUNCIONES = {
+    'anticipo': lambda cliente, habitacion, entrada, salida: database.crear_reserva_con_anticipo(
+        cliente, habitacion, entrada, salida, '30'),
+    'simple': lambda cliente, habitacion, entrada, salida: database.reservar_habitacion(
+        cliente, habitacion, entrada, salida, Decimal('100.00')),
+}
+
+
+def poblar(conn, habitaciones, clientes, prefijo, tipos='uno'):
+    """Crea las habitaciones y clientes de la corrida; devuelve sus ids"""
+    cursor = conn.cursor()
+    ids_habitacion = []
+    for i in range(habitaciones):
+        tipo = 'doble' if tipos == 'uno' else f"{prefijo}-{i:03d}"
+        cursor.execute(
+            "INSERT INTO habitaciones (numero_habitacion, tipo, precio_por_noche, estado) VALUES (%s, %s, %s, %s)",
+            (f"{prefijo}{i:03d}", tipo, Decimal('100.00'), 'disponible'))
+        ids_habitacion.append(cursor.lastrowid)
+    ids_cliente = []
+    for i in range(clientes):
+        cursor.execute("INSERT INTO clientes (nombre, apellido, dni_pasaporte_cpf) VALUES (%s, %s, %s)",
+                       ('Carga', f"Hilo {i}", f"{prefijo}{i:06d}"))
+        ids_cliente.append(cursor.lastrowid)
+    conn.commit()
+    cursor.close()
+    return ids_habitacion, ids_cliente
+
+
+def contar_superpuestas(conn, ids_habitacion):
+    """Pares de reservas confirmadas de la misma habitación cuyos horarios se pisan"""
+    cursor = conn.cursor()
+    cursor.execute(f"""
+        SELECT COUNT(*)
+        FROM reservas a
+        JOIN reservas b ON b.id_habitacion = a.id_habitacion AND b.id > a.id
+        WHERE a.id_habitacion IN ({', '.join(['%s'] * len(ids_habitacion))})
+          AND a.estado = 'confirmada' AND b.estado = 'confirmada'
+          AND a.fecha_entrada < b.fecha_salida AND b.fecha_entrada < a.fecha_salida
+    """, tuple(ids_habitacion))
+    superpuestas = cursor.fetchone()[0]
+    cursor.close()
+    return superpuestas
+
+
+class Trabajador(threading.Thread):
+    """Reserva estadías al azar hasta la hora de fin; cuenta resultados y latencias"""
+
+    def __init__(self, numero, args, disputadas, propia, id_cliente, fin):
+        super().__init__(name=f"carga-{numero}", daemon=True)
+        self.azar = random.Random(args.semilla + numero)
+        self.args = args
+        self.disputadas = disputadas
+        self.propia = propia
+        self.id_cliente = id_cliente
+        self.fin = fin
+        self.reservar = FUNCIONES[args.funcion]
+        self.resultados = {'reservas': 0, 'rechazadas': 0, 'errores': 0}
+        self.latencias = []
+
+    def elegir_habitacion(self):
+        modo = self.args.modo
+        if modo == 'mismas' or (modo == 'mixto' and self.azar.random() < 0.5):
+            return self.azar.choice(self.disputadas)
+        return self.propia
+
+    def run(self):
+        manana = (datetime.now() + timedelta(days=1)).replace(hour=14, minute=0, second=0, microsecond=0)
+        while time.monotonic() < self.fin:
+            entrada = manana + timedelta(days=self.azar.randrange(self.args.dias))
+            salida = entrada + timedelta(days=self.azar.randint(1, 3), hours=-3)
+            inicio = time.perf_counter()
+            resultado = self.reservar(self.id_cliente, self.elegir_habitacion(),
+                                      entrada.strftime("%Y-%m-%dT%H:%M"), salida.strftime("%Y-%m-%dT%H:%M"))
+            self.latencias.append(time.perf_counter() - inicio)
+            if resultado is None:
+                self.resultados['errores'] += 1
+            elif resultado is False:
+                self.resultados['rechazadas'] += 1
+            else:
+                self.resultados['reservas'] += 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--hilos', type=int, default=16)
+    parser.add_argument('--segundos', type=float, default=10)
+    parser.add_argument('--modo', choices=MODOS, default='mixto',
+                        help="mismas: todos sobre --disputadas habitaciones; distintas: una por hilo; mixto: mitad y mitad")
+    parser.add_argument('--disputadas', type=int, default=2, help="habitaciones que comparten todos los hilos")
+    parser.add_argument('--tipos', choices=TIPOS, default='uno',
+                        help="uno: todas del mismo tipo (comparten las filas de resumen_diario); distintos: un tipo por habitación")
+    parser.add_argument('--dias', type=int, default=1000, help="ventana de fechas de entrada (más días, menos rechazos)")
+    parser.add_argument('--funcion', choices=sorted(FUNCIONES), default='anticipo')
+    parser.add_argument('--latencia-ms', type=float, default=0.0, help="latencia simulada por viaje a SQLite")
+    parser.add_argument('--mysql', action='store_true', help="usar la base configurada en el entorno")
+    parser.add_argument('--semilla', type=int, default=1)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    base = None
+    if args.mysql:
+        database.configurar_pool(maximo=args.hilos + 1)
+    else:
+        base = BaseLocal(latencia=args.latencia_ms / 1000)
+        database.configurar_pool(fabrica=base.conectar, minimo=1, maximo=args.hilos + 1)
+    # Prefijo propio de la corrida para no chocar con habitaciones y clientes que ya existan
+    prefijo = f"C{random.randrange(36 ** 4):04x}"
+    conn = database.conectar()
+    try:
+        ids_habitacion, ids_cliente = poblar(conn, args.disputadas + args.hilos, args.hilos, prefijo, args.tipos)
+        disputadas, propias = ids_habitacion[:args.disputadas], ids_habitacion[args.disputadas:]
+
+        fin = time.monotonic() + args.segundos
+        trabajadores = [Trabajador(i, args, disputadas, propias[i], ids_cliente[i], fin) for i in range(args.hilos)]
+        bloqueos_antes = database.estadisticas_bloqueos()
+        inicio = time.perf_counter()
+        for trabajador in trabajadores:
+            trabajador.start()
+        for trabajador in trabajadores:
+            trabajador.join()
+        duracion = time.perf_counter() - inicio
+        bloqueos = database.estadisticas_bloqueos()
+
+        totales = {clave: sum(t.resultados[clave] for t in trabajadores) for clave in ('reservas', 'rechazadas', 'errores')}
+        latencias = sorted(l for t in trabajadores for l in t.latencias)
+        intentos = len(latencias)
+        cortes = statistics.quantiles(latencias, n=100, method='inclusive') if intentos > 1 else latencias * 99
+        resultado = {
+            'motor': 'mysql' if args.mysql else 'sqlite',
+            'modo': args.modo,
+            'funcion': args.funcion,
+            'tipos': args.tipos,
+            'hilos': args.hilos,
+            'segundos': round(duracion, 2),
+            'intentos': intentos,
+            **totales,
+            'reservas_por_segundo': round(totales['reservas'] / duracion, 1),
+            'intentos_por_segundo': round(intentos / duracion, 1),
+            'p50_ms': round(cortes[49] * 1000, 2) if cortes else None,
+            'p95_ms': round(cortes[94] * 1000, 2) if cortes else None,
+            'reintentos': bloqueos['reintentos'] - bloqueos_antes['reintentos'],
+            'agotados': bloqueos['agotados'] - bloqueos_antes['agotados'],
+            'superpuestas': contar_superpuestas(conn, ids_habitacion),
+        }
+    finally:
+        conn.close()
+        if base:
+            database.obtener_pool().cerrar_todas()
+            base.eliminar()
+    print(json.dumps(resultado, indent=2))
+    if resultado['superpuestas']:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
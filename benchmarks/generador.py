@@ -0,0 +1,214 @@
+"""Generador reproducible de datos de hotel: habitaciones, clientes, años de reservas, pagos y anticipos.
+
+Uso: python -m benchmarks.generador --reservas 100000 [--semilla 1] [--ruta hotel.sqlite3]
+"""
+import argparse
+from datetime import datetime, timedelta
+from decimal import Decimal, ROUND_HALF_UP
+import math
+import random
+import time
+
+from benchmarks.sqlite_local import BaseLocal
+
+CENTAVOS = Decimal('0.01')
+
+# tipo: (proporción de habitaciones, precio base por noche)
+TIPOS = {
+    'simple': (0.35, Decimal('35000')),
+    'doble': (0.40, Decimal('52000')),
+    'triple': (0.10, Decimal('68000')),
+    'suite': (0.10, Decimal('120000')),
+    'presidencial': (0.05, Decimal('250000')),
+}
+ESTADOS_HABITACION = ['disponible'] * 18 + ['mantenimiento', 'ocupada']
+METODOS_PAGO = ['efectivo', 'tarjeta', 'transferencia']
+PORCENTAJES_ANTICIPO = [Decimal('20'), Decimal('30'), Decimal('30'), Decimal('50'), Decimal('100')]
+NOMBRES = ['Ana', 'Juan', 'María', 'Carlos', 'Lucía', 'Pedro', 'Sofía', 'Diego', 'Valentina', 'Martín',
+           'Camila', 'Jorge', 'Florencia', 'Pablo', 'Julieta', 'Andrés', 'Paula', 'Tomás', 'Elena', 'Raúl']
+APELLIDOS = ['Gómez', 'Rodríguez', 'Fernández', 'López', 'Martínez', 'Pérez', 'García', 'Sánchez',
+             'Romero', 'Díaz', 'Álvarez', 'Torres', 'Ruiz', 'Ramírez', 'Flores', 'Benítez', 'Acosta', 'Silva']
+CIUDADES = ['Buenos Aires', 'Córdoba', 'Rosario', 'Mendoza', 'Montevideo', 'São Paulo', 'Santiago', 'Asunción']
+
+# Ocupación media: reservas por habitación y por año
+RESERVAS_POR_HABITACION_ANIO = 90
+LOTE = 10000
+
+
+def dimensiones(reservas, anios=3):
+    """Cantidad de habitaciones y clientes proporcional al volumen de reservas"""
+    habitaciones = max(10, math.ceil(reservas / (anios * RESERVAS_POR_HABITACION_ANIO)))
+    clientes = max(20, reservas // 3)
+    return habitaciones, clientes
+
+
+def _insertar_en_lotes(conn, sql, filas):
+    cursor = conn.cursor()
+    lote = []
+    total = 0
+    for fila in filas:
+        lote.append(fila)
+        if len(lote) >= LOTE:
+            cursor.executemany(sql, lote)
+            total += len(lote)
+            lote = []
+    if lote:
+        cursor.executemany(sql, lote)
+        total += len(lote)
+    conn.commit()
+    cursor.close()
+    return total
+
+
+def _habitaciones(azar, cantidad):
+    tipos = list(TIPOS)
+    pesos = [TIPOS[t][0] for t in tipos]
+    por_piso = 20
+    for i in range(cantidad):
+        tipo = azar.choices(tipos, pesos)[0]
+        precio = (TIPOS[tipo][1] * Decimal(azar.randint(90, 115)) / 100).quantize(Decimal('100'))
+        numero = f"{i // por_piso + 1}{i % por_piso + 1:02d}"
+        yield (i + 1, numero, tipo, precio, azar.choice(ESTADOS_HABITACION))
+
+
+def _clientes(azar, cantidad, inicio):
+    for i in range(cantidad):
+        nombre = azar.choice(NOMBRES)
+        apellido = azar.choice(APELLIDOS)
+        registro = inicio + timedelta(minutes=azar.randint(0, 60 * 24 * 365))
+        yield (i + 1, nombre, apellido, str(20000000 + i), f"11{azar.randint(40000000, 69999999)}",
+               f"{nombre.lower()}.{apellido.lower()}{i}@correo.com",
+               f"Calle {azar.randint(1, 9999)}, {azar.choice(CIUDADES)}", registro)
+
+
+def _reservas(azar, habitaciones, clientes, cantidad, inicio, fin, ahora):
+    """Reservas sin solapamiento por habitación, repartidas entre inicio y fin.
+
+    Devuelve (reservas, pagos, anticipos) como generadores que comparten el mismo recorrido.
+    """
+    por_habitacion = [cantidad // len(habitaciones)] * len(habitaciones)
+    for i in range(cantidad % len(habitaciones)):
+        por_habitacion[i] += 1
+    rango = (fin - inicio).total_seconds()
+    id_reserva = 0
+    for (id_habitacion, _, _, precio, _), total in zip(habitaciones, por_habitacion):
+        if not total:
+            continue
+        # Hueco medio entre estadías para repartir `total` reservas en el período
+        paso = rango / total
+        entrada = inicio + timedelta(seconds=azar.uniform(0, paso / 2))
+        for _ in range(total):
+            noches = min(azar.choices([1, 2, 3, 4, 5, 7, 10, 14], [20, 25, 18, 12, 10, 8, 4, 3])[0],
+                         max(1, int(paso // 86400)))
+            entrada = entrada.replace(hour=14, minute=0, second=0, microsecond=0)
+            salida = (entrada + timedelta(days=noches)).replace(hour=10)
+            id_reserva += 1
+            monto = (precio * noches).quantize(CENTAVOS)
+            if salida < ahora:
+                estado = azar.choices(['finalizada', 'cancelada', 'confirmada'], [85, 10, 5])[0]
+            else:
+                estado = azar.choices(['confirmada', 'cancelada'], [92, 8])[0]
+            porcentaje = azar.choice(PORCENTAJES_ANTICIPO) if azar.random() < 0.7 else None
+            anticipo = (monto * porcentaje / 100).quantize(CENTAVOS, ROUND_HALF_UP) if porcentaje is not None else None
+            yield ('reserva', (id_reserva, azar.randint(1, clientes), id_habitacion, entrada, salida,
+                               monto, estado, anticipo, porcentaje))
+            momento = entrada - timedelta(days=azar.randint(1, 60))
+            if anticipo is not None:
+                yield ('anticipo', (id_reserva, monto, porcentaje, anticipo, monto - anticipo, momento))
+                if estado != 'cancelada':
+                    yield ('pago', (id_reserva, azar.choice(METODOS_PAGO), anticipo, momento))
+            if estado == 'finalizada':
+                saldo = monto - (anticipo or Decimal('0'))
+                if saldo > 0:
+                    yield ('pago', (id_reserva, azar.choice(METODOS_PAGO), saldo, salida))
+            entrada = salida + timedelta(seconds=max(0, azar.gauss(paso - noches * 86400, paso / 4)))
+
+
+def poblar(conectar, reservas=10000, semilla=1, anios=3, ahora=None):
+    """Carga datos sintéticos en una base vacía usando la fábrica de conexiones `conectar`.
+
+    Dos tercios del período quedan en el pasado y un tercio en el futuro. Devuelve un
+    resumen con las cantidades y el período generado para que los benchmarks elijan
+    parámetros válidos.
+    """
+    azar = random.Random(semilla)
+    ahora = (ahora or datetime.now()).replace(second=0, microsecond=0)
+    inicio = ahora - timedelta(days=round(anios * 365 * 2 / 3))
+    fin = ahora + timedelta(days=round(anios * 365 / 3))
+    n_habitaciones, n_clientes = dimensiones(reservas, anios)
+    habitaciones = list(_habitaciones(azar, n_habitaciones))
+
+    conn = conectar()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("INSERT INTO admins (username, password) VALUES (%s, %s)", ('admin', 'admin123'))
+        conn.commit()
+        cursor.close()
+        _insertar_en_lotes(conn, """
+            INSERT INTO habitaciones (id, numero_habitacion, tipo, precio_por_noche, estado)
+            VALUES (%s, %s, %s, %s, %s)
+        """, habitaciones)
+        _insertar_en_lotes(conn, """
+            INSERT INTO clientes (id_cliente, nombre, apellido, dni_pasaporte_cpf, telefono, email, direccion, fecha_registro)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+        """, _clientes(azar, n_clientes, inicio - timedelta(days=365)))
+
+        # Reservas primero y pagos/anticipos después para respetar las claves foráneas
+        pagos = []
+        anticipos = []
+
+        def solo_reservas():
+            for tipo, fila in _reservas(azar, habitaciones, n_clientes, reservas, inicio, fin, ahora):
+                if tipo == 'reserva':
+                    yield fila
+                elif tipo == 'pago':
+                    pagos.append(fila)
+                else:
+                    anticipos.append(fila)
+
+        n_reservas = _insertar_en_lotes(conn, """
+            INSERT INTO reservas (id, id_cliente, id_habitacion, fecha_entrada, fecha_salida, monto, estado,
+                                  monto_anticipo, porcentaje_anticipo)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+        """, solo_reservas())
+        _insertar_en_lotes(conn, """
+            INSERT INTO anticipos (id_reserva, monto_total, porcentaje_anticipo, monto_anticipo, monto_restante, fecha_anticipo)
+            VALUES (%s, %s, %s, %s, %s, %s)
+        """, anticipos)
+        _insertar_en_lotes(conn, """
+            INSERT INTO pagos (id_reserva, metodo_pago, monto, fecha_pago)
+            VALUES (%s, %s, %s, %s)
+        """, pagos)
+    finally:
+        conn.close()
+
+    return {
+        'semilla': semilla,
+        'habitaciones': n_habitaciones,
+        'clientes': n_clientes,
+        'reservas': n_reservas,
+        'anticipos': len(anticipos),
+        'pagos': len(pagos),
+        'desde': inicio,
+        'hasta': fin,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--reservas', type=int, default=10000)
+    parser.add_argument('--semilla', type=int, default=1)
+    parser.add_argument('--anios', type=int, default=3)
+    parser.add_argument('--ruta', default=None, help="archivo SQLite de destino (por defecto uno temporal)")
+    args = parser.parse_args()
+
+    base = BaseLocal(args.ruta)
+    inicio = time.perf_counter()
+    resumen = poblar(base.conectar, args.reservas, args.semilla, args.anios)
+    print(f"{base.ruta}: {resumen['habitaciones']} habitaciones, {resumen['clientes']} clientes, "
+          f"{resumen['reservas']} reservas, {resumen['anticipos']} anticipos, {resumen['pagos']} pagos "
+          f"en {time.perf_counter() - inicio:.1f} s")
+
+
+if __name__ == '__main__':
+    main()
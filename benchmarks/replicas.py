@@ -0,0 +1,137 @@
+"""Verifica el reparto de lecturas entre primario y réplicas: réplica, lectura de lo propio, pool lleno y caída.
+
+Con SQLite la réplica es una copia de la base tomada al empezar, que no recibe las escrituras:
+una lectura que encuentra el cliente recién creado vino del primario y una que no lo encuentra
+vino de la réplica. Con --mysql se usan DB_HOST y DB_REPLICAS (por ejemplo dos instancias locales
+con replicación) y se mide además cuánto tarda la réplica en ver la escritura.
+
+Uso: python -m benchmarks.replicas [--reservas 2000]
+     python -m benchmarks.replicas --mysql   # contra DB_HOST y DB_REPLICAS (sólo una base de prueba)
+
+Sale con código 1 si alguna verificación falla.
+"""
+import argparse
+import contextvars
+import json
+import logging
+import random
+import time
+
+import database
+import pool_conexiones
+from benchmarks import generador
+from benchmarks.sqlite_local import BaseLocal
+
+
+def lecturas():
+    return database.estadisticas_replicas()['lecturas']
+
+
+def en_otra_sesion(funcion, *args):
+    """Ejecuta como una sesión que no escribió nada: sin lectura forzada del primario"""
+    contexto = contextvars.Context()
+    contexto.run(database.fijar_primario_hasta, 0)
+    return contexto.run(funcion, *args)
+
+
+def ver_cliente(id_cliente):
+    return any(c['id_cliente'] == id_cliente for c in database.listar_clientes({'id_cliente': id_cliente}))
+
+
+def esperar_replicacion(id_cliente, limite=10.0):
+    """Segundos hasta que una sesión que lee de la réplica ve el cliente, o None si no lo ve en `limite`"""
+    inicio = time.perf_counter()
+    while time.perf_counter() - inicio < limite:
+        if en_otra_sesion(ver_cliente, id_cliente):
+            return round(time.perf_counter() - inicio, 3)
+        time.sleep(0.05)
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--reservas', type=int, default=2000, help="volumen de datos de la base local")
+    parser.add_argument('--mysql', action='store_true', help="usar DB_HOST y DB_REPLICAS del entorno")
+    parser.add_argument('--semilla', type=int, default=1)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    bases = []
+    if args.mysql:
+        if not database.obtener_replicas():
+            raise SystemExit("Defina DB_REPLICAS (por ejemplo 127.0.0.1:3307) para verificar con MySQL")
+    else:
+        primario = BaseLocal()
+        bases.append(primario)
+        generador.poblar(primario.conectar, args.reservas, args.semilla)
+        bases.append(primario.copia())
+        database.configurar_pool(fabrica=primario.conectar, minimo=1, maximo=4)
+        database.configurar_replicas([bases[1].conectar], retraso_max=0)
+
+    verificaciones = {}
+    try:
+        database.fijar_primario_hasta(0)
+        antes = lecturas()
+        database.listar_clientes({'id_cliente': 1})
+        verificaciones['listado_en_replica'] = lecturas()['replica'] == antes['replica'] + 1
+
+        dni = f"R{random.randrange(36 ** 6):06x}"
+        id_cliente = database.agregar_cliente('Replica', 'Prueba', dni, '', '', '')
+        antes = lecturas()
+        verificaciones['lee_lo_que_escribio'] = ver_cliente(id_cliente)
+        verificaciones['tras_escribir_al_primario'] = (
+            lecturas()['primario_tras_escritura'] == antes['primario_tras_escritura'] + 1)
+
+        retraso = None
+        if args.mysql:
+            retraso = esperar_replicacion(id_cliente)
+            verificaciones['replica_alcanza_la_escritura'] = retraso is not None
+        else:
+            # La copia no replica: otra sesión que lee de ella no ve el cliente nuevo
+            verificaciones['otra_sesion_lee_de_la_replica'] = not en_otra_sesion(ver_cliente, id_cliente)
+
+        # Un pool de réplica lleno: la lectura va al primario sin esperar DB_POOL_TIMEOUT y la réplica sigue en turno
+        replicas = database.obtener_replicas()
+        pool = replicas.pools[0]
+        prestadas = [pool.obtener() for _ in range(pool.maximo)]
+        try:
+            antes = lecturas()
+            inicio = time.perf_counter()
+            en_otra_sesion(database.listar_clientes, {'id_cliente': id_cliente})
+            demora = time.perf_counter() - inicio
+            despues = lecturas()
+        finally:
+            for conexion in prestadas:
+                conexion.close()
+        verificaciones['agotada_lee_del_primario'] = (
+            despues['primario_sin_replica'] == antes['primario_sin_replica'] + 1 and demora < pool.timeout)
+        verificaciones['agotada_sigue_en_turno'] = all(r['sana'] for r in replicas.estadisticas().values())
+
+        # Una réplica que rechaza conexiones: la lectura sigue en el primario y la réplica sale de turno
+        caida = pool_conexiones.fabrica_mysql(host='127.0.0.1', port=1, connection_timeout=1)
+        replicas = database.configurar_replicas([caida], retraso_max=0)
+        antes = lecturas()
+        filas = en_otra_sesion(database.listar_clientes, {'id_cliente': id_cliente})
+        despues = lecturas()
+        verificaciones['caida_lee_del_primario'] = (
+            len(filas) == 1 and despues['primario_sin_replica'] == antes['primario_sin_replica'] + 1)
+        verificaciones['caida_fuera_de_turno'] = not any(r['sana'] for r in replicas.estadisticas().values())
+    finally:
+        database.configurar_replicas()
+        database.obtener_pool().cerrar_todas()
+        for base in bases:
+            base.eliminar()
+
+    resultado = {
+        'motor': 'mysql' if args.mysql else 'sqlite',
+        'verificaciones': verificaciones,
+        'retraso_replicacion_s': retraso,
+        'lecturas': lecturas(),
+    }
+    print(json.dumps(resultado, indent=2))
+    if not all(verificaciones.values()):
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,297 @@
+"""Base de datos local SQLite que imita la interfaz de mysql.connector usada por database.py"""
+from datetime import date, datetime
+from decimal import Decimal
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+
+from mysql.connector import errorcode, errors
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS admins (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username VARCHAR(50) NOT NULL UNIQUE,
+    password VARCHAR(255) NOT NULL
+);
+CREATE TABLE IF NOT EXISTS clientes (
+    id_cliente INTEGER PRIMARY KEY AUTOINCREMENT,
+    nombre VARCHAR(100) NOT NULL,
+    apellido VARCHAR(100) NOT NULL,
+    dni_pasaporte_cpf VARCHAR(30) NOT NULL UNIQUE,
+    telefono VARCHAR(30),
+    email VARCHAR(100),
+    direccion VARCHAR(255),
+    fecha_registro DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS habitaciones (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    numero_habitacion VARCHAR(10) NOT NULL UNIQUE,
+    tipo VARCHAR(30) NOT NULL,
+    precio_por_noche DECIMAL(10,2) NOT NULL,
+    estado VARCHAR(20) NOT NULL DEFAULT 'disponible'
+);
+CREATE TABLE IF NOT EXISTS reservas (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    id_cliente INTEGER NOT NULL REFERENCES clientes(id_cliente),
+    id_habitacion INTEGER NOT NULL REFERENCES habitaciones(id),
+    fecha_entrada DATETIME NOT NULL,
+    fecha_salida DATETIME NOT NULL,
+    monto DECIMAL(10,2) NOT NULL,
+    estado VARCHAR(20) NOT NULL DEFAULT 'confirmada',
+    monto_anticipo DECIMAL(10,2),
+    porcentaje_anticipo DECIMAL(5,2)
+);
+CREATE TABLE IF NOT EXISTS pagos (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    id_reserva INTEGER NOT NULL REFERENCES reservas(id),
+    metodo_pago VARCHAR(20) NOT NULL,
+    monto DECIMAL(10,2) NOT NULL,
+    fecha_pago DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS anticipos (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    id_reserva INTEGER NOT NULL REFERENCES reservas(id),
+    monto_total DECIMAL(10,2) NOT NULL,
+    porcentaje_anticipo DECIMAL(5,2) NOT NULL,
+    monto_anticipo DECIMAL(10,2) NOT NULL,
+    monto_restante DECIMAL(10,2) NOT NULL,
+    fecha_anticipo DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+CREATE TABLE IF NOT EXISTS resumen_diario (
+    fecha DATE NOT NULL,
+    tipo VARCHAR(30) NOT NULL,
+    noches INTEGER NOT NULL DEFAULT 0,
+    ingresos DECIMAL(14,2) NOT NULL DEFAULT 0,
+    llegadas INTEGER NOT NULL DEFAULT 0,
+    anticipos DECIMAL(14,2) NOT NULL DEFAULT 0,
+    pagos DECIMAL(14,2) NOT NULL DEFAULT 0,
+    PRIMARY KEY (fecha, tipo)
+);
+CREATE TABLE IF NOT EXISTS tarifas (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    nombre VARCHAR(100) NOT NULL,
+    tipo VARCHAR(30),
+    desde DATE,
+    hasta DATE,
+    dias_semana VARCHAR(20),
+    precio DECIMAL(10,2),
+    factor DECIMAL(6,4),
+    prioridad INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS descuentos_estadia (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    tipo VARCHAR(30),
+    noches_minimas INTEGER NOT NULL,
+    porcentaje DECIMAL(5,2) NOT NULL
+);
+CREATE TABLE IF NOT EXISTS cambios (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    entidad VARCHAR(20) NOT NULL,
+    id_entidad INTEGER NOT NULL,
+    operacion VARCHAR(20) NOT NULL,
+    momento DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_reservas_habitacion ON reservas (id_habitacion, estado, fecha_entrada, fecha_salida);
+CREATE INDEX IF NOT EXISTS idx_reservas_estado_salida ON reservas (estado, fecha_salida);
+CREATE INDEX IF NOT EXISTS idx_reservas_estado_entrada ON reservas (estado, fecha_entrada);
+CREATE INDEX IF NOT EXISTS idx_pagos_reserva ON pagos (id_reserva);
+CREATE INDEX IF NOT EXISTS idx_anticipos_reserva ON anticipos (id_reserva);
+CREATE INDEX IF NOT EXISTS idx_clientes_apellido_nombre ON clientes (apellido, nombre);
+CREATE INDEX IF NOT EXISTS idx_clientes_nombre ON clientes (nombre);
+CREATE INDEX IF NOT EXISTS idx_clientes_email ON clientes (email);
+CREATE INDEX IF NOT EXISTS idx_clientes_telefono ON clientes (telefono);
+CREATE INDEX IF NOT EXISTS idx_cambios_momento ON cambios (momento);
+"""
+
+# Traducciones del dialecto MySQL usado en database.py al de SQLite
+TRADUCCIONES = [
+    (re.compile(r"%s"), "?"),
+    (re.compile(r"\bNOW\(\)", re.I), "datetime('now', 'localtime')"),
+    (re.compile(r"\bCURDATE\(\)", re.I), "date('now', 'localtime')"),
+    (re.compile(r"\s+FOR UPDATE\b", re.I), ""),
+    (re.compile(r"\bON DUPLICATE KEY UPDATE\b", re.I), "ON CONFLICT DO UPDATE SET"),
+    (re.compile(r"\bVALUES\((\w+)\)", re.I), r"excluded.\1"),
+    (re.compile(r"\bTIMESTAMPDIFF\(\s*SECOND\s*,\s*([^,]+?)\s*,\s*([\w.]+)\s*\)", re.I),
+     r"CAST(ROUND((julianday(\2) - julianday(\1)) * 86400) AS INTEGER)"),
+]
+
+sqlite3.register_adapter(Decimal, str)
+sqlite3.register_adapter(datetime, lambda d: d.strftime("%Y-%m-%d %H:%M:%S"))
+sqlite3.register_adapter(date, lambda d: d.isoformat())
+sqlite3.register_converter("DECIMAL", lambda b: Decimal(b.decode()))
+sqlite3.register_converter("DATETIME", lambda b: datetime.fromisoformat(b.decode()))
+sqlite3.register_converter("DATE", lambda b: date.fromisoformat(b.decode()))
+
+
+def traducir(sql):
+    for patron, reemplazo in TRADUCCIONES:
+        sql = patron.sub(reemplazo, sql)
+    return sql
+
+
+def _error_mysql(e):
+    if isinstance(e, sqlite3.IntegrityError):
+        return errors.IntegrityError(msg=str(e))
+    if isinstance(e, sqlite3.OperationalError):
+        # La base bloqueada por otra transacción equivale a una espera de bloqueo vencida en MySQL
+        errno = errorcode.ER_LOCK_WAIT_TIMEOUT if 'locked' in str(e) else None
+        return errors.OperationalError(msg=str(e), errno=errno)
+    return errors.DatabaseError(msg=str(e))
+
+
+class Contador:
+    """Cuenta las sentencias ejecutadas y simula la latencia de red de cada viaje"""
+
+    def __init__(self, latencia=0.0):
+        self.latencia = latencia
+        self._lock = threading.Lock()
+        self.consultas = 0
+
+    def registrar(self):
+        with self._lock:
+            self.consultas += 1
+        if self.latencia:
+            time.sleep(self.latencia)
+
+    def reiniciar(self):
+        with self._lock:
+            self.consultas = 0
+
+
+class CursorLocal:
+    """Cursor con la interfaz de MySQLCursor / MySQLCursorDict"""
+
+    def __init__(self, conexion, dictionary=False):
+        self._conexion = conexion
+        self._cursor = conexion._sqlite.cursor()
+        self._dictionary = dictionary
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    @property
+    def column_names(self):
+        return tuple(d[0] for d in self._cursor.description or ())
+
+    def _fila(self, fila):
+        if fila is None or not self._dictionary:
+            return fila
+        return dict(zip(self.column_names, fila))
+
+    def execute(self, sql, params=()):
+        self._conexion.contador.registrar()
+        try:
+            self._cursor.execute(traducir(sql), tuple(params or ()))
+        except sqlite3.Error as e:
+            raise _error_mysql(e) from e
+
+    def executemany(self, sql, secuencia):
+        self._conexion.contador.registrar()
+        try:
+            self._cursor.executemany(traducir(sql), [tuple(p) for p in secuencia])
+        except sqlite3.Error as e:
+            raise _error_mysql(e) from e
+
+    def fetchone(self):
+        return self._fila(self._cursor.fetchone())
+
+    def fetchmany(self, size=1):
+        return [self._fila(f) for f in self._cursor.fetchmany(size)]
+
+    def fetchall(self):
+        return [self._fila(f) for f in self._cursor.fetchall()]
+
+    def __iter__(self):
+        return (self._fila(f) for f in self._cursor)
+
+    def close(self):
+        self._cursor.close()
+
+
+class ConexionLocal:
+    """Conexión SQLite con la interfaz de MySQLConnection que usa database.py"""
+
+    def __init__(self, ruta, contador):
+        self._sqlite = sqlite3.connect(ruta, detect_types=sqlite3.PARSE_DECLTYPES,
+                                       check_same_thread=False, timeout=30)
+        self._sqlite.execute("PRAGMA foreign_keys = ON")
+        self.contador = contador
+
+    @property
+    def in_transaction(self):
+        return self._sqlite.in_transaction
+
+    def cursor(self, dictionary=False, **_):
+        return CursorLocal(self, dictionary=dictionary)
+
+    def is_connected(self):
+        try:
+            self._sqlite.execute("SELECT 1")
+            return True
+        except sqlite3.Error:
+            return False
+
+    def ping(self, reconnect=False, attempts=1, delay=0):
+        if not self.is_connected():
+            raise errors.InterfaceError(msg="Conexión SQLite cerrada")
+
+    def start_transaction(self, **_):
+        self._sqlite.execute("BEGIN IMMEDIATE")
+
+    def commit(self):
+        self._sqlite.commit()
+
+    def rollback(self):
+        self._sqlite.rollback()
+
+    def close(self):
+        self._sqlite.close()
+
+
+class BaseLocal:
+    """Archivo SQLite con el esquema del hotel y fábrica de conexiones para el pool"""
+
+    def __init__(self, ruta=None, latencia=0.0):
+        if ruta is None:
+            descriptor, ruta = tempfile.mkstemp(prefix='hotel_', suffix='.sqlite3')
+            os.close(descriptor)
+        self.ruta = ruta
+        self.contador = Contador(latencia)
+        with sqlite3.connect(ruta) as conn:
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.executescript(ESQUEMA)
+
+    def conectar(self):
+        return ConexionLocal(self.ruta, self.contador)
+
+    def copia(self):
+        """Otra base local con los datos actuales de esta (una réplica de lectura de prueba); comparte el contador"""
+        copia = BaseLocal()
+        origen = sqlite3.connect(self.ruta)
+        destino = sqlite3.connect(copia.ruta)
+        try:
+            origen.backup(destino)
+        finally:
+            origen.close()
+            destino.close()
+        copia.contador = self.contador
+        return copia
+
+    def eliminar(self):
+        for sufijo in ('', '-wal', '-shm'):
+            try:
+                os.remove(self.ruta + sufijo)
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,1112 @@
+"""Mide cada función de database.py y cada ruta de app.py sobre datos sintéticos.
+
+Uso: python -m benchmarks.suite [--reservas 10000] [--repeticiones 30] [--salida resultados.json]
+                                [--comparar anterior.json] [--solo patron] [--replica]
+
+El resultado es un JSON con p50/p95/p99 en milisegundos y consultas por llamada de cada
+caso, pensado para guardarse por commit y compararse con --comparar. Las rutas que responden
+con un estado HTTP fuera de 2xx/3xx quedan marcadas con `fallo` y listadas en `fallidos`.
+"""
+import argparse
+from datetime import datetime, timedelta
+import fnmatch
+import inspect
+import io
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import cache
+import cambios_habitaciones
+import database
+import tablero
+import tarifas
+from benchmarks import generador
+from benchmarks.sqlite_local import BaseLocal
+
+CASOS = []
+# Estado HTTP que debe responder un caso; cualquier otro lo marca como fallido
+ESPERADOS = {}
+# Caché sobre un archivo SQLite temporal para medir el backend compartido
+_cache_sqlite = None
+# El generador no llena resumen_diario: los casos de reportes lo recalculan una vez
+_resumen_recalculado = False
+# Guardar las tarifas cambia su versión: los casos de cotización las guardan una sola vez
+_tarifas_guardadas = False
+
+# Funciones de database.py que no acceden a datos: no necesitan caso propio
+SIN_CASO = {'conectar', 'configurar_pool', 'obtener_pool', 'estadisticas_pool', 'estadisticas_cache',
+            'estadisticas_bloqueos', 'codificar_cursor', 'decodificar_cursor', 'calcular_dias',
+            'conectar_lectura', 'configurar_replicas', 'obtener_replicas', 'estadisticas_replicas',
+            'fijar_primario_hasta', 'primario_hasta'}
+
+
+def caso(nombre, repeticiones=None, esperado=None):
+    """Registra un caso: la función recibe el contexto y devuelve la operación a medir.
+
+    Lo que la función hace antes de devolver la operación (elegir ids, crear una reserva
+    para extenderla, etc.) queda fuera de la medición. Con `esperado`, una respuesta con otro
+    estado HTTP cuenta como fallo aunque sea 2xx/3xx.
+    """
+    def registrar(funcion):
+        CASOS.append((nombre, funcion, repeticiones))
+        if esperado:
+            ESPERADOS[nombre] = esperado
+        return funcion
+    return registrar
+
+
+def _cache_compartida():
+    """Caché sobre un archivo SQLite temporal, con versiones compartidas como en varios workers"""
+    global _cache_sqlite
+    if _cache_sqlite is None:
+        ruta = os.path.join(tempfile.mkdtemp(), 'cache.sqlite3')
+        _cache_sqlite = cache.CacheEntidades(cache.SqliteCompartido(ruta))
+    return _cache_sqlite
+
+
+def _con_cache_compartida(funcion, *args, **kwargs):
+    anterior, database.cache_entidades = database.cache_entidades, _cache_compartida()
+    try:
+        return funcion(*args, **kwargs)
+    finally:
+        database.cache_entidades = anterior
+
+
+def _fmt(fecha):
+    return fecha.strftime("%Y-%m-%dT%H:%M")
+
+
+class Contexto:
+    """Datos generados y utilidades compartidas por los casos"""
+
+    def __init__(self, base, resumen, semilla):
+        import random
+        self.base = base
+        self.resumen = resumen
+        self.azar = random.Random(semilla)
+        self._web = None
+        self._secuencia = 0
+        # Las escrituras usan fechas posteriores a todos los datos generados para no chocar
+        self.horizonte = resumen['hasta'].replace(hour=14, minute=0) + timedelta(days=400)
+
+    def siguiente(self):
+        self._secuencia += 1
+        return self._secuencia
+
+    def id_cliente(self):
+        return self.azar.randint(1, self.resumen['clientes'])
+
+    def id_habitacion(self):
+        return self.azar.randint(1, self.resumen['habitaciones'])
+
+    def id_reserva(self):
+        return self.azar.randint(1, self.resumen['reservas'])
+
+    def fechas_libres(self, noches=2):
+        """Rango futuro sin reservas: cada llamada avanza una semana"""
+        entrada = self.horizonte + timedelta(days=7 * self.siguiente())
+        return _fmt(entrada), _fmt(entrada + timedelta(days=noches))
+
+    def fechas_busqueda(self, noches=3):
+        entrada = self.resumen['hasta'] - timedelta(days=self.azar.randint(30, 300))
+        return _fmt(entrada), _fmt(entrada + timedelta(days=noches))
+
+    def habitacion_disponible(self):
+        for _ in range(100):
+            habitacion = database.obtener_habitacion(self.id_habitacion())
+            if habitacion and habitacion['estado'] == 'disponible':
+                return habitacion
+        raise RuntimeError("No hay habitaciones disponibles en los datos generados")
+
+    def reserva_nueva(self):
+        """Crea (fuera de la medición) una reserva confirmada en fechas libres"""
+        habitacion = self.habitacion_disponible()
+        entrada, salida = self.fechas_libres()
+        id_reserva = database.reservar_habitacion(self.id_cliente(), habitacion['id'], entrada, salida,
+                                                  habitacion['precio_por_noche'] * 2)
+        return id_reserva, salida
+
+    @property
+    def web(self):
+        if self._web is None:
+            import app
+            # Sin TESTING: un error de la vista se registra como HTTP 500 en vez de cortar la corrida
+            self._web = app.app.test_client()
+            with self._web.session_transaction() as sesion:
+                sesion['admin'] = True
+                sesion['admin_username'] = 'admin'
+        return self._web
+
+
+# ---------------------------------------------------------------- database.py
+
+@caso('db.check_admin_credentials')
+def _(ctx):
+    return lambda: database.check_admin_credentials('admin', 'admin123')
+
+
+@caso('db.create_admin')
+def _(ctx):
+    usuario = f"bench{ctx.siguiente()}"
+    return lambda: database.create_admin(usuario, 'clave')
+
+
+@caso('db.agregar_cliente')
+def _(ctx):
+    dni = str(90000000 + ctx.siguiente())
+    return lambda: database.agregar_cliente('Bench', 'Mark', dni, '1100000000', 'bench@correo.com', 'Calle 1')
+
+
+@caso('db.obtener_cliente')
+def _(ctx):
+    id_cliente = ctx.id_cliente()
+    database.cache_entidades.invalidar('cliente', id_cliente)
+    return lambda: database.obtener_cliente(id_cliente)
+
+
+@caso('db.obtener_cliente.cache')
+def _(ctx):
+    id_cliente = ctx.id_cliente()
+    database.obtener_cliente(id_cliente)
+    return lambda: database.obtener_cliente(id_cliente)
+
+
+@caso('db.obtener_cliente.cache_sqlite')
+def _(ctx):
+    id_cliente = ctx.id_cliente()
+    _cache_compartida().obtener('cliente', id_cliente, database._leer_cliente, id_cliente)
+    return lambda: _con_cache_compartida(database.obtener_cliente, id_cliente)
+
+
+@caso('db.listar_clientes', repeticiones=5)
+def _(ctx):
+    return lambda: database.listar_clientes()
+
+
+@caso('db.pagina_clientes')
+def _(ctx):
+    return lambda: database.pagina_clientes(limite=50)
+
+
+@caso('db.pagina_clientes.filtrada')
+def _(ctx):
+    desde = ctx.resumen['desde'] - timedelta(days=ctx.azar.randint(0, 300))
+    return lambda: database.pagina_clientes({'desde': desde}, limite=50)
+
+
+def _consulta_cliente(ctx):
+    """Apellido y comienzo del nombre de un cliente generado, como se tipean en el mostrador"""
+    cliente = database.obtener_cliente(ctx.id_cliente())
+    return f"{cliente['apellido']} {cliente['nombre'][:3]}"
+
+
+@caso('db.buscar_clientes')
+def _(ctx):
+    database.buscar_clientes('a')  # el índice se carga fuera de la medición
+    consulta = _consulta_cliente(ctx)
+    return lambda: database.buscar_clientes(consulta)
+
+
+@caso('db.buscar_clientes.sql')
+def _(ctx):
+    consulta = _consulta_cliente(ctx)
+
+    def operacion():
+        database.BUSQUEDA_CON_INDICE = False
+        try:
+            return database.buscar_clientes(consulta)
+        finally:
+            database.BUSQUEDA_CON_INDICE = True
+    return operacion
+
+
+@caso('db.version_datos')
+def _(ctx):
+    return lambda: database.version_datos('clientes', 'reservas', 'habitaciones')
+
+
+@caso('db.reconstruir_indice_clientes', repeticiones=5)
+def _(ctx):
+    return lambda: database.reconstruir_indice_clientes()
+
+
+@caso('db.listar_habitaciones_disponibles')
+def _(ctx):
+    entrada, salida = ctx.fechas_busqueda()
+    return lambda: database.listar_habitaciones_disponibles(entrada, salida)
+
+
+@caso('db.listar_habitaciones_disponibles.indice_frio', repeticiones=5)
+def _(ctx):
+    # Incluye la recarga completa del índice de disponibilidad
+    entrada, salida = ctx.fechas_busqueda()
+    database.indice_disponibilidad.invalidar()
+    return lambda: database.listar_habitaciones_disponibles(entrada, salida)
+
+
+@caso('db.cambiar_estado_habitacion')
+def _(ctx):
+    habitacion = ctx.habitacion_disponible()
+    return lambda: database.cambiar_estado_habitacion(habitacion['id'], 'disponible')
+
+
+@caso('db.reservar_habitacion')
+def _(ctx):
+    habitacion = ctx.habitacion_disponible()
+    entrada, salida = ctx.fechas_libres()
+    return lambda: database.reservar_habitacion(ctx.id_cliente(), habitacion['id'], entrada, salida,
+                                                habitacion['precio_por_noche'] * 2)
+
+
+@caso('db.listar_reservas', repeticiones=5)
+def _(ctx):
+    return lambda: database.listar_reservas()
+
+
+@caso('db.obtener_estadisticas')
+def _(ctx):
+    return lambda: database.obtener_estadisticas(usar_cache=False)
+
+
+@caso('db.obtener_estadisticas.cache')
+def _(ctx):
+    return lambda: database.obtener_estadisticas()
+
+
+@caso('db.listar_todas_habitaciones', repeticiones=10)
+def _(ctx):
+    return lambda: database.listar_todas_habitaciones()
+
+
+@caso('db.extender_reserva')
+def _(ctx):
+    id_reserva, salida = ctx.reserva_nueva()
+    nueva_salida = _fmt(database.datetime.strptime(salida, "%Y-%m-%dT%H:%M") + timedelta(days=1))
+    return lambda: database.extender_reserva(id_reserva, nueva_salida)
+
+
+@caso('db.cambiar_precio_y_estado_habitacion')
+def _(ctx):
+    habitacion = ctx.habitacion_disponible()
+    return lambda: database.cambiar_precio_y_estado_habitacion(habitacion['id'], habitacion['precio_por_noche'], 'disponible')
+
+
+def _cambio_en_lote(ctx):
+    """Precio fijo para las suites que alterna en cada llamada: todas las del lote cambian siempre"""
+    precio = generador.TIPOS['suite'][1] + ctx.siguiente() % 2
+    return (cambios_habitaciones.leer_filtro({'tipos': 'suite'}),
+            cambios_habitaciones.leer_regla_precio({'modo': 'fijo', 'valor': precio}))
+
+
+@caso('db.cambiar_habitaciones_en_lote')
+def _(ctx):
+    filtro, regla = _cambio_en_lote(ctx)
+    return lambda: database.cambiar_habitaciones_en_lote(filtro, regla)
+
+
+@caso('db.cambiar_habitaciones_en_lote.simular')
+def _(ctx):
+    filtro = cambios_habitaciones.leer_filtro({'todas': True})
+    regla = cambios_habitaciones.leer_regla_precio({'modo': 'porcentaje', 'valor': '10'})
+    return lambda: database.cambiar_habitaciones_en_lote(filtro, regla, simular=True)
+
+
+@caso('db.obtener_habitacion')
+def _(ctx):
+    id_habitacion = ctx.id_habitacion()
+    database.cache_entidades.invalidar('habitacion', id_habitacion)
+    return lambda: database.obtener_habitacion(id_habitacion)
+
+
+@caso('db.obtener_habitacion.cache')
+def _(ctx):
+    id_habitacion = ctx.id_habitacion()
+    database.obtener_habitacion(id_habitacion)
+    return lambda: database.obtener_habitacion(id_habitacion)
+
+
+@caso('db.obtener_reserva')
+def _(ctx):
+    id_reserva = ctx.id_reserva()
+    database.cache_entidades.invalidar('reserva', id_reserva)
+    return lambda: database.obtener_reserva(id_reserva)
+
+
+@caso('db.obtener_reserva.cache')
+def _(ctx):
+    id_reserva = ctx.id_reserva()
+    database.obtener_reserva(id_reserva)
+    return lambda: database.obtener_reserva(id_reserva)
+
+
+@caso('db.crear_anticipo')
+def _(ctx):
+    id_reserva, _ = ctx.reserva_nueva()
+    return lambda: database.crear_anticipo(id_reserva, 30)
+
+
+@caso('db.crear_reserva_con_anticipo')
+def _(ctx):
+    habitacion = ctx.habitacion_disponible()
+    entrada, salida = ctx.fechas_libres()
+    return lambda: database.crear_reserva_con_anticipo(ctx.id_cliente(), habitacion['id'], entrada, salida, '30')
+
+
+@caso('db.upsert_clientes')
+def _(ctx):
+    # Mitad clientes existentes, mitad nuevos
+    clientes = []
+    for i in range(50):
+        dni = str(20000000 + ctx.id_cliente() - 1) if i % 2 else str(91000000 + ctx.siguiente())
+        clientes.append({'nombre': 'Bench', 'apellido': 'Mark', 'dni': dni})
+    return lambda: database.upsert_clientes(clientes)
+
+
+@caso('db.listar_habitaciones_basico')
+def _(ctx):
+    return lambda: database.listar_habitaciones_basico()
+
+
+@caso('db.reservas_confirmadas_en_rango')
+def _(ctx):
+    ids = [ctx.id_habitacion() for _ in range(20)]
+    entrada, _ = ctx.fechas_busqueda()
+    desde = database.datetime.strptime(entrada, "%Y-%m-%dT%H:%M")
+    return lambda: database.reservas_confirmadas_en_rango(ids, desde, desde + timedelta(days=60))
+
+
+@caso('db.reservas_para_ocupacion')
+def _(ctx):
+    desde = ctx.resumen['hasta'] - timedelta(days=365)
+    return lambda: database.reservas_para_ocupacion(desde, desde + timedelta(days=365))
+
+
+@caso('db.insertar_reservas_con_anticipos')
+def _(ctx):
+    reservas = []
+    for _ in range(20):
+        habitacion = ctx.habitacion_disponible()
+        entrada, salida = ctx.fechas_libres()
+        monto = habitacion['precio_por_noche'] * 2
+        anticipo = (monto * 3 / 10).quantize(generador.CENTAVOS)
+        reservas.append({
+            'id_cliente': ctx.id_cliente(), 'id_habitacion': habitacion['id'],
+            'fecha_entrada': database.datetime.strptime(entrada, "%Y-%m-%dT%H:%M"),
+            'fecha_salida': database.datetime.strptime(salida, "%Y-%m-%dT%H:%M"),
+            'monto_total': monto, 'porcentaje_anticipo': 30, 'monto_anticipo': anticipo,
+            'monto_restante': monto - anticipo,
+        })
+    return lambda: database.insertar_reservas_con_anticipos(reservas)
+
+
+
+@caso('db.buscar_habitaciones_grupo')
+def _(ctx):
+    entrada, salida = ctx.fechas_busqueda()
+    return lambda: database.buscar_habitaciones_grupo(entrada, salida, {'doble': 3, 'simple': 2})
+
+
+
+@caso('db.buscar_estadias_flexibles')
+def _(ctx):
+    entrada, _ = ctx.fechas_busqueda()
+    desde = database.datetime.strptime(entrada, "%Y-%m-%dT%H:%M").date()
+    return lambda: database.buscar_estadias_flexibles(desde, desde + timedelta(days=30), 3)
+
+@caso('db.crear_reserva_grupo')
+def _(ctx):
+    ids = {ctx.habitacion_disponible()['id'] for _ in range(4)}
+    entrada, salida = ctx.fechas_libres()
+    return lambda: database.crear_reserva_grupo(ctx.id_cliente(), ids, entrada, salida, '30')
+
+
+@caso('db.exportar_filas', repeticiones=5)
+def _(ctx):
+    return lambda: sum(1 for _ in database.exportar_filas('reservas'))
+
+
+@caso('db.listar_reservas_con_anticipos', repeticiones=5)
+def _(ctx):
+    return lambda: database.listar_reservas_con_anticipos()
+
+
+@caso('db.pagina_reservas')
+def _(ctx):
+    return lambda: database.pagina_reservas(limite=50)
+
+
+@caso('db.pagina_reservas.filtrada')
+def _(ctx):
+    filtros = {'id_habitacion': ctx.id_habitacion(), 'estado': 'confirmada'}
+    return lambda: database.pagina_reservas(filtros, limite=50)
+
+
+@caso('db.ejecutar_en_paralelo')
+def _(ctx):
+    # Tres lecturas independientes: con --latencia-ms el tiempo lo fija la más lenta
+    tareas = {
+        'estadisticas': (database.obtener_estadisticas, False),
+        'habitaciones': database.listar_habitaciones_basico,
+        'reservas': (database.pagina_reservas, None, None, 50),
+    }
+    return lambda: database.ejecutar_en_paralelo(tareas)
+
+
+@caso('db.reconstruir_indice_disponibilidad', repeticiones=5)
+def _(ctx):
+    return lambda: database.reconstruir_indice_disponibilidad()
+
+
+@caso('db.verificar_indice_disponibilidad', repeticiones=5)
+def _(ctx):
+    return lambda: database.verificar_indice_disponibilidad()
+
+
+@caso('db.aplicar_transiciones')
+def _(ctx):
+    # Salidas atrasadas: se reabren hasta 100 reservas finalizadas para que la llamada medida las cierre
+    ids = sorted({ctx.id_reserva() for _ in range(100)})
+    conn = ctx.base.conectar()
+    cursor = conn.cursor()
+    cursor.execute(f"UPDATE reservas SET estado = 'confirmada' WHERE estado = 'finalizada' "
+                   f"AND id IN ({', '.join(['%s'] * len(ids))})", ids)
+    conn.commit()
+    conn.close()
+    return lambda: database.aplicar_transiciones()
+
+
+@caso('db.aplicar_transiciones.sin_cambios')
+def _(ctx):
+    database.aplicar_transiciones()
+    return lambda: database.aplicar_transiciones()
+
+
+@caso('db.momentos_de_transicion')
+def _(ctx):
+    ahora = datetime.now()
+    return lambda: database.momentos_de_transicion(ahora, ahora + timedelta(hours=6))
+
+
+def _registrar_cambios_de_ejemplo(ctx, cantidad):
+    """Agrega `cantidad` cambios de habitaciones y reservas al azar; devuelve el id anterior al primero"""
+    desde = database.ultimo_cambio()
+    filas = [('habitacion', ctx.id_habitacion(), 'cambio') if i % 3 == 0 else ('reserva', ctx.id_reserva(), 'cambio')
+             for i in range(cantidad)]
+    conn = ctx.base.conectar()
+    cursor = conn.cursor()
+    cursor.executemany("INSERT INTO cambios (entidad, id_entidad, operacion) VALUES (%s, %s, %s)", filas)
+    conn.commit()
+    conn.close()
+    return desde
+
+
+@caso('db.ultimo_cambio')
+def _(ctx):
+    return lambda: database.ultimo_cambio()
+
+
+@caso('db.leer_cambios')
+def _(ctx):
+    # Lo que acumulan unos segundos de mucho movimiento: 200 cambios en una sola lectura
+    desde = _registrar_cambios_de_ejemplo(ctx, 200)
+    return lambda: database.leer_cambios(desde)
+
+
+@caso('db.leer_cambios.sin_cambios')
+def _(ctx):
+    ultimo = database.ultimo_cambio()
+    return lambda: database.leer_cambios(ultimo)
+
+
+@caso('db.purgar_cambios')
+def _(ctx):
+    return lambda: database.purgar_cambios()
+
+
+@caso('tablero.revisar.sin_cambios')
+def _(ctx):
+    # Lo que cuesta cada intervalo con todas las pantallas conectadas y nada nuevo
+    difusor = tablero.Difusor()
+    difusor.revisar()
+    return lambda: difusor.revisar()
+
+
+@caso('tablero.revisar')
+def _(ctx):
+    difusor = tablero.Difusor()
+    for _ in range(50):
+        difusor._suscriptores.add(tablero.queue.Queue())
+    difusor._ultimo = _registrar_cambios_de_ejemplo(ctx, 20)
+    desde = difusor._ultimo
+
+    def revisar():
+        # Los mismos 20 cambios repartidos a 50 pantallas en cada repetición
+        difusor._ultimo = desde
+        return difusor.revisar()
+    return revisar
+
+
+def _con_resumen():
+    global _resumen_recalculado
+    if not _resumen_recalculado:
+        database.recalcular_resumen()
+        _resumen_recalculado = True
+
+
+@caso('db.recalcular_resumen', repeticiones=3)
+def _(ctx):
+    return lambda: database.recalcular_resumen()
+
+
+@caso('db.resumen_ingresos')
+def _(ctx):
+    _con_resumen()
+    return lambda: database.resumen_ingresos(ctx.resumen['desde'].date(), ctx.resumen['hasta'].date(), 'mes')
+
+
+@caso('db.resumen_ingresos.por_tipo')
+def _(ctx):
+    _con_resumen()
+    return lambda: database.resumen_ingresos(ctx.resumen['desde'].date(), ctx.resumen['hasta'].date(), 'tipo')
+
+
+# Temporada alta con recargo de fin de semana, precio fijo para suites y descuentos por estadía larga
+TARIFAS_EJEMPLO = {
+    'reglas': [
+        {'nombre': 'temporada alta', 'desde': '2020-12-15', 'hasta': '2040-03-01', 'factor': '1.35', 'prioridad': 1},
+        {'nombre': 'fin de semana', 'dias_semana': 'viernes,sabado', 'factor': '1.15', 'prioridad': 2},
+        {'nombre': 'suite', 'tipo': 'suite', 'precio': '240.00'},
+    ],
+    'descuentos': [
+        {'noches_minimas': 7, 'porcentaje': '10'},
+        {'tipo': 'doble', 'noches_minimas': 3, 'porcentaje': '5'},
+    ],
+}
+
+
+def _guardar_tarifas_ejemplo():
+    global _tarifas_guardadas
+    database.guardar_tarifas([tarifas.leer_regla(r) for r in TARIFAS_EJEMPLO['reglas']],
+                             [tarifas.leer_descuento(d) for d in TARIFAS_EJEMPLO['descuentos']])
+    _tarifas_guardadas = True
+
+
+def _con_tarifas():
+    if not _tarifas_guardadas:
+        _guardar_tarifas_ejemplo()
+
+
+@caso('db.guardar_tarifas', repeticiones=5)
+def _(ctx):
+    return _guardar_tarifas_ejemplo
+
+
+@caso('db.tabla_tarifas')
+def _(ctx):
+    _con_tarifas()
+    return lambda: database.tabla_tarifas()
+
+
+@caso('db.tabla_tarifas.recarga', repeticiones=5)
+def _(ctx):
+    # Lectura de las reglas; la compilación por tipo y precio ocurre al cotizar
+    def recargar():
+        database._tarifas['tabla'] = None
+        return database.tabla_tarifas()
+    return recargar
+
+
+@caso('db.cotizar_habitaciones')
+def _(ctx):
+    _con_tarifas()
+    entrada, salida = ctx.fechas_busqueda()
+    habitaciones = database.listar_habitaciones_disponibles(entrada, salida)
+    return lambda: database.cotizar_habitaciones(habitaciones, entrada, salida)
+
+
+@caso('db.cotizar_habitaciones.tabla_nueva', repeticiones=5)
+def _(ctx):
+    # Incluye compilar los precios del año para cada (tipo, precio base)
+    _con_tarifas()
+    entrada, salida = ctx.fechas_busqueda()
+    habitaciones = database.listar_habitaciones_disponibles(entrada, salida)
+    def cotizar():
+        database._tarifas['tabla'] = None
+        return database.cotizar_habitaciones(habitaciones, entrada, salida)
+    return cotizar
+
+
+# ---------------------------------------------------------------- rutas de app.py
+
+@caso('GET /')
+def _(ctx):
+    return lambda: ctx.web.get('/')
+
+
+@caso('GET /admin_login')
+def _(ctx):
+    return lambda: ctx.web.get('/admin_login')
+
+
+@caso('POST /admin_login')
+def _(ctx):
+    return lambda: ctx.web.post('/admin_login', data={'username': 'admin', 'password': 'admin123'})
+
+
+@caso('GET /admin_panel')
+def _(ctx):
+    return lambda: ctx.web.get('/admin_panel')
+
+
+@caso('GET /admin/pool')
+def _(ctx):
+    return lambda: ctx.web.get('/admin/pool')
+
+
+@caso('GET /admin/metrics')
+def _(ctx):
+    return lambda: ctx.web.get('/admin/metrics')
+
+
+@caso('GET /admin/ocupacion', repeticiones=10)
+def _(ctx):
+    desde = (ctx.resumen['hasta'] - timedelta(days=365)).strftime("%Y-%m-%d")
+    return lambda: ctx.web.get('/admin/ocupacion', query_string={'desde': desde, 'dias': 365})
+
+
+@caso('GET /admin/reportes')
+def _(ctx):
+    _con_resumen()
+    consulta = {'desde': ctx.resumen['desde'].strftime("%Y-%m-%d"), 'hasta': ctx.resumen['hasta'].strftime("%Y-%m-%d"),
+                'agrupar': 'dia'}
+    return lambda: ctx.web.get('/admin/reportes', query_string=consulta)
+
+
+@caso('GET /logout')
+def _(ctx):
+    import app
+    # Cliente propio: cerrar sesión no debe afectar al resto de los casos
+    cliente = app.app.test_client()
+    with cliente.session_transaction() as sesion:
+        sesion['admin'] = True
+    return lambda: cliente.get('/logout')
+
+
+@caso('GET /clientes/nuevo')
+def _(ctx):
+    return lambda: ctx.web.get('/clientes/nuevo')
+
+
+@caso('POST /clientes/nuevo')
+def _(ctx):
+    datos = {'nombre': 'Bench', 'apellido': 'Mark', 'dni': str(92000000 + ctx.siguiente()),
+             'telefono': '1100000000', 'email': 'bench@correo.com', 'direccion': 'Calle 1'}
+    return lambda: ctx.web.post('/clientes/nuevo', data=datos)
+
+
+@caso('GET /reservar/<id_cliente>')
+def _(ctx):
+    ruta = f"/reservar/{ctx.id_cliente()}"
+    return lambda: ctx.web.get(ruta)
+
+
+@caso('POST /reservar/<id_cliente> (búsqueda)')
+def _(ctx):
+    ruta = f"/reservar/{ctx.id_cliente()}"
+    entrada, salida = ctx.fechas_busqueda()
+    return lambda: ctx.web.post(ruta, data={'fecha_entrada': entrada, 'fecha_salida': salida})
+
+
+@caso('POST /reservar/<id_cliente> (confirmación)')
+def _(ctx):
+    ruta = f"/reservar/{ctx.id_cliente()}"
+    habitacion = ctx.habitacion_disponible()
+    entrada, salida = ctx.fechas_libres()
+    datos = {'fecha_entrada': entrada, 'fecha_salida': salida, 'habitacion': habitacion['id'],
+             'porcentaje_anticipo': '30'}
+    return lambda: ctx.web.post(ruta, data=datos)
+
+
+
+@caso('GET /habitaciones/grupo')
+def _(ctx):
+    entrada, salida = ctx.fechas_busqueda()
+    parametros = {'fecha_entrada': entrada, 'fecha_salida': salida, 'requisito': '3 dobles + 2 simples'}
+    return lambda: ctx.web.get('/habitaciones/grupo', query_string=parametros)
+
+
+
+
+@caso('GET /habitaciones/flexible')
+def _(ctx):
+    entrada, _ = ctx.fechas_busqueda()
+    parametros = {'mes': entrada[:7], 'noches': 3, 'orden': 'economica'}
+    return lambda: ctx.web.get('/habitaciones/flexible', query_string=parametros)
+
+@caso('GET /reservar/<id_cliente>/grupo')
+def _(ctx):
+    ruta = f"/reservar/{ctx.id_cliente()}/grupo"
+    return lambda: ctx.web.get(ruta)
+
+@caso('POST /reservar/<id_cliente>/grupo (búsqueda)')
+def _(ctx):
+    ruta = f"/reservar/{ctx.id_cliente()}/grupo"
+    entrada, salida = ctx.fechas_busqueda()
+    datos = {'fecha_entrada': entrada, 'fecha_salida': salida, 'requisito': '2 dobles + 1 simple'}
+    return lambda: ctx.web.post(ruta, data=datos)
+
+
+@caso('POST /reservar/<id_cliente>/grupo (confirmación)')
+def _(ctx):
+    ruta = f"/reservar/{ctx.id_cliente()}/grupo"
+    ids = {ctx.habitacion_disponible()['id'] for _ in range(3)}
+    entrada, salida = ctx.fechas_libres()
+    datos = {'fecha_entrada': entrada, 'fecha_salida': salida, 'requisito': '1 doble',
+             'habitaciones': ','.join(map(str, ids)), 'porcentaje_anticipo': '30'}
+    return lambda: ctx.web.post(ruta, data=datos)
+
+
+def _listado(ctx, ruta, condicional=False, **opciones):
+    """GET de un listado con la tabla ya cacheada; con condicional, además con el ETag vigente.
+
+    Las tablas sólo se guardan con versiones compartidas entre procesos: estos casos corren
+    con la caché SQLite, como un despliegue con DB_CACHE=sqlite.
+    """
+    etag = _con_cache_compartida(ctx.web.get, ruta, **opciones).headers.get('ETag', '')
+    if condicional:
+        opciones['headers'] = {'If-None-Match': etag}
+    return lambda: _con_cache_compartida(ctx.web.get, ruta, **opciones)
+
+
+@caso('GET /clientes')
+def _(ctx):
+    # Sin la tabla en caché: mide consulta y render completos
+    database._notificar_escritura('clientes')
+    return lambda: ctx.web.get('/clientes')
+
+
+@caso('GET /clientes (tabla cacheada)')
+def _(ctx):
+    return _listado(ctx, '/clientes')
+
+
+@caso('GET /clientes (304)', esperado=304)
+def _(ctx):
+    return _listado(ctx, '/clientes', condicional=True)
+
+
+@caso('GET /clientes?cursor')
+def _(ctx):
+    siguiente = database.pagina_clientes(limite=50)['siguiente']
+    database._notificar_escritura('clientes')
+    return lambda: ctx.web.get('/clientes', query_string={'cursor': siguiente})
+
+
+@caso('GET /clientes/buscar')
+def _(ctx):
+    consulta = _consulta_cliente(ctx)
+    return lambda: ctx.web.get('/clientes/buscar', query_string={'q': consulta})
+
+
+@caso('GET /reservas')
+def _(ctx):
+    database._notificar_escritura('reservas')
+    return lambda: ctx.web.get('/reservas')
+
+
+@caso('GET /reservas (tabla cacheada)')
+def _(ctx):
+    return _listado(ctx, '/reservas')
+
+
+@caso('GET /reservas (304)', esperado=304)
+def _(ctx):
+    return _listado(ctx, '/reservas', condicional=True)
+
+
+@caso('GET /reservas?filtros')
+def _(ctx):
+    parametros = {'habitacion': ctx.id_habitacion(), 'estado': 'finalizada'}
+    database._notificar_escritura('reservas')
+    return lambda: ctx.web.get('/reservas', query_string=parametros)
+
+
+@caso('GET /admin/exportar/<nombre>', repeticiones=5)
+def _(ctx):
+    def operacion():
+        respuesta = ctx.web.get('/admin/exportar/reservas', query_string={'formato': 'jsonl'},
+                                headers={'Accept-Encoding': 'gzip'})
+        respuesta.get_data()
+        return respuesta
+    return operacion
+
+
+@caso('GET /habitaciones', repeticiones=10)
+def _(ctx):
+    database._notificar_escritura('habitaciones')
+    return lambda: ctx.web.get('/habitaciones')
+
+
+@caso('GET /habitaciones (tabla cacheada)')
+def _(ctx):
+    return _listado(ctx, '/habitaciones')
+
+
+@caso('GET /habitaciones (304)', esperado=304)
+def _(ctx):
+    return _listado(ctx, '/habitaciones', condicional=True)
+
+
+@caso('GET /habitaciones/estado', repeticiones=10)
+def _(ctx):
+    return lambda: ctx.web.get('/habitaciones/estado')
+
+
+@caso('POST /habitaciones/estado', repeticiones=10)
+def _(ctx):
+    habitacion = ctx.habitacion_disponible()
+    return lambda: ctx.web.post('/habitaciones/estado', data={'habitacion_id': habitacion['id'], 'nuevo_estado': 'disponible'})
+
+
+@caso('GET /reservas/extender/<id_reserva>')
+def _(ctx):
+    ruta = f"/reservas/extender/{ctx.id_reserva()}"
+    return lambda: ctx.web.get(ruta)
+
+
+@caso('POST /reservas/extender/<id_reserva>')
+def _(ctx):
+    id_reserva, salida = ctx.reserva_nueva()
+    nueva_salida = _fmt(database.datetime.strptime(salida, "%Y-%m-%dT%H:%M") + timedelta(days=1))
+    return lambda: ctx.web.post(f"/reservas/extender/{id_reserva}", data={'fecha_salida': nueva_salida})
+
+
+@caso('POST /modificar_precio')
+def _(ctx):
+    habitacion = ctx.habitacion_disponible()
+    datos = {'id_habitacion': habitacion['id'], 'precio_por_noche': str(habitacion['precio_por_noche']),
+             'nuevo_estado': 'disponible'}
+    return lambda: ctx.web.post('/modificar_precio', data=datos)
+
+
+@caso('GET /habitaciones/lote')
+def _(ctx):
+    return lambda: ctx.web.get('/habitaciones/lote')
+
+
+@caso('POST /habitaciones/lote (vista previa)')
+def _(ctx):
+    datos = {'todas': '1', 'precio_modo': 'porcentaje', 'precio_valor': '10', 'accion': 'previsualizar'}
+    return lambda: ctx.web.post('/habitaciones/lote', data=datos)
+
+
+@caso('POST /habitaciones/lote (JSON)')
+def _(ctx):
+    precio = generador.TIPOS['suite'][1] + ctx.siguiente() % 2
+    datos = {'filtro': {'tipos': ['suite']}, 'precio': {'modo': 'fijo', 'valor': str(precio)}}
+    return lambda: ctx.web.post('/habitaciones/lote', json=datos)
+
+
+@caso('GET /habitaciones/tablero')
+def _(ctx):
+    return lambda: ctx.web.get('/habitaciones/tablero')
+
+
+@caso('GET /habitaciones/tablero/eventos')
+def _(ctx):
+    def conectar():
+        # Hasta el primer evento: la suscripción y el 'inicio' (la conexión real sigue abierta)
+        respuesta = ctx.web.get('/habitaciones/tablero/eventos', buffered=False)
+        eventos = iter(respuesta.response)
+        primeros = next(eventos) + next(eventos)
+        respuesta.close()
+        return primeros
+    return conectar
+
+
+@caso('GET /admin/importar')
+def _(ctx):
+    return lambda: ctx.web.get('/admin/importar')
+
+
+@caso('POST /admin/importar')
+def _(ctx):
+    habitacion = ctx.habitacion_disponible()
+    lineas = ['nombre,apellido,dni,numero_habitacion,fecha_entrada,fecha_salida']
+    for _ in range(20):
+        entrada, salida = ctx.fechas_libres()
+        lineas.append(f"Bench,Mark,{93000000 + ctx.siguiente()},{habitacion['numero_habitacion']},"
+                      f"{entrada.replace('T', ' ')},{salida.replace('T', ' ')}")
+    contenido = "\n".join(lineas).encode()
+    return lambda: ctx.web.post('/admin/importar', data={'archivo': (io.BytesIO(contenido), 'reservas.csv')},
+                                content_type='multipart/form-data')
+
+
+# ---------------------------------------------------------------- ejecución
+
+def percentiles(tiempos):
+    ms = sorted(t * 1000 for t in tiempos)
+    if len(ms) == 1:
+        return {'p50': round(ms[0], 3), 'p95': round(ms[0], 3), 'p99': round(ms[0], 3)}
+    cortes = statistics.quantiles(ms, n=100, method='inclusive')
+    return {'p50': round(cortes[49], 3), 'p95': round(cortes[94], 3), 'p99': round(cortes[98], 3)}
+
+
+def medir(ctx, nombre, funcion, repeticiones):
+    funcion(ctx)()  # calentamiento: índice, caches y plantillas compiladas
+    tiempos = []
+    consultas = []
+    estados = set()
+    fallidas = 0
+    for _ in range(repeticiones):
+        operacion = funcion(ctx)
+        ctx.base.contador.reiniciar()
+        inicio = time.perf_counter()
+        resultado = operacion()
+        tiempos.append(time.perf_counter() - inicio)
+        consultas.append(ctx.base.contador.consultas)
+        if hasattr(resultado, 'status_code'):
+            estados.add(resultado.status_code)
+            fallidas += not 200 <= resultado.status_code < 400 or (
+                ESPERADOS.get(nombre, resultado.status_code) != resultado.status_code)
+    medicion = {'repeticiones': repeticiones, **percentiles(tiempos),
+                'consultas': statistics.median(consultas), 'consultas_max': max(consultas)}
+    if estados:
+        medicion['http'] = sorted(estados)
+    # Una ruta que responde con error suele ser rápida: sus tiempos no cuentan como medición válida
+    if fallidas:
+        esperado = ESPERADOS.get(nombre)
+        errores = ', '.join(str(e) for e in sorted(estados) if not 200 <= e < 400 or esperado not in (None, e))
+        medicion['fallo'] = (f"HTTP {errores} en {fallidas} de {repeticiones} repeticiones"
+                             f"{f', se esperaba {esperado}' if esperado else ''}")
+    return medicion
+
+
+def sin_cobertura(casos):
+    """Funciones públicas de database.py y rutas de app.py que no tienen caso"""
+    import app
+    nombres = {nombre for nombre, _, _ in casos}
+    funciones = [n for n, f in inspect.getmembers(database, inspect.isfunction)
+                 if not n.startswith('_') and n not in SIN_CASO and f.__module__ == database.__name__]
+    faltantes = [f"db.{n}" for n in funciones if not any(c == f"db.{n}" or c.startswith(f"db.{n}.") for c in nombres)]
+    for regla in app.app.url_map.iter_rules():
+        if regla.endpoint == 'static':
+            continue
+        ruta = regla.rule.replace('<int:', '<')
+        for metodo in sorted(regla.methods - {'HEAD', 'OPTIONS'}):
+            if not any(c.startswith(f"{metodo} {ruta}") for c in nombres):
+                faltantes.append(f"{metodo} {ruta}")
+    return faltantes
+
+
+def _commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def comparar(actual, anterior, umbral):
+    """Casos cuyo p50 o consultas empeoraron más que `umbral` (0.2 = 20 %) respecto del anterior"""
+    regresiones = []
+    for nombre, medicion in actual['casos'].items():
+        previa = anterior['casos'].get(nombre)
+        if not previa:
+            continue
+        if medicion.get('fallo') and not previa.get('fallo'):
+            regresiones.append(f"{nombre}: {medicion['fallo']}")
+        if medicion['consultas'] > previa['consultas']:
+            regresiones.append(f"{nombre}: consultas {previa['consultas']} -> {medicion['consultas']}")
+        # Diferencias de centésimas de milisegundo son ruido del reloj, no regresiones
+        if medicion['p50'] > previa['p50'] * (1 + umbral) and medicion['p50'] - previa['p50'] > 0.05:
+            regresiones.append(f"{nombre}: p50 {previa['p50']} ms -> {medicion['p50']} ms")
+    return regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--reservas', type=int, default=10000, help="volumen de datos (1000 a 1000000)")
+    parser.add_argument('--semilla', type=int, default=1)
+    parser.add_argument('--repeticiones', type=int, default=30)
+    parser.add_argument('--latencia-ms', type=float, default=0.0,
+                        help="latencia simulada por viaje a la base")
+    parser.add_argument('--solo', default=None, help="patrón (fnmatch) de los casos a ejecutar")
+    parser.add_argument('--salida', default=None, help="archivo JSON de resultados (por defecto stdout)")
+    parser.add_argument('--comparar', default=None, help="JSON de una corrida anterior")
+    parser.add_argument('--umbral', type=float, default=0.2, help="tolerancia de p50 al comparar")
+    parser.add_argument('--replica', action='store_true',
+                        help="leer listados, reportes y exportaciones de una copia local configurada como réplica")
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    casos = [c for c in CASOS if not args.solo or fnmatch.fnmatch(c[0], args.solo)]
+    base = BaseLocal(latencia=args.latencia_ms / 1000)
+    replica = None
+    try:
+        inicio = time.perf_counter()
+        resumen = generador.poblar(base.conectar, args.reservas, args.semilla)
+        print(f"Datos generados en {time.perf_counter() - inicio:.1f} s: {resumen['habitaciones']} habitaciones, "
+              f"{resumen['clientes']} clientes, {resumen['reservas']} reservas", file=sys.stderr)
+        database.configurar_pool(fabrica=base.conectar, minimo=1, maximo=4)
+        if args.replica:
+            # La copia no recibe las escrituras de los casos: sirve para medir, no para comparar resultados
+            replica = base.copia()
+            database.configurar_replicas([replica.conectar], retraso_max=0)
+        database.indice_disponibilidad.invalidar()
+        ctx = Contexto(base, resumen, args.semilla)
+
+        resultados = {}
+        for nombre, funcion, repeticiones in casos:
+            medicion = medir(ctx, nombre, funcion, min(repeticiones or args.repeticiones, args.repeticiones))
+            resultados[nombre] = medicion
+            print(f"{nombre:<48} p50 {medicion['p50']:>9.3f} ms  p95 {medicion['p95']:>9.3f} ms  "
+                  f"p99 {medicion['p99']:>9.3f} ms  {medicion['consultas']:>6g} consultas"
+                  f"{'  FALLO ' + medicion['fallo'] if 'fallo' in medicion else ''}", file=sys.stderr)
+    finally:
+        database.obtener_pool().cerrar_todas()
+        base.eliminar()
+        if replica:
+            database.configurar_replicas()
+            replica.eliminar()
+
+    informe = {
+        'commit': _commit(),
+        'python': platform.python_version(),
+        'datos': {k: str(v) if hasattr(v, 'isoformat') else v for k, v in resumen.items()},
+        'repeticiones': args.repeticiones,
+        'latencia_ms': args.latencia_ms,
+        'replica': args.replica,
+        'casos': resultados,
+        'fallidos': sorted(nombre for nombre, medicion in resultados.items() if 'fallo' in medicion),
+        'sin_cobertura': [] if args.solo else sin_cobertura(CASOS),
+    }
+    for nombre in informe['fallidos']:
+        print(f"Caso fallido: {nombre} ({resultados[nombre]['fallo']})", file=sys.stderr)
+    for faltante in informe['sin_cobertura']:
+        print(f"Sin benchmark: {faltante}", file=sys.stderr)
+    texto = json.dumps(informe, ensure_ascii=False, indent=2)
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as f:
+            f.write(texto)
+    else:
+        print(texto)
+
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as f:
+            regresiones = comparar(informe, json.load(f), args.umbral)
+        for regresion in regresiones:
+            print(f"Regresión: {regresion}", file=sys.stderr)
+        if regresiones:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
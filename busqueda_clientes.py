@@ -0,0 +1,228 @@
+from array import array
+from bisect import bisect_left, insort
+import heapq
+import logging
+import re
+import threading
+import time
+import unicodedata
+
+logger = logging.getLogger(__name__)
+
+# Puntaje de cada término de la consulta según cómo coincide con una palabra del cliente
+EXACTA = 3
+PREFIJO = 2
+APROXIMADA = 1
+
+# Palabras del vocabulario que puede abarcar un prefijo corto ("a", "20") antes de cortar
+MAX_EXPANSION = 500
+# Clientes que se puntúan como máximo por búsqueda
+MAX_CANDIDATOS = 50000
+# Similitud mínima de trigramas para aceptar una palabra con errores de tipeo
+SIMILITUD_MINIMA = 0.45
+
+_SEPARADOR_NUMERICO = re.compile(r"(?<=\d)[.\-\s/](?=\d)")
+_PALABRA = re.compile(r"[a-z0-9]+")
+
+
+def normalizar(texto):
+    """Minúsculas sin acentos; los números con puntos o guiones (20.123.456) quedan juntos"""
+    texto = unicodedata.normalize('NFKD', str(texto or '').lower())
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return _SEPARADOR_NUMERICO.sub('', texto)
+
+
+def palabras(texto):
+    return _PALABRA.findall(normalizar(texto))
+
+
+def palabras_cliente(cliente):
+    """Palabras indexadas de un cliente: nombre, apellido, documento, parte local del email y teléfono"""
+    resultado = palabras(cliente.get('nombre')) + palabras(cliente.get('apellido'))
+    resultado += palabras(cliente.get('dni_pasaporte_cpf'))
+    email = str(cliente.get('email') or '')
+    resultado += palabras(email.split('@', 1)[0])
+    telefono = ''.join(c for c in str(cliente.get('telefono') or '') if c.isdigit())
+    if telefono:
+        resultado.append(telefono)
+    return tuple(dict.fromkeys(resultado))
+
+
+def trigramas(palabra):
+    relleno = f"  {palabra} "
+    return {relleno[i:i + 3] for i in range(len(relleno) - 2)}
+
+
+class IndiceClientes:
+    """Índice invertido en memoria de los clientes para la búsqueda del mostrador.
+
+    Cada palabra normalizada apunta a los ids de los clientes que la contienen. Los prefijos se
+    resuelven con búsqueda binaria sobre el vocabulario ordenado y las palabras con errores de
+    tipeo con un índice de trigramas limitado a las palabras alfabéticas (nombres, apellidos),
+    que son pocas aunque haya muchos clientes.
+    """
+
+    def __init__(self, ttl=0):
+        self.ttl = ttl
+        self._lock = threading.RLock()
+        self._vaciar()
+        self._cargado_en = None
+
+    def _vaciar(self):
+        self._ids_por_palabra = {}
+        self._vocabulario = []
+        self._trigramas = {}
+        self._palabras_por_cliente = {}
+
+    @property
+    def cargado(self):
+        if self._cargado_en is None:
+            return False
+        return not self.ttl or time.monotonic() - self._cargado_en < self.ttl
+
+    @property
+    def vence_en(self):
+        """Segundos hasta que vence la carga actual; None si no está cargado o no tiene TTL"""
+        if self._cargado_en is None or not self.ttl:
+            return None
+        return self._cargado_en + self.ttl - time.monotonic()
+
+    def __len__(self):
+        return len(self._palabras_por_cliente)
+
+    def _indexar(self, id_cliente, palabras_cliente, ordenar=True):
+        self._palabras_por_cliente[id_cliente] = palabras_cliente
+        for palabra in palabras_cliente:
+            ids = self._ids_por_palabra.get(palabra)
+            if ids is None:
+                # La mayoría de las palabras (documentos, teléfonos) son de un solo cliente:
+                # se guarda el id suelto y sólo se pasa a array cuando se repite
+                self._ids_por_palabra[palabra] = id_cliente
+                if ordenar:
+                    self._vocabulario.insert(bisect_left(self._vocabulario, palabra), palabra)
+                if palabra.isalpha():
+                    for trigrama in trigramas(palabra):
+                        self._trigramas.setdefault(trigrama, set()).add(palabra)
+            elif isinstance(ids, int):
+                if ids != id_cliente:
+                    self._ids_por_palabra[palabra] = array('I', sorted((ids, id_cliente)))
+            elif id_cliente > ids[-1]:
+                ids.append(id_cliente)
+            else:
+                # Los ids de cada palabra se mantienen ordenados para recorrerlos de mayor a menor
+                insort(ids, id_cliente)
+
+    def _desindexar(self, id_cliente):
+        for palabra in self._palabras_por_cliente.pop(id_cliente, ()):
+            ids = self._ids_por_palabra.get(palabra)
+            if isinstance(ids, int):
+                if ids == id_cliente:
+                    del self._ids_por_palabra[palabra]
+                    pos = bisect_left(self._vocabulario, palabra)
+                    if pos < len(self._vocabulario) and self._vocabulario[pos] == palabra:
+                        self._vocabulario.pop(pos)
+                    for trigrama in trigramas(palabra) if palabra.isalpha() else ():
+                        self._trigramas.get(trigrama, set()).discard(palabra)
+            elif ids is not None and id_cliente in ids:
+                ids.remove(id_cliente)
+                if len(ids) == 1:
+                    self._ids_por_palabra[palabra] = ids[0]
+
+    def reconstruir(self, clientes):
+        """Reemplaza el contenido con filas de clientes (id_cliente, nombre, apellido, ...)"""
+        with self._lock:
+            self._vaciar()
+            for cliente in clientes:
+                self._indexar(cliente['id_cliente'], palabras_cliente(cliente), ordenar=False)
+            self._vocabulario = sorted(self._ids_por_palabra)
+            self._cargado_en = time.monotonic()
+        logger.info(f"Índice de clientes cargado: {len(self._palabras_por_cliente)} clientes, "
+                    f"{len(self._vocabulario)} palabras")
+
+    def invalidar(self):
+        with self._lock:
+            self._cargado_en = None
+
+    def agregar(self, cliente):
+        """Indexa un cliente nuevo o reemplaza las palabras de uno existente"""
+        with self._lock:
+            id_cliente = int(cliente['id_cliente'])
+            self._desindexar(id_cliente)
+            self._indexar(id_cliente, palabras_cliente(cliente))
+
+    def _coincidencias(self, termino):
+        """Palabras del vocabulario que coinciden con un término de la consulta y su puntaje"""
+        coincidencias = {}
+        pos = bisect_left(self._vocabulario, termino)
+        for palabra in self._vocabulario[pos:pos + MAX_EXPANSION]:
+            if not palabra.startswith(termino):
+                break
+            coincidencias[palabra] = EXACTA if palabra == termino else PREFIJO
+        if len(termino) >= 3 and termino.isalpha():
+            propios = trigramas(termino)
+            compartidos = {}
+            for trigrama in propios:
+                for palabra in self._trigramas.get(trigrama, ()):
+                    compartidos[palabra] = compartidos.get(palabra, 0) + 1
+            for palabra, n in compartidos.items():
+                if palabra not in coincidencias and n / (len(propios) + len(palabra) + 1 - n) >= SIMILITUD_MINIMA:
+                    coincidencias[palabra] = APROXIMADA
+        return coincidencias
+
+    def _cantidad(self, palabra):
+        ids = self._ids_por_palabra[palabra]
+        return 1 if isinstance(ids, int) else len(ids)
+
+    def _puntaje(self, id_cliente, por_termino):
+        """Suma del mejor puntaje de cada término entre las palabras del cliente; 0 si alguno no coincide"""
+        propias = self._palabras_por_cliente.get(id_cliente, ())
+        puntaje = 0
+        for coincidencias in por_termino:
+            mejor = max((coincidencias.get(p, 0) for p in propias), default=0)
+            if not mejor:
+                return 0
+            puntaje += mejor
+        return puntaje
+
+    def buscar(self, consulta, limite=10):
+        """Ids de los clientes que coinciden con todos los términos, del mejor al peor puntaje.
+
+        Devuelve una lista de (puntaje, id_cliente); a igual puntaje, primero los más recientes.
+        Los candidatos salen del término más selectivo, de la mejor clase de coincidencia a la
+        peor y de los ids más altos a los más bajos, y el recorrido se corta en cuanto los
+        `limite` mejores ya tienen el puntaje máximo posible.
+        """
+        terminos = list(dict.fromkeys(palabras(consulta)))
+        if not terminos:
+            return []
+        with self._lock:
+            por_termino = [self._coincidencias(t) for t in terminos]
+            if not all(por_termino):
+                return []
+            maximo = sum(max(c.values()) for c in por_termino)
+            pivote = min(por_termino, key=lambda c: sum(self._cantidad(p) for p in c))
+            mejores = []
+            vistos = set()
+            for clase in sorted(set(pivote.values()), reverse=True):
+                # Mezcla perezosa de las listas de ids (ordenadas) de mayor a menor
+                listas = []
+                for palabra, puntaje in pivote.items():
+                    if puntaje == clase:
+                        ids = self._ids_por_palabra[palabra]
+                        listas.append((ids,) if isinstance(ids, int) else reversed(ids))
+                for id_cliente in heapq.merge(*listas, reverse=True):
+                    if id_cliente in vistos:
+                        continue
+                    vistos.add(id_cliente)
+                    puntaje = self._puntaje(id_cliente, por_termino)
+                    if not puntaje:
+                        continue
+                    if len(mejores) < limite:
+                        heapq.heappush(mejores, (puntaje, id_cliente))
+                    elif (puntaje, id_cliente) > mejores[0]:
+                        heapq.heapreplace(mejores, (puntaje, id_cliente))
+                    if len(mejores) >= limite and mejores[0][0] >= maximo:
+                        return sorted(mejores, reverse=True)
+                    if len(vistos) >= MAX_CANDIDATOS:
+                        return sorted(mejores, reverse=True)
+        return sorted(mejores, reverse=True)
@@ -0,0 +1,401 @@
+from collections import OrderedDict
+import contextvars
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+import json
+import logging
+import os
+import sqlite3
+import stat
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Espacio -> (segundos de vida, máximo de entradas) por defecto; se ajustan con
+# DB_CACHE_TTL_<ESPACIO> y DB_CACHE_MAX_<ESPACIO>
+ESPACIOS = {
+    'cliente': (300, 5000),
+    'habitacion': (60, 1000),
+    'reserva': (60, 5000),
+    # Tablas HTML de los listados, con la versión de los datos en la clave
+    'fragmento': (300, 500),
+}
+
+_AUSENTE = object()
+# Entidades ya leídas en la petición en curso: {(espacio, clave): valor}
+_memo_peticion = contextvars.ContextVar('cache_memo_peticion', default=None)
+
+
+class MemoriaLocal:
+    """LRU en memoria del proceso, con vencimiento por entrada y un máximo por espacio"""
+
+    # Las versiones sólo cambian con las escrituras de este proceso
+    compartido = False
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._espacios = {}
+        self._versiones = {}
+        self.expulsiones = 0
+
+    def leer(self, espacio, clave):
+        with self._lock:
+            entradas = self._espacios.get(espacio)
+            entrada = entradas.get(clave) if entradas else None
+            if entrada is None:
+                return _AUSENTE
+            if entrada[1] <= time.monotonic():
+                del entradas[clave]
+                return _AUSENTE
+            entradas.move_to_end(clave)
+            return entrada[0]
+
+    def escribir(self, espacio, clave, valor, ttl, maximo):
+        with self._lock:
+            entradas = self._espacios.setdefault(espacio, OrderedDict())
+            entradas[clave] = (valor, time.monotonic() + ttl)
+            entradas.move_to_end(clave)
+            while len(entradas) > maximo:
+                entradas.popitem(last=False)
+                self.expulsiones += 1
+
+    def borrar(self, espacio, claves):
+        with self._lock:
+            entradas = self._espacios.get(espacio, {})
+            for clave in claves:
+                entradas.pop(clave, None)
+
+    def vaciar(self, espacio=None):
+        with self._lock:
+            if espacio is None:
+                self._espacios.clear()
+            else:
+                self._espacios.pop(espacio, None)
+
+    def tamano(self, espacio):
+        with self._lock:
+            return len(self._espacios.get(espacio, ()))
+
+    def incrementar(self, nombres):
+        with self._lock:
+            for nombre in nombres:
+                self._versiones[nombre] = self._versiones.get(nombre, 0) + 1
+
+    def versiones(self, nombres):
+        with self._lock:
+            return tuple(self._versiones.get(nombre, 0) for nombre in nombres)
+
+
+# Tipos de las filas de MySQL que JSON no representa: se guardan como {"$tipo": texto}
+_A_JSON = (
+    (datetime, '$datetime', datetime.isoformat),
+    (date, '$date', date.isoformat),
+    (Decimal, '$decimal', str),
+    (timedelta, '$timedelta', timedelta.total_seconds),
+)
+_DESDE_JSON = {
+    '$datetime': datetime.fromisoformat,
+    '$date': date.fromisoformat,
+    '$decimal': Decimal,
+    '$timedelta': lambda segundos: timedelta(seconds=segundos),
+}
+
+
+def _a_json(valor):
+    for tipo, etiqueta, convertir in _A_JSON:
+        if isinstance(valor, tipo):
+            return {etiqueta: convertir(valor)}
+    raise TypeError(f"No se puede guardar en la caché compartida un valor {type(valor).__name__}")
+
+
+def _desde_json(objeto):
+    if len(objeto) == 1:
+        etiqueta, valor = next(iter(objeto.items()))
+        if etiqueta in _DESDE_JSON:
+            return _DESDE_JSON[etiqueta](valor)
+    return objeto
+
+
+def _validar_directorio(ruta):
+    """El archivo de la caché tiene que estar en un directorio del usuario de la aplicación que
+    nadie más pueda escribir: otro usuario podría dejar ahí entradas falsas"""
+    directorio = os.path.dirname(os.path.abspath(ruta))
+    try:
+        datos = os.stat(directorio)
+    except OSError as e:
+        raise ValueError(f"Directorio de la caché compartida inaccesible: {directorio} ({e})")
+    if not stat.S_ISDIR(datos.st_mode):
+        raise ValueError(f"{directorio} no es un directorio")
+    if hasattr(os, 'getuid') and datos.st_uid != os.getuid():
+        raise ValueError(f"El directorio de la caché compartida {directorio} no pertenece al usuario de la aplicación")
+    if datos.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+        raise ValueError(f"El directorio de la caché compartida {directorio} lo pueden escribir otros usuarios")
+
+
+class SqliteCompartido:
+    """Entradas en un archivo SQLite local que comparten todos los workers de la máquina.
+
+    Una invalidación de cualquier proceso borra la entrada para todos. Para no escribir en cada
+    acierto, al superar el máximo se expulsan las entradas escritas hace más tiempo (no las
+    menos leídas). Un error de SQLite se registra y cuenta como fallo: la lectura sigue a MySQL.
+    Los valores se guardan como JSON; el archivo tiene que estar en un directorio propio de la
+    aplicación (ValueError si no).
+    """
+
+    compartido = True
+
+    def __init__(self, ruta, recortar_cada=100):
+        _validar_directorio(ruta)
+        self.ruta = ruta
+        self.recortar_cada = recortar_cada
+        self.expulsiones = 0
+        self._local = threading.local()
+        self._escrituras = 0
+
+    def _conexion(self):
+        # Una conexión por hilo y por proceso: las heredadas de un fork no se reutilizan
+        conexion = getattr(self._local, 'conexion', None)
+        if conexion is None or self._local.pid != os.getpid():
+            conexion = sqlite3.connect(self.ruta, timeout=1, isolation_level=None)
+            conexion.execute("PRAGMA journal_mode=WAL")
+            conexion.execute("PRAGMA synchronous=OFF")
+            conexion.execute("""
+                CREATE TABLE IF NOT EXISTS cache_entradas (
+                    espacio TEXT NOT NULL,
+                    clave TEXT NOT NULL,
+                    valor BLOB NOT NULL,
+                    expira REAL NOT NULL,
+                    escrito REAL NOT NULL,
+                    PRIMARY KEY (espacio, clave)
+                ) WITHOUT ROWID
+            """)
+            conexion.execute("CREATE INDEX IF NOT EXISTS idx_cache_escrito ON cache_entradas (espacio, escrito)")
+            conexion.execute("""
+                CREATE TABLE IF NOT EXISTS cache_versiones (
+                    nombre TEXT PRIMARY KEY,
+                    version INTEGER NOT NULL
+                )
+            """)
+            self._local.conexion = conexion
+            self._local.pid = os.getpid()
+        return conexion
+
+    def _ejecutar(self, sql, params=(), muchos=False):
+        try:
+            conexion = self._conexion()
+            if muchos:
+                return conexion.executemany(sql, params).fetchall()
+            return conexion.execute(sql, params).fetchall()
+        except sqlite3.Error as e:
+            logger.warning(f"Error en la caché compartida {self.ruta}: {e}")
+            return None
+
+    def leer(self, espacio, clave):
+        filas = self._ejecutar("SELECT valor, expira FROM cache_entradas WHERE espacio = ? AND clave = ?",
+                               (espacio, clave))
+        if not filas or filas[0][1] <= time.time():
+            return _AUSENTE
+        try:
+            return json.loads(filas[0][0], object_hook=_desde_json)
+        except (TypeError, ValueError) as e:
+            logger.warning(f"Entrada ilegible en la caché compartida {self.ruta}: {e}")
+            return _AUSENTE
+
+    def escribir(self, espacio, clave, valor, ttl, maximo):
+        try:
+            texto = json.dumps(valor, default=_a_json, separators=(',', ':'))
+        except (TypeError, ValueError) as e:
+            logger.warning(f"No se guarda {espacio}:{clave} en la caché compartida: {e}")
+            return
+        ahora = time.time()
+        self._ejecutar("INSERT OR REPLACE INTO cache_entradas VALUES (?, ?, ?, ?, ?)",
+                       (espacio, clave, texto, ahora + ttl, ahora))
+        self._escrituras += 1
+        if self._escrituras % self.recortar_cada == 0:
+            self._recortar(espacio, maximo, ahora)
+
+    def _recortar(self, espacio, maximo, ahora):
+        self._ejecutar("DELETE FROM cache_entradas WHERE espacio = ? AND expira <= ?", (espacio, ahora))
+        filas = self._ejecutar("SELECT COUNT(*) FROM cache_entradas WHERE espacio = ?", (espacio,))
+        sobrantes = filas[0][0] - maximo if filas else 0
+        if sobrantes > 0:
+            self._ejecutar("""
+                DELETE FROM cache_entradas
+                WHERE espacio = ? AND clave IN (
+                    SELECT clave FROM cache_entradas WHERE espacio = ? ORDER BY escrito LIMIT ?
+                )
+            """, (espacio, espacio, sobrantes))
+            self.expulsiones += sobrantes
+
+    def borrar(self, espacio, claves):
+        self._ejecutar("DELETE FROM cache_entradas WHERE espacio = ? AND clave = ?",
+                       [(espacio, clave) for clave in claves], muchos=True)
+
+    def vaciar(self, espacio=None):
+        if espacio is None:
+            self._ejecutar("DELETE FROM cache_entradas")
+        else:
+            self._ejecutar("DELETE FROM cache_entradas WHERE espacio = ?", (espacio,))
+
+    def tamano(self, espacio):
+        filas = self._ejecutar("SELECT COUNT(*) FROM cache_entradas WHERE espacio = ? AND expira > ?",
+                               (espacio, time.time()))
+        return filas[0][0] if filas else 0
+
+    def incrementar(self, nombres):
+        self._ejecutar("""
+            INSERT INTO cache_versiones VALUES (?, 1)
+            ON CONFLICT (nombre) DO UPDATE SET version = version + 1
+        """, [(nombre,) for nombre in nombres], muchos=True)
+
+    def versiones(self, nombres):
+        """Versión de cada nombre; None si no se pudo leer el archivo"""
+        filas = self._ejecutar(f"SELECT nombre, version FROM cache_versiones WHERE nombre IN ({', '.join('?' * len(nombres))})",
+                               tuple(nombres))
+        if filas is None:
+            return None
+        actuales = dict(filas)
+        return tuple(actuales.get(nombre, 0) for nombre in nombres)
+
+
+class CacheEntidades:
+    """Caché de lectura (read-through) de entidades por id con memoria por petición.
+
+    `obtener` busca primero en lo ya leído durante la petición en curso, luego en el backend y
+    por último llama a la función de carga; los resultados None (inexistente o error de base) no
+    se guardan. Cada escritura invalida explícitamente las claves que modifica. Sin backend la
+    caché queda desactivada y `obtener` siempre llama a la función de carga.
+    """
+
+    def __init__(self, backend=None, espacios=None):
+        self.backend = backend
+        self.espacios = dict(espacios or ESPACIOS)
+        self._lock = threading.Lock()
+        self._contadores = {espacio: dict.fromkeys(('aciertos', 'aciertos_peticion', 'fallos', 'invalidaciones'), 0)
+                            for espacio in self.espacios}
+        # Una invalidación durante una carga impide guardar el valor leído antes de ella
+        self._generaciones = dict.fromkeys(self.espacios, 0)
+        # Sin caché las versiones de los datos se siguen llevando en el proceso
+        self._versiones = backend if backend is not None else MemoriaLocal()
+
+    def _contar(self, espacio, contador):
+        with self._lock:
+            self._contadores[espacio][contador] += 1
+
+    def obtener(self, espacio, clave, cargar, *args):
+        if self.backend is None:
+            return cargar(*args)
+        clave = str(clave)
+        memo = _memo_peticion.get()
+        if memo is not None and (espacio, clave) in memo:
+            self._contar(espacio, 'aciertos_peticion')
+            return dict(memo[(espacio, clave)])
+        valor = self.backend.leer(espacio, clave)
+        if valor is not _AUSENTE:
+            self._contar(espacio, 'aciertos')
+        else:
+            self._contar(espacio, 'fallos')
+            generacion = self._generaciones[espacio]
+            valor = cargar(*args)
+            if valor is None:
+                return None
+            if generacion == self._generaciones[espacio]:
+                ttl, maximo = self.espacios[espacio]
+                self.backend.escribir(espacio, clave, valor, ttl, maximo)
+        if memo is not None:
+            memo[(espacio, clave)] = valor
+        # Copia para que quien la recibe pueda modificarla sin tocar lo guardado
+        return dict(valor)
+
+    def leer(self, espacio, clave):
+        """Valor guardado con `guardar`, o None; para lo que no se carga de a una fila"""
+        if self.backend is None:
+            return None
+        valor = self.backend.leer(espacio, str(clave))
+        self._contar(espacio, 'fallos' if valor is _AUSENTE else 'aciertos')
+        return None if valor is _AUSENTE else valor
+
+    def guardar(self, espacio, clave, valor, ttl=None):
+        if self.backend is None:
+            return
+        ttl_espacio, maximo = self.espacios[espacio]
+        self.backend.escribir(espacio, str(clave), valor, min(ttl_espacio, ttl) if ttl is not None else ttl_espacio, maximo)
+
+    def incrementar_versiones(self, nombres):
+        self._versiones.incrementar(nombres)
+
+    def versiones(self, nombres):
+        """Tupla con la versión de cada nombre (tabla); cambia con cada escritura que la toca"""
+        return self._versiones.versiones(nombres)
+
+    @property
+    def versiones_compartidas(self):
+        """True si las escrituras de otros procesos también cambian las versiones que se leen aquí"""
+        return self._versiones.compartido
+
+    def invalidar(self, espacio, *claves):
+        """Descarta las claves dadas del espacio; sin claves, el espacio completo"""
+        if self.backend is None:
+            return
+        claves = [str(clave) for clave in claves]
+        with self._lock:
+            self._generaciones[espacio] += 1
+            self._contadores[espacio]['invalidaciones'] += 1
+        if claves:
+            self.backend.borrar(espacio, claves)
+        else:
+            self.backend.vaciar(espacio)
+        memo = _memo_peticion.get()
+        if memo:
+            for clave in list(memo):
+                if clave[0] == espacio and (not claves or clave[1] in claves):
+                    del memo[clave]
+
+    def vaciar(self):
+        if self.backend is not None:
+            self.backend.vaciar()
+
+    def estadisticas(self):
+        with self._lock:
+            contadores = {espacio: dict(valores) for espacio, valores in self._contadores.items()}
+        resultado = {'backend': type(self.backend).__name__ if self.backend else None, 'espacios': {}}
+        for espacio, valores in contadores.items():
+            lecturas = valores['aciertos'] + valores['aciertos_peticion'] + valores['fallos']
+            ttl, maximo = self.espacios[espacio]
+            resultado['espacios'][espacio] = dict(
+                valores, ttl=ttl, maximo=maximo,
+                entradas=self.backend.tamano(espacio) if self.backend else 0,
+                tasa_aciertos=round((lecturas - valores['fallos']) / lecturas, 4) if lecturas else 0.0)
+        if self.backend is not None:
+            resultado['expulsiones'] = self.backend.expulsiones
+        return resultado
+
+
+def iniciar_peticion():
+    """Abre la memoria de la petición en curso; las tareas en paralelo la comparten"""
+    _memo_peticion.set({})
+
+
+def terminar_peticion():
+    _memo_peticion.set(None)
+
+
+def desde_entorno():
+    """Caché configurada con DB_CACHE=memoria (por defecto), sqlite (con DB_CACHE_RUTA) o 0 (desactivada)"""
+    modo = os.environ.get('DB_CACHE', 'memoria')
+    espacios = {espacio: (float(os.environ.get(f'DB_CACHE_TTL_{espacio.upper()}', ttl)),
+                          int(os.environ.get(f'DB_CACHE_MAX_{espacio.upper()}', maximo)))
+                for espacio, (ttl, maximo) in ESPACIOS.items()}
+    if modo == '0':
+        backend = None
+    elif modo == 'sqlite':
+        ruta = os.environ.get('DB_CACHE_RUTA')
+        if not ruta:
+            raise ValueError("DB_CACHE=sqlite requiere DB_CACHE_RUTA en un directorio propio de la aplicación")
+        backend = SqliteCompartido(ruta)
+    elif modo == 'memoria':
+        backend = MemoriaLocal()
+    else:
+        raise ValueError(f"DB_CACHE desconocido: {modo}")
+    return CacheEntidades(backend, espacios)
@@ -0,0 +1,143 @@
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+from disponibilidad import piso
+
+CENTAVOS = Decimal('0.01')
+ESTADOS = ('disponible', 'ocupada', 'mantenimiento')
+MODOS_PRECIO = ('fijo', 'porcentaje', 'por_tipo')
+
+
+def _lista(valor):
+    """Lista de textos desde '101, 102' o una lista; vacía si no hay nada"""
+    if valor is None:
+        return []
+    partes = valor.split(',') if isinstance(valor, str) else valor
+    return [str(parte).strip() for parte in partes if str(parte).strip()]
+
+
+def _decimal(valor, campo):
+    try:
+        numero = Decimal(str(valor).strip())
+    except InvalidOperation:
+        raise ValueError(f"{campo} no es un número: {valor!r}")
+    # NaN e Infinity se leen como Decimal pero al compararlos o redondearlos lanzan InvalidOperation
+    if not numero.is_finite():
+        raise ValueError(f"{campo} no es un número: {valor!r}")
+    return numero
+
+
+def _numero(valor, campo):
+    if valor is None or str(valor).strip() == '':
+        return None
+    if not str(valor).strip().isdigit():
+        raise ValueError(f"{campo} debe ser un número de habitación: {valor!r}")
+    return int(valor)
+
+
+def leer_filtro(datos):
+    """Normaliza la selección: ids o números explícitos, tipos, pisos y rango de números; lanza ValueError"""
+    filtro = {
+        'ids': [int(i) for i in _lista(datos.get('ids'))],
+        'numeros': _lista(datos.get('numeros')),
+        'tipos': _lista(datos.get('tipos') or datos.get('tipo')),
+        'pisos': _lista(datos.get('pisos') or datos.get('piso')),
+        'numero_desde': _numero(datos.get('numero_desde'), 'numero_desde'),
+        'numero_hasta': _numero(datos.get('numero_hasta'), 'numero_hasta'),
+    }
+    if not any(filtro.values()) and not datos.get('todas'):
+        raise ValueError("Indique qué habitaciones cambiar (lista, tipo, piso o rango) o todas")
+    return filtro
+
+
+def leer_regla_precio(datos):
+    """Regla de precio {'modo', 'valor', 'precios'} o None si no se cambia el precio; lanza ValueError.
+
+    fijo: el mismo precio para todas; porcentaje: suma el porcentaje (negativo para bajar);
+    por_tipo: un precio por tipo de habitación, las de otros tipos conservan el suyo.
+    """
+    modo = (datos.get('modo') or '').strip()
+    if not modo:
+        return None
+    if modo not in MODOS_PRECIO:
+        raise ValueError(f"Modo de precio desconocido: {modo}")
+    regla = {'modo': modo, 'valor': None, 'precios': {}}
+    if modo == 'por_tipo':
+        regla['precios'] = {tipo: _decimal(precio, f"precio de {tipo}")
+                            for tipo, precio in (datos.get('precios') or {}).items() if str(precio).strip()}
+        if not regla['precios']:
+            raise ValueError("Indique el precio de al menos un tipo")
+    else:
+        regla['valor'] = _decimal(datos.get('valor'), 'valor')
+    if modo == 'porcentaje' and regla['valor'] <= -100:
+        raise ValueError("El porcentaje no puede bajar el precio a cero")
+    return regla
+
+
+def leer_estado(valor):
+    estado = (valor or '').strip()
+    if estado and estado not in ESTADOS:
+        raise ValueError(f"Estado desconocido: {estado}")
+    return estado or None
+
+
+def coincide(habitacion, filtro):
+    """True si la habitación entra en todos los criterios indicados del filtro"""
+    numero = str(habitacion['numero_habitacion'])
+    if filtro['ids'] and int(habitacion['id']) not in filtro['ids']:
+        return False
+    if filtro['numeros'] and numero not in filtro['numeros']:
+        return False
+    if filtro['tipos'] and habitacion['tipo'] not in filtro['tipos']:
+        return False
+    if filtro['pisos'] and piso(habitacion) not in filtro['pisos']:
+        return False
+    if filtro['numero_desde'] is not None or filtro['numero_hasta'] is not None:
+        if not numero.isdigit():
+            return False
+        if filtro['numero_desde'] is not None and int(numero) < filtro['numero_desde']:
+            return False
+        if filtro['numero_hasta'] is not None and int(numero) > filtro['numero_hasta']:
+            return False
+    return True
+
+
+def nuevo_precio(habitacion, regla):
+    """Precio que deja la regla, redondeado a centavos; el actual si la regla no lo cambia"""
+    actual = Decimal(str(habitacion['precio_por_noche']))
+    if regla is None:
+        return actual
+    if regla['modo'] == 'fijo':
+        precio = regla['valor']
+    elif regla['modo'] == 'porcentaje':
+        precio = actual * (100 + regla['valor']) / 100
+    else:
+        precio = regla['precios'].get(habitacion['tipo'], actual)
+    precio = precio.quantize(CENTAVOS, ROUND_HALF_UP)
+    if precio <= 0:
+        raise ValueError(f"El precio de la habitación {habitacion['numero_habitacion']} quedaría en {precio}")
+    return precio
+
+
+def planificar(habitaciones, filtro, regla=None, estado=None):
+    """Cambios que produce la regla de precio y el estado sobre las habitaciones del filtro.
+
+    Devuelve las habitaciones seleccionadas con precio y estado anterior y nuevo; `cambia` es False
+    en las que quedan igual, que no hace falta actualizar.
+    """
+    plan = []
+    for habitacion in habitaciones:
+        if not coincide(habitacion, filtro):
+            continue
+        precio = nuevo_precio(habitacion, regla)
+        estado_nuevo = estado or habitacion['estado']
+        plan.append({
+            'id': habitacion['id'],
+            'numero_habitacion': habitacion['numero_habitacion'],
+            'tipo': habitacion['tipo'],
+            'precio_anterior': Decimal(str(habitacion['precio_por_noche'])),
+            'precio_nuevo': precio,
+            'estado_anterior': habitacion['estado'],
+            'estado_nuevo': estado_nuevo,
+            'cambia': precio != Decimal(str(habitacion['precio_por_noche'])) or estado_nuevo != habitacion['estado'],
+        })
+    return plan
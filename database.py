@@ -1,28 +1,459 @@
 import mysql.connector
-from datetime import datetime
+from mysql.connector import errorcode
+from datetime import date, datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor, wait
+import base64
+import contextvars
+import json
 import logging
-from decimal import Decimal
+import os
+import random
+import sys
+import threading
+import time
+from decimal import Decimal, ROUND_HALF_UP
+import busqueda_clientes
+import cache
+import cambios_habitaciones
+import disponibilidad
+import metricas
+import pool_conexiones
+import reportes
+import tarifas
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+_pool = None
+_pool_lock = threading.Lock()
+
+# Índice en memoria de disponibilidad; se recarga tras DB_INDICE_TTL segundos
+# para recoger cambios hechos por otros procesos
+indice_disponibilidad = disponibilidad.IndiceDisponibilidad(ttl=float(os.environ.get('DB_INDICE_TTL', 300)))
+
+# Índice de búsqueda de clientes; con DB_BUSQUEDA_INDICE=0 se busca siempre con SQL
+indice_clientes = busqueda_clientes.IndiceClientes(ttl=float(os.environ.get('DB_BUSQUEDA_TTL', 600)))
+BUSQUEDA_CON_INDICE = os.environ.get('DB_BUSQUEDA_INDICE', '1') != '0'
+
+# Caché de clientes, habitaciones y reservas por id (DB_CACHE=memoria|sqlite|0)
+cache_entidades = cache.desde_entorno()
+
+def _nuevo_pool(**opciones):
+    """Pool con la configuración del entorno y los cursores instrumentados por metricas"""
+    parametros = pool_conexiones.opciones_pool_desde_entorno()
+    parametros['envolver_cursor'] = metricas.instrumentar_cursor
+    parametros.update(opciones)
+    return pool_conexiones.PoolConexiones(**parametros)
+
+def configurar_pool(**opciones):
+    """Reemplaza el pool de conexiones (p. ej. con una fábrica de base local de prueba)"""
+    global _pool
+    nuevo = _nuevo_pool(**opciones)
+    with _pool_lock:
+        anterior, _pool = _pool, nuevo
+    if anterior:
+        anterior.cerrar_todas()
+    # El ejecutor de lecturas en paralelo se dimensiona con el pool: se vuelve a crear en el próximo uso
+    global _ejecutor
+    with _ejecutor_lock:
+        ejecutor, _ejecutor = _ejecutor, None
+    if ejecutor:
+        ejecutor.shutdown(wait=False)
+    return _pool
+
+def obtener_pool():
+    """Devuelve el pool de conexiones del proceso, creándolo en el primer uso"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = _nuevo_pool()
+    return _pool
+
+def estadisticas_cache():
+    """Aciertos, fallos e invalidaciones de la caché de entidades por espacio"""
+    return cache_entidades.estadisticas()
+
+def estadisticas_pool():
+    """Métricas del pool de conexiones (en uso, inactivas, esperas)"""
+    return obtener_pool().estadisticas()
+
 def conectar():
-    """Establece conexión con la base de datos"""
-    try:
-        conn = mysql.connector.connect(
-        host='localhost',
-        user='root',         
-        password='',         
-            database='hotel',
-            charset='utf8mb4',
-            collation='utf8mb4_general_ci'
-    )
-        return conn
+    """Obtiene una conexión del pool; al cerrarla se devuelve al pool"""
+    try:
+        return obtener_pool().obtener()
     except mysql.connector.Error as e:
         logger.error(f"Error de conexión a la base de datos: {e}")
         raise
 
+# Réplicas de lectura (DB_REPLICAS); None hasta el primer uso y un conjunto vacío si no hay
+_replicas = None
+_replicas_lock = threading.Lock()
+# Después de escribir, la misma sesión lee del primario durante estos segundos para ver sus cambios;
+# conviene que supere DB_REPLICA_RETRASO_MAX más DB_REPLICA_REVISION
+LEER_PRIMARIO_TRAS_ESCRITURA = float(os.environ.get('DB_LEER_PRIMARIO_TRAS_ESCRITURA', 15))
+# Hora (time.time) hasta la que las lecturas de este contexto van al primario; app.py la guarda en la sesión
+_primario_hasta = contextvars.ContextVar('db_primario_hasta', default=0.0)
+_lecturas = {'replica': 0, 'primario_tras_escritura': 0, 'primario_sin_replica': 0}
+_lecturas_lock = threading.Lock()
+
+def configurar_replicas(fabricas=(), **opciones):
+    """Reemplaza las réplicas de lectura por una por fábrica (p. ej. bases locales de prueba); sin fábricas, ninguna"""
+    global _replicas
+    pools = [_nuevo_pool(fabrica=fabrica, nombre=f"replica-{i + 1}") for i, fabrica in enumerate(fabricas)]
+    nuevo = pool_conexiones.ConjuntoReplicas(pools, **{**pool_conexiones.opciones_replicas_desde_entorno(), **opciones})
+    with _replicas_lock:
+        anterior, _replicas = _replicas, nuevo
+    if anterior:
+        anterior.cerrar_todas()
+    return _replicas
+
+def obtener_replicas():
+    """Devuelve las réplicas de lectura del proceso (las de DB_REPLICAS), creándolas en el primer uso"""
+    global _replicas
+    if _replicas is None:
+        with _replicas_lock:
+            if _replicas is None:
+                pools = [_nuevo_pool(fabrica=pool_conexiones.fabrica_mysql(**config),
+                                     nombre=f"replica-{config['host']}:{config['port']}")
+                         for config in pool_conexiones.replicas_desde_entorno()]
+                _replicas = pool_conexiones.ConjuntoReplicas(pools, **pool_conexiones.opciones_replicas_desde_entorno())
+    return _replicas
+
+def fijar_primario_hasta(momento):
+    """Fija al empezar una petición hasta cuándo lee del primario la sesión (lo que guardó primario_hasta)"""
+    _primario_hasta.set(float(momento or 0.0))
+
+def primario_hasta():
+    return _primario_hasta.get()
+
+def estadisticas_replicas():
+    """Lecturas por destino y estado de cada réplica"""
+    with _lecturas_lock:
+        lecturas = dict(_lecturas)
+    return {'lecturas': lecturas, 'replicas': obtener_replicas().estadisticas()}
+
+def _contar_lectura(destino):
+    with _lecturas_lock:
+        _lecturas[destino] += 1
+
+def conectar_lectura():
+    """Conexión para listados, reportes y exportaciones, que toleran unos segundos de atraso.
+
+    Va a una réplica sana por turno; al primario si no hay réplicas, si ninguna está sana o si la
+    sesión escribió hace menos de DB_LEER_PRIMARIO_TRAS_ESCRITURA segundos. Las lecturas que
+    alimentan índices y cachés en memoria o que preceden a una escritura usan conectar().
+    """
+    replicas = obtener_replicas()
+    if not replicas:
+        return conectar()
+    if time.time() < _primario_hasta.get():
+        _contar_lectura('primario_tras_escritura')
+        return conectar()
+    try:
+        conexion = replicas.obtener()
+    except Exception as e:
+        logger.error(f"Error al elegir una réplica de lectura: {e}")
+        conexion = None
+    if conexion is None:
+        _contar_lectura('primario_sin_replica')
+        return conectar()
+    _contar_lectura('replica')
+    return conexion
+
+# Una transacción de reserva que MySQL elige como víctima de un interbloqueo o cuya espera de
+# bloqueo vence se repite completa hasta DB_REINTENTOS_BLOQUEO veces, con esperas crecientes
+REINTENTOS_BLOQUEO = int(os.environ.get('DB_REINTENTOS_BLOQUEO', 3))
+ESPERA_REINTENTO = float(os.environ.get('DB_ESPERA_REINTENTO', 0.05))
+_ERRORES_DE_BLOQUEO = (errorcode.ER_LOCK_DEADLOCK, errorcode.ER_LOCK_WAIT_TIMEOUT)
+_bloqueos = {'reintentos': 0, 'agotados': 0}
+_bloqueos_lock = threading.Lock()
+
+def estadisticas_bloqueos():
+    """Transacciones repetidas por un bloqueo y las que agotaron los reintentos"""
+    with _bloqueos_lock:
+        return dict(_bloqueos)
+
+def _reintentar_tras_bloqueo(e, intento):
+    """True, después de esperar, si el error es un interbloqueo o una espera vencida y quedan intentos"""
+    if e.errno not in _ERRORES_DE_BLOQUEO:
+        return False
+    agotado = intento >= REINTENTOS_BLOQUEO
+    with _bloqueos_lock:
+        _bloqueos['agotados' if agotado else 'reintentos'] += 1
+    if agotado:
+        return False
+    logger.warning(f"Bloqueo en la transacción ({e.errno}), reintento {intento + 1} de {REINTENTOS_BLOQUEO}")
+    # Con azar para que las transacciones que chocaron no vuelvan a chocar al mismo tiempo
+    time.sleep(ESPERA_REINTENTO * 2 ** intento * random.uniform(0.5, 1.5))
+    return True
+
+def _bloquear_habitaciones(cursor, ids_habitacion):
+    """Bloquea las filas de las habitaciones hasta el commit o el rollback de la transacción.
+
+    Las reservas de una misma habitación quedan en fila y las de habitaciones distintas siguen en
+    paralelo. Va antes de cualquier lectura sin bloqueo de la transacción, así las verificaciones
+    que siguen ven lo que confirmó la anterior, y en orden de id para que dos grupos no se crucen.
+    """
+    ids = sorted({int(i) for i in ids_habitacion})
+    cursor.execute(f"SELECT id FROM habitaciones WHERE id IN ({', '.join(['%s'] * len(ids))}) ORDER BY id FOR UPDATE",
+                   tuple(ids))
+    cursor.fetchall()
+
+# Lecturas independientes en paralelo: hilos acotados, cada tarea con su conexión del pool
+PARALELO_MAX = int(os.environ.get('DB_PARALELO_MAX', 4))
+PARALELO_TIMEOUT = float(os.environ.get('DB_PARALELO_TIMEOUT', 5))
+_ejecutor = None
+_ejecutor_lock = threading.Lock()
+_en_ejecutor = threading.local()
+
+def _hilos_paralelo():
+    """Hilos del ejecutor: DB_PARALELO_MAX, sin pasar de la mitad del pool para dejar conexiones a las peticiones"""
+    return min(PARALELO_MAX, obtener_pool().maximo // 2)
+
+def _obtener_ejecutor():
+    global _ejecutor
+    if _ejecutor is None:
+        with _ejecutor_lock:
+            if _ejecutor is None:
+                _ejecutor = ThreadPoolExecutor(max_workers=_hilos_paralelo(), thread_name_prefix='db-paralelo',
+                                               initializer=lambda: setattr(_en_ejecutor, 'activo', True))
+    return _ejecutor
+
+def _reiniciar_ejecutor_tras_fork():
+    # Los hilos del ejecutor no sobreviven al fork; el hijo crea uno nuevo en el primer uso
+    global _ejecutor, _ejecutor_lock
+    _ejecutor = None
+    _ejecutor_lock = threading.Lock()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reiniciar_ejecutor_tras_fork)
+
+def _ejecutar_tarea(nombre, tarea):
+    funcion, *args = tarea if isinstance(tarea, tuple) else (tarea,)
+    inicio = time.perf_counter()
+    try:
+        return funcion(*args)
+    finally:
+        logger.debug(f"Tarea {nombre} terminada en {(time.perf_counter() - inicio) * 1000:.1f} ms")
+
+def _tarea_con_defecto(nombre, tarea, defecto, contexto):
+    try:
+        return contexto.run(_ejecutar_tarea, nombre, tarea)
+    except Exception as e:
+        logger.error(f"Error en tarea {nombre}: {e}")
+        return defecto
+
+def ejecutar_en_paralelo(tareas, timeout=None, defecto=None):
+    """Ejecuta lecturas independientes a la vez y devuelve {nombre: resultado}.
+
+    `tareas` es un diccionario nombre -> función o (función, *args). Cada función abre su
+    propia conexión del pool. Una tarea que lanza una excepción o no termina en `timeout`
+    segundos deja `defecto` como resultado sin afectar a las demás.
+
+    La primera tarea corre en el hilo que llama y las demás en el ejecutor, que comparten todas
+    las peticiones del proceso. Al terminar la suya, el hilo que llama corre él mismo las que
+    siguen esperando turno detrás de tareas de otras peticiones, así que nunca tarda más que en
+    secuencia. Una tarea vencida no se puede interrumpir: sigue en su hilo con su conexión del
+    pool hasta terminar, como mucho tantas como hilos tiene el ejecutor (la mitad del pool).
+    """
+    timeout = PARALELO_TIMEOUT if timeout is None else timeout
+    # Sin hilos disponibles, con una sola tarea o desde otra tarea: en el hilo actual
+    if len(tareas) < 2 or getattr(_en_ejecutor, 'activo', False) or _hilos_paralelo() < 2:
+        return {nombre: _tarea_con_defecto(nombre, tarea, defecto, contextvars.copy_context())
+                for nombre, tarea in tareas.items()}
+
+    ejecutor = _obtener_ejecutor()
+    frame = sys._getframe(1)
+    llamadora = f"{frame.f_globals.get('__name__')}.{frame.f_code.co_name}"
+    contextos = {}
+    for nombre in tareas:
+        # Cada tarea corre con una copia del contexto para que sus consultas cuenten en la petición
+        contextos[nombre] = contextvars.copy_context()
+        contextos[nombre].run(metricas.marcar_origen, f"{llamadora}[{nombre}]")
+    primera, *otras = tareas
+    futuros = {nombre: ejecutor.submit(contextos[nombre].run, _ejecutar_tarea, nombre, tareas[nombre])
+               for nombre in otras}
+    limite = time.monotonic() + timeout
+    resultados = {primera: _tarea_con_defecto(primera, tareas[primera], defecto, contextos[primera])}
+    for nombre, futuro in futuros.items():
+        # Las que todavía no empezaron se sacan de la cola y corren acá
+        if futuro.cancel():
+            resultados[nombre] = _tarea_con_defecto(nombre, tareas[nombre], defecto, contextos[nombre])
+    wait([f for n, f in futuros.items() if n not in resultados], timeout=max(limite - time.monotonic(), 0))
+    for nombre, futuro in futuros.items():
+        if nombre in resultados:
+            continue
+        if not futuro.done():
+            logger.error(f"Tarea {nombre} superó el tiempo límite de {timeout} s")
+            resultados[nombre] = defecto
+        elif futuro.exception() is not None:
+            logger.error(f"Error en tarea {nombre}: {futuro.exception()}")
+            resultados[nombre] = defecto
+        else:
+            resultados[nombre] = futuro.result()
+    return {nombre: resultados[nombre] for nombre in tareas}
+
+# Estadísticas del panel cacheadas por pocos segundos; toda escritura las invalida
+_cache_estadisticas = {'valor': None, 'expira': 0.0, 'generacion': 0}
+_cache_estadisticas_lock = threading.Lock()
+ESTADISTICAS_TTL = float(os.environ.get('DB_ESTADISTICAS_TTL', 10))
+
+# Tablas cuya versión llevan los listados (ETag y fragmentos cacheados de app.py);
+# los anticipos cuentan como escritura de reservas
+TABLAS_VERSIONADAS = ('clientes', 'habitaciones', 'reservas')
+
+def _notificar_escritura(*tablas):
+    """Invalida los datos derivados después de cualquier escritura confirmada en `tablas` (todas si no se indican)"""
+    with _cache_estadisticas_lock:
+        _cache_estadisticas['valor'] = None
+        _cache_estadisticas['generacion'] += 1
+    cache_entidades.incrementar_versiones(tablas or TABLAS_VERSIONADAS)
+    # Las réplicas pueden no tener todavía lo que se acaba de escribir
+    _primario_hasta.set(time.time() + LEER_PRIMARIO_TRAS_ESCRITURA)
+
+def version_datos(*tablas):
+    """Versión de las tablas dadas sin consultar la base; cambia con cada escritura que las toca"""
+    return cache_entidades.versiones(tablas or TABLAS_VERSIONADAS)
+
+def _consultar_datos_indice():
+    """Lee habitaciones y reservas confirmadas para el índice de disponibilidad"""
+    conn = None
+    cursor = None
+    try:
+        conn = conectar()
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute("SELECT * FROM habitaciones")
+        habitaciones = cursor.fetchall()
+        cursor.execute("""
+            SELECT id, id_habitacion, fecha_entrada, fecha_salida
+            FROM reservas
+            WHERE estado = 'confirmada'
+        """)
+        reservas = cursor.fetchall()
+        return habitaciones, reservas
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+
+def reconstruir_indice_disponibilidad(intentos=3):
+    """Recarga por completo el índice de disponibilidad desde la base de datos.
+
+    Una reserva confirmada mientras se leía la base no está en la carga, y su registro va al índice
+    que se está por reemplazar. Cada escritura sube la versión de sus tablas antes de tocar el
+    índice, así que si la versión cambió durante la lectura la carga se descarta y se vuelve a leer.
+    """
+    try:
+        for _ in range(intentos):
+            version = version_datos('reservas', 'habitaciones')
+            habitaciones, reservas = _consultar_datos_indice()
+            if indice_disponibilidad.reconstruir(
+                    habitaciones, reservas, vigente=lambda: version_datos('reservas', 'habitaciones') == version):
+                return True
+        logger.warning(f"Índice de disponibilidad no recargado: hubo escrituras durante {intentos} lecturas seguidas")
+        indice_disponibilidad.invalidar()
+        return False
+    except mysql.connector.Error as e:
+        logger.error(f"Error al reconstruir índice de disponibilidad: {e}")
+        indice_disponibilidad.invalidar()
+        return False
+
+def verificar_indice_disponibilidad():
+    """Compara el índice con la base de datos; devuelve la lista de diferencias"""
+    try:
+        if not indice_disponibilidad.cargado:
+            return [] if reconstruir_indice_disponibilidad() else None
+        habitaciones, reservas = _consultar_datos_indice()
+        return indice_disponibilidad.comparar(habitaciones, reservas)
+    except mysql.connector.Error as e:
+        logger.error(f"Error al verificar índice de disponibilidad: {e}")
+        return None
+
+def _indice_cargado():
+    """Devuelve el índice de disponibilidad cargándolo si hace falta, o None si falla"""
+    if not indice_disponibilidad.cargado and not reconstruir_indice_disponibilidad():
+        return None
+    return indice_disponibilidad
+
+def _agrupar_por(filas, clave):
+    """Agrupa filas (diccionarios) en listas según el valor de la columna `clave`"""
+    grupos = {}
+    for fila in filas:
+        grupos.setdefault(fila[clave], []).append(fila)
+    return grupos
+
+def _cargar_relacionados(cursor, consulta, clave, ids=None, columna=None, lote=1000, params=()):
+    """Carga filas relacionadas con consultas por conjunto (filtrando `columna IN ids` en lotes) y las agrupa por `clave`"""
+    if ids is None:
+        cursor.execute(consulta, tuple(params))
+        return _agrupar_por(cursor.fetchall(), clave)
+    ids = list(dict.fromkeys(ids))
+    columna = columna or clave
+    filas = []
+    for inicio in range(0, len(ids), lote):
+        bloque = ids[inicio:inicio + lote]
+        marcadores = ", ".join(["%s"] * len(bloque))
+        cursor.execute(_agregar_filtro(consulta, f"{columna} IN ({marcadores})"), tuple(params) + tuple(bloque))
+        filas.extend(cursor.fetchall())
+    return _agrupar_por(filas, clave)
+
+def _agregar_filtro(consulta, condicion):
+    """Inserta una condición antes del ORDER BY (o al final), con AND si la consulta ya tiene WHERE"""
+    conector = "AND" if "WHERE" in consulta.upper() else "WHERE"
+    partes = consulta.rsplit("ORDER BY", 1)
+    partes[0] = f"{partes[0].rstrip()}\n  {conector} {condicion}\n"
+    return "ORDER BY".join(partes)
+
+def _registrar_en_resumen(cursor, reservas=(), anticipos=(), quitar=()):
+    """Suma reservas y anticipos al resumen diario (y descuenta las reservas de `quitar`) en la transacción del cursor.
+
+    reservas y quitar: tuplas (id_habitacion, fecha_entrada, fecha_salida, monto); anticipos: tuplas
+    (id_habitacion, momento, monto). Las filas se actualizan en orden de clave para que dos
+    escrituras concurrentes sobre las mismas fechas no se bloqueen en orden cruzado.
+
+    Las filas (fecha, tipo) quedan bloqueadas hasta el commit, así que dos reservas de habitaciones
+    distintas del mismo tipo y con noches en común se confirman de a una. Se acepta a cambio de que
+    el resumen nunca difiera de las reservas; benchmarks/carga_concurrente.py --tipos mide el costo.
+    """
+    movimientos = [(r, 1) for r in reservas] + [(r, -1) for r in quitar]
+    anticipos = list(anticipos)
+    ids = sorted({int(r[0]) for r, _ in movimientos} | {int(a[0]) for a in anticipos})
+    if not ids:
+        return
+    cursor.execute(f"SELECT id, tipo FROM habitaciones WHERE id IN ({', '.join(['%s'] * len(ids))})", tuple(ids))
+    # El cursor puede ser de tuplas o de diccionarios según la función que lo abrió
+    tipos = dict(tuple(fila.values()) if isinstance(fila, dict) else fila for fila in cursor.fetchall())
+    acumulado = {}
+    for (id_habitacion, fecha_entrada, fecha_salida, monto), signo in movimientos:
+        reportes.sumar(reportes.aportes_reserva(tipos[int(id_habitacion)], fecha_entrada, fecha_salida, monto, signo),
+                       acumulado)
+    for id_habitacion, momento, monto in anticipos:
+        if monto:
+            reportes.sumar([reportes.aporte_cobro(tipos[int(id_habitacion)], momento, monto)], acumulado)
+    cursor.executemany("""
+        INSERT INTO resumen_diario (fecha, tipo, noches, ingresos, llegadas, anticipos, pagos)
+        VALUES (%s, %s, %s, %s, %s, %s, %s)
+        ON DUPLICATE KEY UPDATE
+            noches = noches + VALUES(noches),
+            ingresos = ingresos + VALUES(ingresos),
+            llegadas = llegadas + VALUES(llegadas),
+            anticipos = anticipos + VALUES(anticipos),
+            pagos = pagos + VALUES(pagos)
+    """, [(fecha, tipo, *valores) for (fecha, tipo), valores in sorted(acumulado.items())])
+
+def _registrar_cambios(cursor, entidad, ids, operacion='cambio'):
+    """Anota en la tabla cambios, dentro de la transacción del cursor, una fila por entidad escrita.
+
+    Se confirma o se descarta junto con la escritura; las pantallas en vivo (tablero.py) leen
+    la tabla por id creciente y vuelven a consultar sólo las filas que cambiaron.
+    """
+    filas = [(entidad, int(id_entidad), operacion) for id_entidad in dict.fromkeys(ids)]
+    if filas:
+        cursor.executemany("INSERT INTO cambios (entidad, id_entidad, operacion) VALUES (%s, %s, %s)", filas)
+
 def check_admin_credentials(username, password):
     """Verifica las credenciales del administrador"""
     conn = None
@@ -84,8 +515,14 @@ def agregar_cliente(nombre, apellido, dni, telefono, email, direccion):
             VALUES (%s, %s, %s, %s, %s, %s)
         """
         cursor.execute(sql, (nombre, apellido, dni, telefono, email, direccion))
-        conn.commit()
         last_id = cursor.lastrowid
+        _registrar_cambios(cursor, 'cliente', [last_id], 'alta')
+        conn.commit()
+        _notificar_escritura('clientes')
+        cache_entidades.invalidar('cliente', last_id)
+        if indice_clientes.cargado:
+            indice_clientes.agregar({'id_cliente': last_id, 'nombre': nombre, 'apellido': apellido,
+                                     'dni_pasaporte_cpf': dni, 'telefono': telefono, 'email': email})
         logger.info(f"Cliente agregado con ID: {last_id}")
         return last_id
     except mysql.connector.Error as e:
@@ -101,6 +538,9 @@ def agregar_cliente(nombre, apellido, dni, telefono, email, direccion):
 
 def obtener_cliente(id_cliente):
     """Obtiene un cliente por su ID"""
+    return cache_entidades.obtener('cliente', id_cliente, _leer_cliente, id_cliente)
+
+def _leer_cliente(id_cliente):
     conn = None
     cursor = None
     try:
@@ -118,14 +558,7 @@ def obtener_cliente(id_cliente):
         if conn:
             conn.close()
 
-def listar_clientes():
-    """Lista todos los clientes con información completa de reservas"""
-    conn = None
-    cursor = None
-    try:
-        conn = conectar()
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute("""
+_CONSULTA_CLIENTES = """
             SELECT 
                 c.id_cliente,
                 c.nombre,
@@ -143,12 +576,69 @@ def listar_clientes():
                 h.tipo as tipo_habitacion,
                 p.metodo_pago,
                 p.monto as monto_pagado
-        FROM clientes c
+        FROM {origen} c
             LEFT JOIN reservas r ON c.id_cliente = r.id_cliente AND r.estado = 'confirmada'
             LEFT JOIN habitaciones h ON r.id_habitacion = h.id
             LEFT JOIN pagos p ON r.id = p.id_reserva
             ORDER BY c.id_cliente, r.fecha_entrada DESC
-        """)
+        """
+
+def codificar_cursor(*valores):
+    """Serializa la clave de orden de la última fila de una página como cursor para la URL"""
+    crudo = json.dumps([v.isoformat() if isinstance(v, datetime) else v for v in valores])
+    return base64.urlsafe_b64encode(crudo.encode()).decode().rstrip('=')
+
+def decodificar_cursor(cursor):
+    """Devuelve la lista de valores de un cursor; ValueError si es inválido"""
+    try:
+        crudo = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        valores = json.loads(crudo)
+    except (ValueError, TypeError) as e:
+        raise ValueError(f"Cursor de paginación inválido: {cursor}") from e
+    if not isinstance(valores, list):
+        raise ValueError(f"Cursor de paginación inválido: {cursor}")
+    return valores
+
+def _filtros_clientes(filtros):
+    """Condiciones SQL sobre clientes c para los filtros de listado"""
+    condiciones = []
+    params = []
+    if filtros.get('desde'):
+        condiciones.append("c.fecha_registro >= %s")
+        params.append(filtros['desde'])
+    if filtros.get('hasta'):
+        condiciones.append("c.fecha_registro < %s")
+        params.append(filtros['hasta'] + timedelta(days=1))
+    if filtros.get('id_cliente'):
+        condiciones.append("c.id_cliente = %s")
+        params.append(filtros['id_cliente'])
+    if filtros.get('id_habitacion'):
+        condiciones.append("""EXISTS (
+                SELECT 1 FROM reservas rh
+                WHERE rh.id_cliente = c.id_cliente AND rh.id_habitacion = %s
+            )""")
+        params.append(filtros['id_habitacion'])
+    if filtros.get('estado'):
+        condiciones.append("""EXISTS (
+                SELECT 1 FROM reservas re
+                WHERE re.id_cliente = c.id_cliente AND re.estado = %s
+            )""")
+        params.append(filtros['estado'])
+    return condiciones, params
+
+def _donde(condiciones):
+    return f"WHERE {' AND '.join(condiciones)}" if condiciones else ""
+
+def listar_clientes(filtros=None):
+    """Lista todos los clientes con información completa de reservas"""
+    conn = None
+    cursor = None
+    try:
+        conn = conectar_lectura()
+        cursor = conn.cursor(dictionary=True)
+        condiciones, params = _filtros_clientes(filtros or {})
+        origen = f"(SELECT * FROM clientes c {_donde(condiciones)})" if condiciones else "clientes"
+        cursor.execute(_CONSULTA_CLIENTES.format(origen=origen), tuple(params))
         clientes = cursor.fetchall()
         return clientes
     except mysql.connector.Error as e:
@@ -160,14 +650,129 @@ def listar_clientes():
         if conn:
             conn.close()
 
-def listar_habitaciones_disponibles(fecha_entrada, fecha_salida):
-    """Lista habitaciones disponibles para un rango de fecha y hora"""
+def pagina_clientes(filtros=None, cursor_pagina=None, limite=50):
+    """Página de clientes ordenada por id (paginación por clave) con sus reservas confirmadas"""
+    conn = None
+    cursor = None
+    try:
+        condiciones, params = _filtros_clientes(filtros or {})
+        if cursor_pagina:
+            ultimo_id, = decodificar_cursor(cursor_pagina)
+            condiciones.append("c.id_cliente > %s")
+            params.append(int(ultimo_id))
+
+        conn = conectar_lectura()
+        cursor = conn.cursor(dictionary=True)
+        # Se pide un cliente de más para saber si existe una página siguiente
+        origen = f"(SELECT * FROM clientes c {_donde(condiciones)} ORDER BY c.id_cliente LIMIT %s)"
+        cursor.execute(_CONSULTA_CLIENTES.format(origen=origen), tuple(params) + (limite + 1,))
+        filas = cursor.fetchall()
+
+        ids = list(dict.fromkeys(f['id_cliente'] for f in filas))
+        siguiente = None
+        if len(ids) > limite:
+            filas = [f for f in filas if f['id_cliente'] != ids[-1]]
+            siguiente = codificar_cursor(ids[limite - 1])
+        return {'filas': filas, 'siguiente': siguiente}
+    except mysql.connector.Error as e:
+        logger.error(f"Error al paginar clientes: {e}")
+        return {'filas': [], 'siguiente': None}
+    except (ValueError, TypeError) as e:
+        logger.error(f"Error en parámetros de paginación: {e}")
+        return {'filas': [], 'siguiente': None}
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+
+def _consultar_clientes_busqueda():
+    """Lee los campos buscables de todos los clientes en lotes, sin armar la lista completa"""
     conn = None
     cursor = None
     try:
         conn = conectar()
         cursor = conn.cursor(dictionary=True)
-        
+        cursor.execute("""
+            SELECT id_cliente, nombre, apellido, dni_pasaporte_cpf, telefono, email
+            FROM clientes
+            ORDER BY id_cliente
+        """)
+        while True:
+            filas = cursor.fetchmany(EXPORTACION_LOTE)
+            if not filas:
+                break
+            yield from filas
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+
+def reconstruir_indice_clientes():
+    """Recarga por completo el índice de búsqueda de clientes desde la base de datos"""
+    try:
+        indice_clientes.reconstruir(_consultar_clientes_busqueda())
+        return True
+    except mysql.connector.Error as e:
+        logger.error(f"Error al reconstruir índice de clientes: {e}")
+        indice_clientes.invalidar()
+        return False
+
+_CONDICION_BUSQUEDA_CLIENTES = """(c.nombre LIKE %s OR c.apellido LIKE %s OR c.dni_pasaporte_cpf LIKE %s
+                 OR c.email LIKE %s OR c.telefono LIKE %s)"""
+_CONSULTA_BUSQUEDA_CLIENTES = """
+        SELECT c.id_cliente, c.nombre, c.apellido, c.dni_pasaporte_cpf, c.telefono, c.email
+        FROM clientes c
+        WHERE (c.nombre LIKE %s OR c.apellido LIKE %s OR c.dni_pasaporte_cpf LIKE %s
+                 OR c.email LIKE %s OR c.telefono LIKE %s){otros}
+        ORDER BY c.id_cliente DESC
+        LIMIT %s
+    """
+
+def _buscar_clientes_sql(terminos, limite):
+    """Búsqueda por prefijo con LIKE 'termino%' sobre las columnas indexadas de clientes"""
+    # Los términos ya vienen normalizados a letras y dígitos: no hay comodines que escapar
+    params = [f"{termino}%" for termino in terminos for _ in range(5)]
+    otros = ''.join(f"\n          AND {_CONDICION_BUSQUEDA_CLIENTES}" for _ in terminos[1:])
+    return _consultar_todas(_CONSULTA_BUSQUEDA_CLIENTES.format(otros=otros), (*params, limite))
+
+def buscar_clientes(consulta, limite=10):
+    """Clientes que coinciden con la consulta (nombre, apellido, documento, email o teléfono), mejores primero"""
+    terminos = busqueda_clientes.palabras(consulta)
+    if not terminos:
+        return []
+    try:
+        if BUSQUEDA_CON_INDICE and (indice_clientes.cargado or reconstruir_indice_clientes()):
+            puntajes = indice_clientes.buscar(consulta, limite)
+            if not puntajes:
+                return []
+            conn = None
+            cursor = None
+            try:
+                conn = conectar()
+                cursor = conn.cursor(dictionary=True)
+                filas = _cargar_relacionados(cursor, """
+                    SELECT id_cliente, nombre, apellido, dni_pasaporte_cpf, telefono, email FROM clientes
+                """, 'id_cliente', ids=[id_cliente for _, id_cliente in puntajes])
+            finally:
+                if cursor:
+                    cursor.close()
+                if conn:
+                    conn.close()
+            # Un cliente que ya no está en la base deja de aparecer hasta la próxima recarga
+            return [dict(filas[id_cliente][0], puntaje=puntaje) for puntaje, id_cliente in puntajes
+                    if id_cliente in filas]
+        return _buscar_clientes_sql(terminos, limite)
+    except mysql.connector.Error as e:
+        logger.error(f"Error al buscar clientes: {e}")
+        return []
+
+def listar_habitaciones_disponibles(fecha_entrada, fecha_salida):
+    """Lista habitaciones disponibles para un rango de fecha y hora"""
+    conn = None
+    cursor = None
+    try:
         # Validar fechas (datetime)
         fecha_entrada_dt = datetime.strptime(fecha_entrada, "%Y-%m-%dT%H:%M")
         fecha_salida_dt = datetime.strptime(fecha_salida, "%Y-%m-%dT%H:%M")
@@ -179,7 +784,16 @@ def listar_habitaciones_disponibles(fecha_entrada, fecha_salida):
         if fecha_entrada_dt < datetime.now():
             logger.warning("No se pueden hacer reservas para fecha y hora pasadas")
             return []
-        
+
+        # Responder desde el índice en memoria sin consultar MySQL
+        indice = _indice_cargado()
+        if indice:
+            habitaciones = indice.disponibles(fecha_entrada_dt, fecha_salida_dt)
+            logger.info(f"Encontradas {len(habitaciones)} habitaciones disponibles")
+            return habitaciones
+
+        conn = conectar()
+        cursor = conn.cursor(dictionary=True)
         query = """
         SELECT * 
         FROM habitaciones h
@@ -189,7 +803,7 @@ def listar_habitaciones_disponibles(fecha_entrada, fecha_salida):
             WHERE r.estado = 'confirmada'
               AND NOT (r.fecha_salida <= %s OR r.fecha_entrada >= %s)
         )
-        AND h.estado = 'disponible'
+        AND h.estado <> 'mantenimiento'
         ORDER BY h.numero_habitacion
         """
         cursor.execute(query, (fecha_entrada_dt, fecha_salida_dt))
@@ -218,7 +832,11 @@ def cambiar_estado_habitacion(id_habitacion, nuevo_estado):
         conn = conectar()
         cursor = conn.cursor()
         cursor.execute("UPDATE habitaciones SET estado = %s WHERE id = %s", (nuevo_estado, id_habitacion))
+        _registrar_cambios(cursor, 'habitacion', [id_habitacion])
         conn.commit()
+        _notificar_escritura('habitaciones')
+        cache_entidades.invalidar('habitacion', id_habitacion)
+        indice_disponibilidad.actualizar_habitacion(id_habitacion, estado=nuevo_estado)
         logger.info(f"Estado de habitación {id_habitacion} cambiado a {nuevo_estado}")
         return True
     except mysql.connector.Error as e:
@@ -234,61 +852,77 @@ def cambiar_estado_habitacion(id_habitacion, nuevo_estado):
 
 def reservar_habitacion(id_cliente, id_habitacion, fecha_entrada, fecha_salida, monto):
     """Reserva una habitación para un cliente y devuelve el id de la reserva creada"""
-    conn = None
-    cursor = None
-    try:
-        conn = conectar()
-        cursor = conn.cursor()
-        
-        fecha_entrada_dt = datetime.strptime(fecha_entrada, "%Y-%m-%dT%H:%M")
-        fecha_salida_dt = datetime.strptime(fecha_salida, "%Y-%m-%dT%H:%M")
-        
-        # Verificar solapamiento con reservas confirmadas (por datetime)
-        cursor.execute("""
-            SELECT 1 
-            FROM reservas 
-            WHERE id_habitacion = %s
-              AND estado = 'confirmada'
-              AND NOT (fecha_salida <= %s OR fecha_entrada >= %s)
-        """, (id_habitacion, fecha_entrada_dt, fecha_salida_dt))
-        conflicto = cursor.fetchone()
-        if conflicto:
-            logger.warning(f"Conflicto de fechas/horas para habitación {id_habitacion}")
-            return False
+    for intento in range(REINTENTOS_BLOQUEO + 1):
+        conn = None
+        cursor = None
+        try:
+            fecha_entrada_dt = datetime.strptime(fecha_entrada, "%Y-%m-%dT%H:%M")
+            fecha_salida_dt = datetime.strptime(fecha_salida, "%Y-%m-%dT%H:%M")
 
-        # Verificar que la habitación esté disponible
-        cursor.execute("SELECT estado FROM habitaciones WHERE id = %s", (id_habitacion,))
-        habitacion = cursor.fetchone()
-        if not habitacion or habitacion[0] != 'disponible':
-            logger.warning(f"Habitación {id_habitacion} no está disponible")
-            return False
+            # Rechazar sin ir a la base los conflictos que el índice ya conoce
+            if indice_disponibilidad.cargado and indice_disponibilidad.hay_conflicto(id_habitacion, fecha_entrada_dt, fecha_salida_dt):
+                logger.warning(f"Conflicto de fechas/horas para habitación {id_habitacion}")
+                return False
 
-        # Insertar reserva con datetime
-        cursor.execute("""
-            INSERT INTO reservas (id_cliente, id_habitacion, fecha_entrada, fecha_salida, monto, estado)
-            VALUES (%s, %s, %s, %s, %s, 'confirmada')
-        """, (id_cliente, id_habitacion, fecha_entrada_dt, fecha_salida_dt, monto))
-        reserva_id = cursor.lastrowid
+            conn = conectar()
+            cursor = conn.cursor()
+            # Con la habitación bloqueada, otra reserva simultánea espera a que esta confirme o se descarte
+            conn.start_transaction()
+            _bloquear_habitaciones(cursor, [id_habitacion])
 
-        # No cambiar estado de la habitación a 'ocupada' hasta el check-in efectivo
-        # Se mantiene 'disponible' hasta que llegue la hora de entrada
+            # Verificar solapamiento con reservas confirmadas (por datetime)
+            cursor.execute("""
+                SELECT 1 
+                FROM reservas 
+                WHERE id_habitacion = %s
+                  AND estado = 'confirmada'
+                  AND NOT (fecha_salida <= %s OR fecha_entrada >= %s)
+            """, (id_habitacion, fecha_entrada_dt, fecha_salida_dt))
+            conflicto = cursor.fetchone()
+            if conflicto:
+                logger.warning(f"Conflicto de fechas/horas para habitación {id_habitacion}")
+                return False
 
-        conn.commit()
-        logger.info(f"Reserva creada para habitación {id_habitacion}, cliente {id_cliente}, reserva {reserva_id}")
-        return reserva_id
-    except mysql.connector.Error as e:
-        logger.error(f"Error al reservar habitación: {e}")
-        if conn:
-            conn.rollback()
-        return None
-    except ValueError as e:
-        logger.error(f"Formato de fecha/hora inválido: {e}")
-        return None
-    finally:
-        if cursor:
-            cursor.close()
-        if conn:
-            conn.close()
+            # Verificar que la habitación no esté en mantenimiento; 'ocupada' sólo dice que hay una estadía en curso
+            cursor.execute("SELECT estado FROM habitaciones WHERE id = %s", (id_habitacion,))
+            habitacion = cursor.fetchone()
+            if not habitacion or habitacion[0] == 'mantenimiento':
+                logger.warning(f"Habitación {id_habitacion} no está disponible")
+                return False
+
+            # Insertar reserva con datetime
+            cursor.execute("""
+                INSERT INTO reservas (id_cliente, id_habitacion, fecha_entrada, fecha_salida, monto, estado)
+                VALUES (%s, %s, %s, %s, %s, 'confirmada')
+            """, (id_cliente, id_habitacion, fecha_entrada_dt, fecha_salida_dt, monto))
+            reserva_id = cursor.lastrowid
+            _registrar_en_resumen(cursor, reservas=[(id_habitacion, fecha_entrada_dt, fecha_salida_dt, monto)])
+            _registrar_cambios(cursor, 'reserva', [reserva_id], 'alta')
+
+            # La habitación pasa a 'ocupada' en la fecha de entrada (planificador.py)
+            # Se mantiene 'disponible' hasta que llegue la hora de entrada
+
+            conn.commit()
+            _notificar_escritura('reservas')
+            cache_entidades.invalidar('reserva', reserva_id)
+            indice_disponibilidad.registrar_reserva(reserva_id, id_habitacion, fecha_entrada_dt, fecha_salida_dt)
+            logger.info(f"Reserva creada para habitación {id_habitacion}, cliente {id_cliente}, reserva {reserva_id}")
+            return reserva_id
+        except mysql.connector.Error as e:
+            if conn:
+                conn.rollback()
+            if _reintentar_tras_bloqueo(e, intento):
+                continue
+            logger.error(f"Error al reservar habitación: {e}")
+            return None
+        except ValueError as e:
+            logger.error(f"Formato de fecha/hora inválido: {e}")
+            return None
+        finally:
+            if cursor:
+                cursor.close()
+            if conn:
+                conn.close()
 
 
 
@@ -297,7 +931,7 @@ def listar_reservas():
     conn = None
     cursor = None
     try:
-        conn = conectar()
+        conn = conectar_lectura()
         cursor = conn.cursor(dictionary=True)
         cursor.execute("""
             SELECT r.*, c.nombre, c.apellido, h.numero_habitacion
@@ -317,93 +951,195 @@ def listar_reservas():
         if conn:
             conn.close()
 
-def listar_todas_habitaciones():
-    """Lista todas las habitaciones con sus reservas futuras (con hora)"""
+def obtener_estadisticas(usar_cache=True):
+    """Contadores del panel de administración calculados con agregados en una sola consulta"""
+    if usar_cache:
+        with _cache_estadisticas_lock:
+            if _cache_estadisticas['valor'] is not None and _cache_estadisticas['expira'] > time.monotonic():
+                return dict(_cache_estadisticas['valor'])
+            generacion = _cache_estadisticas['generacion']
     conn = None
     cursor = None
     try:
         conn = conectar()
         cursor = conn.cursor(dictionary=True)
-        
-        cursor.execute("SELECT * FROM habitaciones ORDER BY numero_habitacion")
-        habitaciones = cursor.fetchall()
-        
-        for hab in habitaciones:
-            cursor.execute("""
-                SELECT fecha_entrada, fecha_salida, estado
-                FROM reservas
-                WHERE id_habitacion = %s
-                  AND fecha_salida >= NOW()
-                  AND estado = 'confirmada'
-                ORDER BY fecha_entrada
-            """, (hab['id'],))
-            hab['reservas'] = cursor.fetchall()
-        
-        return habitaciones
+        hoy = datetime.combine(date.today(), datetime.min.time())
+        manana = hoy + timedelta(days=1)
+        cursor.execute("""
+            SELECT 'habitaciones' AS grupo, estado, COUNT(*) AS valor
+            FROM habitaciones GROUP BY estado
+            UNION ALL
+            SELECT 'reservas', estado, COUNT(*)
+            FROM reservas GROUP BY estado
+            UNION ALL
+            SELECT 'clientes', NULL, COUNT(*) FROM clientes
+            UNION ALL
+            SELECT 'llegadas_hoy', NULL, COUNT(*) FROM reservas
+            WHERE estado IN ('confirmada', 'ocupada') AND fecha_entrada >= %s AND fecha_entrada < %s
+            UNION ALL
+            SELECT 'salidas_hoy', NULL, COUNT(*) FROM reservas
+            WHERE estado IN ('confirmada', 'ocupada') AND fecha_salida >= %s AND fecha_salida < %s
+            UNION ALL
+            SELECT 'ocupadas_hoy', NULL, COUNT(DISTINCT id_habitacion) FROM reservas
+            WHERE estado IN ('confirmada', 'ocupada') AND fecha_entrada < %s AND fecha_salida > %s
+            UNION ALL
+            SELECT 'saldo_pendiente', NULL, COALESCE(SUM(monto - COALESCE(monto_anticipo, 0)), 0) FROM reservas
+            WHERE estado IN ('confirmada', 'ocupada')
+        """, (hoy, manana, hoy, manana, manana, hoy))
+        filas = cursor.fetchall()
+
+        habitaciones = {f['estado']: int(f['valor']) for f in filas if f['grupo'] == 'habitaciones'}
+        reservas = {f['estado']: int(f['valor']) for f in filas if f['grupo'] == 'reservas'}
+        escalares = {f['grupo']: f['valor'] for f in filas if f['estado'] is None}
+        total_habitaciones = sum(habitaciones.values())
+        ocupadas_hoy = int(escalares.get('ocupadas_hoy') or 0)
+        stats = {
+            'total_clientes': int(escalares.get('clientes') or 0),
+            'total_reservas': sum(reservas.values()),
+            'reservas_por_estado': reservas,
+            'total_habitaciones': total_habitaciones,
+            'habitaciones_por_estado': habitaciones,
+            'habitaciones_disponibles': habitaciones.get('disponible', 0),
+            'habitaciones_ocupadas': habitaciones.get('ocupada', 0),
+            'llegadas_hoy': int(escalares.get('llegadas_hoy') or 0),
+            'salidas_hoy': int(escalares.get('salidas_hoy') or 0),
+            'ocupadas_hoy': ocupadas_hoy,
+            'ocupacion_hoy': round(ocupadas_hoy * 100 / total_habitaciones, 1) if total_habitaciones else 0.0,
+            'saldo_pendiente': Decimal(str(escalares.get('saldo_pendiente') or 0)),
+        }
+        with _cache_estadisticas_lock:
+            # No guardar si hubo una escritura mientras se calculaba
+            if usar_cache and _cache_estadisticas['generacion'] == generacion:
+                _cache_estadisticas['valor'] = stats
+                _cache_estadisticas['expira'] = time.monotonic() + ESTADISTICAS_TTL
+        return dict(stats)
     except mysql.connector.Error as e:
-        logger.error(f"Error al listar habitaciones: {e}")
-        return []
+        logger.error(f"Error al obtener estadísticas: {e}")
+        return {}
     finally:
         if cursor:
             cursor.close()
         if conn:
             conn.close()
 
-def extender_reserva(id_reserva, nueva_fecha_salida):
-    """Extiende una reserva existente (con hora)"""
+def _consultar_todas(consulta, params=(), abrir=None):
+    """Ejecuta una consulta de lectura con su propia conexión (de `abrir`, por defecto conectar) y devuelve todas las filas"""
     conn = None
     cursor = None
     try:
-        conn = conectar()
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT id_habitacion, fecha_salida, monto FROM reservas WHERE id = %s AND estado = 'confirmada'", (id_reserva,))
-        reserva = cursor.fetchone()
-        if not reserva:
-            logger.warning(f"Reserva {id_reserva} no encontrada o no confirmada")
-            return False
-
-        id_habitacion, fecha_salida_actual, monto_actual = reserva
-
-        # Verificar que no haya reservas futuras que choquen
-        cursor.execute("""
-            SELECT 1 FROM reservas
-            WHERE id_habitacion = %s 
-              AND estado = 'confirmada'
-              AND fecha_entrada > %s 
-              AND fecha_entrada <= %s
-        """, (id_habitacion, fecha_salida_actual, datetime.strptime(nueva_fecha_salida, "%Y-%m-%dT%H:%M")))
-        conflicto = cursor.fetchone()
-        if conflicto:
-            logger.warning(f"No se puede extender reserva {id_reserva}, hay conflicto")
-            return False
-
-        # Calcular nuevo monto por días completos adicionales (mantener lógica actual)
-        dias_adicionales = (datetime.strptime(nueva_fecha_salida, "%Y-%m-%dT%H:%M") - fecha_salida_actual).days
-        if dias_adicionales <= 0:
-            logger.warning("La nueva fecha debe ser posterior a la actual")
-            return False
-            
-        cursor.execute("SELECT precio_por_noche FROM habitaciones WHERE id = %s", (id_habitacion,))
-        precio_noche = cursor.fetchone()[0]
-        nuevo_monto = float(monto_actual) + (dias_adicionales * float(precio_noche))
-
-        cursor.execute("UPDATE reservas SET fecha_salida = %s, monto = %s WHERE id = %s", 
-                       (datetime.strptime(nueva_fecha_salida, "%Y-%m-%dT%H:%M"), nuevo_monto, id_reserva))
-        conn.commit()
-        logger.info(f"Reserva {id_reserva} extendida hasta {nueva_fecha_salida}")
-        return True
-    except mysql.connector.Error as e:
-        logger.error(f"Error al extender reserva: {e}")
-        if conn:
-            conn.rollback()
-        return False
+        conn = (abrir or conectar)()
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute(consulta, tuple(params))
+        return cursor.fetchall()
     finally:
         if cursor:
             cursor.close()
         if conn:
             conn.close()
 
+def listar_todas_habitaciones():
+    """Lista todas las habitaciones con sus reservas futuras (con hora)"""
+    # Habitaciones y reservas futuras no dependen entre sí: se leen a la vez
+    resultados = ejecutar_en_paralelo({
+        'habitaciones': (_consultar_todas, "SELECT * FROM habitaciones ORDER BY numero_habitacion", (), conectar_lectura),
+        'reservas': (_consultar_todas, """
+            SELECT id_habitacion, fecha_entrada, fecha_salida, estado
+            FROM reservas
+            WHERE fecha_salida >= NOW()
+              AND estado = 'confirmada'
+            ORDER BY fecha_entrada
+        """, (), conectar_lectura),
+    })
+    habitaciones = resultados['habitaciones']
+    if habitaciones is None or resultados['reservas'] is None:
+        logger.error("Error al listar habitaciones")
+        return []
+    reservas = _agrupar_por(resultados['reservas'], 'id_habitacion')
+    for hab in habitaciones:
+        hab['reservas'] = reservas.get(hab['id'], [])
+    return habitaciones
+
+def extender_reserva(id_reserva, nueva_fecha_salida):
+    """Extiende una reserva existente (con hora)"""
+    for intento in range(REINTENTOS_BLOQUEO + 1):
+        conn = None
+        cursor = None
+        try:
+            if indice_disponibilidad.cargado and indice_disponibilidad.conflicto_extension(
+                    id_reserva, datetime.strptime(nueva_fecha_salida, "%Y-%m-%dT%H:%M")):
+                logger.warning(f"No se puede extender reserva {id_reserva}, hay conflicto")
+                return False
+
+            conn = conectar()
+            cursor = conn.cursor()
+            conn.start_transaction()
+
+            # Reserva y habitación bloqueadas: una reserva nueva de la habitación no entra en medio
+            cursor.execute("""
+                SELECT id_habitacion, fecha_salida, monto, fecha_entrada FROM reservas
+                WHERE id = %s AND estado = 'confirmada'
+                FOR UPDATE
+            """, (id_reserva,))
+            reserva = cursor.fetchone()
+            if not reserva:
+                logger.warning(f"Reserva {id_reserva} no encontrada o no confirmada")
+                return False
+
+            id_habitacion, fecha_salida_actual, monto_actual, fecha_entrada = reserva
+            _bloquear_habitaciones(cursor, [id_habitacion])
+
+            # Verificar que no haya reservas futuras que choquen
+            cursor.execute("""
+                SELECT 1 FROM reservas
+                WHERE id_habitacion = %s 
+                  AND estado = 'confirmada'
+                  AND fecha_entrada > %s 
+                  AND fecha_entrada <= %s
+            """, (id_habitacion, fecha_salida_actual, datetime.strptime(nueva_fecha_salida, "%Y-%m-%dT%H:%M")))
+            conflicto = cursor.fetchone()
+            if conflicto:
+                logger.warning(f"No se puede extender reserva {id_reserva}, hay conflicto")
+                return False
+
+            # Las noches agregadas (días completos) se cotizan desde la salida actual con las
+            # tarifas por temporada y día de la semana, igual que una reserva nueva
+            dias_adicionales = (datetime.strptime(nueva_fecha_salida, "%Y-%m-%dT%H:%M") - fecha_salida_actual).days
+            if dias_adicionales <= 0:
+                logger.warning("La nueva fecha debe ser posterior a la actual")
+                return False
+                
+            cursor.execute("SELECT precio_por_noche, tipo FROM habitaciones WHERE id = %s", (id_habitacion,))
+            precio_noche, tipo = cursor.fetchone()
+            extension = tabla_tarifas().subtotal(tipo, precio_noche, fecha_salida_actual.date(), dias_adicionales)
+            nuevo_monto = (Decimal(str(monto_actual)) + extension).quantize(Decimal('0.01'), ROUND_HALF_UP)
+
+            cursor.execute("UPDATE reservas SET fecha_salida = %s, monto = %s WHERE id = %s", 
+                           (datetime.strptime(nueva_fecha_salida, "%Y-%m-%dT%H:%M"), nuevo_monto, id_reserva))
+            # El monto se reparte por noche: se descuenta la estadía anterior y se suma la extendida
+            _registrar_en_resumen(
+                cursor,
+                reservas=[(id_habitacion, fecha_entrada, datetime.strptime(nueva_fecha_salida, "%Y-%m-%dT%H:%M"), nuevo_monto)],
+                quitar=[(id_habitacion, fecha_entrada, fecha_salida_actual, monto_actual)])
+            _registrar_cambios(cursor, 'reserva', [id_reserva])
+            conn.commit()
+            _notificar_escritura('reservas')
+            cache_entidades.invalidar('reserva', id_reserva)
+            indice_disponibilidad.extender_reserva(id_reserva, datetime.strptime(nueva_fecha_salida, "%Y-%m-%dT%H:%M"))
+            logger.info(f"Reserva {id_reserva} extendida hasta {nueva_fecha_salida}")
+            return True
+        except mysql.connector.Error as e:
+            if conn:
+                conn.rollback()
+            if _reintentar_tras_bloqueo(e, intento):
+                continue
+            logger.error(f"Error al extender reserva: {e}")
+            return False
+        finally:
+            if cursor:
+                cursor.close()
+            if conn:
+                conn.close()
+
 def cambiar_precio_y_estado_habitacion(id_habitacion, precio, estado):
     """Cambia el precio y estado de una habitación"""
     conn = None
@@ -417,7 +1153,11 @@ def cambiar_precio_y_estado_habitacion(id_habitacion, precio, estado):
                 estado = %s
             WHERE id = %s
         """, (precio, estado, id_habitacion))
+        _registrar_cambios(cursor, 'habitacion', [id_habitacion])
         conn.commit()
+        _notificar_escritura('habitaciones')
+        cache_entidades.invalidar('habitacion', id_habitacion)
+        indice_disponibilidad.actualizar_habitacion(id_habitacion, precio_por_noche=Decimal(str(precio)), estado=estado)
         logger.info(f"Precio y estado de habitación {id_habitacion} actualizados")
         return True
     except mysql.connector.Error as e:
@@ -431,16 +1171,78 @@ def cambiar_precio_y_estado_habitacion(id_habitacion, precio, estado):
         if conn:
             conn.close()
     
-def obtener_habitacion(id_habitacion):
-    """Obtiene una habitación por su ID"""
+_CONSULTA_HABITACIONES_LOTE = """
+    SELECT id, numero_habitacion, tipo, precio_por_noche, estado
+    FROM habitaciones
+    {donde}
+    ORDER BY id
+    FOR UPDATE
+"""
+
+def cambiar_habitaciones_en_lote(filtro, regla_precio=None, estado=None, simular=False):
+    """Aplica una regla de precio y/o un estado a las habitaciones del filtro en una transacción.
+
+    `filtro`, `regla_precio` y `estado` vienen normalizados por cambios_habitaciones. Con
+    simular=True sólo calcula los cambios. Devuelve {'seleccionadas', 'actualizadas', 'cambios'},
+    None ante un error de base de datos; lanza ValueError si algún precio quedaría en cero.
+    """
     conn = None
     cursor = None
     try:
+        condiciones = []
+        params = []
+        # Lo que se puede filtrar por columna se filtra en la consulta; piso y rango, en Python
+        for columna, valores in (('id', filtro['ids']), ('numero_habitacion', filtro['numeros']), ('tipo', filtro['tipos'])):
+            if valores:
+                condiciones.append(f"{columna} IN ({', '.join(['%s'] * len(valores))})")
+                params.extend(valores)
+
         conn = conectar()
         cursor = conn.cursor(dictionary=True)
-        cursor.execute("SELECT * FROM habitaciones WHERE id = %s", (id_habitacion,))
-        habitacion = cursor.fetchone()
-        return habitacion
+        conn.start_transaction()
+        cursor.execute(_CONSULTA_HABITACIONES_LOTE.format(donde=_donde(condiciones)), tuple(params))
+        plan = cambios_habitaciones.planificar(cursor.fetchall(), filtro, regla_precio, estado)
+        cambios = [c for c in plan if c['cambia']]
+        resultado = {'seleccionadas': len(plan), 'actualizadas': 0 if simular else len(cambios), 'cambios': cambios}
+        if simular or not cambios:
+            conn.rollback()
+            return resultado
+
+        cursor.executemany("UPDATE habitaciones SET precio_por_noche = %s, estado = %s WHERE id = %s",
+                           [(c['precio_nuevo'], c['estado_nuevo'], c['id']) for c in cambios])
+        _registrar_cambios(cursor, 'habitacion', [c['id'] for c in cambios])
+        conn.commit()
+        # Una sola invalidación para todo el lote
+        _notificar_escritura('habitaciones')
+        cache_entidades.invalidar('habitacion', *[c['id'] for c in cambios])
+        for c in cambios:
+            indice_disponibilidad.actualizar_habitacion(c['id'], precio_por_noche=c['precio_nuevo'], estado=c['estado_nuevo'])
+        logger.info(f"Cambio en lote: {len(cambios)} de {len(plan)} habitaciones actualizadas")
+        return resultado
+    except mysql.connector.Error as e:
+        logger.error(f"Error al cambiar habitaciones en lote: {e}")
+        if conn:
+            conn.rollback()
+        return None
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+
+def obtener_habitacion(id_habitacion):
+    """Obtiene una habitación por su ID"""
+    return cache_entidades.obtener('habitacion', id_habitacion, _leer_habitacion, id_habitacion)
+
+def _leer_habitacion(id_habitacion):
+    conn = None
+    cursor = None
+    try:
+        conn = conectar()
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute("SELECT * FROM habitaciones WHERE id = %s", (id_habitacion,))
+        habitacion = cursor.fetchone()
+        return habitacion
     except mysql.connector.Error as e:
         logger.error(f"Error al obtener habitación: {e}")
         return None
@@ -452,6 +1254,9 @@ def obtener_habitacion(id_habitacion):
 
 def obtener_reserva(id_reserva):
     """Obtiene una reserva por su ID"""
+    return cache_entidades.obtener('reserva', id_reserva, _leer_reserva, id_reserva)
+
+def _leer_reserva(id_reserva):
     conn = None
     cursor = None
     try:
@@ -484,7 +1289,7 @@ def crear_anticipo(id_reserva, porcentaje_anticipo):
         cursor = conn.cursor()
         
         # Obtener monto total de la reserva
-        cursor.execute("SELECT monto FROM reservas WHERE id = %s", (id_reserva,))
+        cursor.execute("SELECT monto, id_habitacion FROM reservas WHERE id = %s", (id_reserva,))
         reserva = cursor.fetchone()
         if not reserva:
             return None
@@ -507,8 +1312,12 @@ def crear_anticipo(id_reserva, porcentaje_anticipo):
             SET monto_anticipo = %s, porcentaje_anticipo = %s
             WHERE id = %s
         """, (monto_anticipo, porcentaje_anticipo, id_reserva))
+        _registrar_en_resumen(cursor, anticipos=[(reserva[1], datetime.now(), monto_anticipo)])
+        _registrar_cambios(cursor, 'reserva', [id_reserva])
         
         conn.commit()
+        _notificar_escritura('reservas')
+        cache_entidades.invalidar('reserva', id_reserva)
         logger.info(f"Anticipo creado para reserva {id_reserva}: ${monto_anticipo}")
         return {
             'monto_total': monto_total,
@@ -526,14 +1335,565 @@ def crear_anticipo(id_reserva, porcentaje_anticipo):
         if conn:
             conn.close()
 
-def listar_reservas_con_anticipos():
-    """Lista todas las reservas con información de anticipos"""
+def calcular_dias(fecha_entrada_dt, fecha_salida_dt):
+    """Noches a cobrar entre dos fechas (mínimo 1, días completos como en el formulario)"""
+    dias = (fecha_salida_dt - fecha_entrada_dt).days
+    return dias if dias > 0 else 1
+
+# Tarifas compiladas: se recargan cuando cambian las reglas o tras DB_TARIFAS_TTL segundos
+# (cambios hechos por otro proceso con la caché en memoria)
+TARIFAS_TTL = float(os.environ.get('DB_TARIFAS_TTL', 300))
+_tarifas = {'tabla': None, 'version': None, 'cargada': 0.0}
+_tarifas_lock = threading.Lock()
+
+def tabla_tarifas():
+    """Reglas de tarifas y descuentos compiladas (tarifas.TablaTarifas); sin reglas rige el precio base"""
+    version = version_datos('tarifas')
+    with _tarifas_lock:
+        if (_tarifas['tabla'] is not None and _tarifas['version'] == version
+                and time.monotonic() - _tarifas['cargada'] < TARIFAS_TTL):
+            return _tarifas['tabla']
+    try:
+        tabla = tarifas.TablaTarifas(
+            [tarifas.leer_regla(fila) for fila in _consultar_todas("SELECT * FROM tarifas")],
+            [tarifas.leer_descuento(fila) for fila in _consultar_todas("SELECT * FROM descuentos_estadia")])
+    except (mysql.connector.Error, ValueError) as e:
+        # Un error pasajero no descarta las reglas ya cargadas
+        logger.error(f"Error al cargar tarifas: {e}")
+        tabla = _tarifas['tabla'] or tarifas.TablaTarifas()
+    with _tarifas_lock:
+        _tarifas.update(tabla=tabla, version=version, cargada=time.monotonic())
+    return tabla
+
+def cotizar_habitaciones(habitaciones, fecha_entrada, fecha_salida):
+    """Copias de las habitaciones con la cotización de la estadía (noches, subtotal, descuento, monto_total)"""
+    if isinstance(fecha_entrada, str):
+        fecha_entrada = datetime.strptime(fecha_entrada, "%Y-%m-%dT%H:%M")
+        fecha_salida = datetime.strptime(fecha_salida, "%Y-%m-%dT%H:%M")
+    return tabla_tarifas().cotizar_habitaciones(habitaciones, fecha_entrada, calcular_dias(fecha_entrada, fecha_salida))
+
+def guardar_tarifas(reglas, descuentos):
+    """Reemplaza todas las reglas de tarifas y descuentos (ya normalizadas) en una transacción"""
+    conn = None
+    cursor = None
+    try:
+        conn = conectar()
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM tarifas")
+        cursor.execute("DELETE FROM descuentos_estadia")
+        if reglas:
+            cursor.executemany("""
+                INSERT INTO tarifas (nombre, tipo, desde, hasta, dias_semana, precio, factor, prioridad)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+            """, [(r['nombre'], r['tipo'], r['desde'], r['hasta'], tarifas.texto_dias_semana(r['dias_semana']),
+                   r['precio'], r['factor'], r['prioridad']) for r in reglas])
+        if descuentos:
+            cursor.executemany("""
+                INSERT INTO descuentos_estadia (tipo, noches_minimas, porcentaje)
+                VALUES (%s, %s, %s)
+            """, [(d['tipo'], d['noches_minimas'], d['porcentaje']) for d in descuentos])
+        conn.commit()
+        _notificar_escritura('tarifas')
+        logger.info(f"Tarifas guardadas: {len(reglas)} reglas, {len(descuentos)} descuentos")
+        return True
+    except mysql.connector.Error as e:
+        logger.error(f"Error al guardar tarifas: {e}")
+        if conn:
+            conn.rollback()
+        return None
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+
+def crear_reserva_con_anticipo(id_cliente, id_habitacion, fecha_entrada, fecha_salida, porcentaje_anticipo):
+    """Verifica, reserva y registra el anticipo en una sola transacción; devuelve la reserva completa"""
+    for intento in range(REINTENTOS_BLOQUEO + 1):
+        conn = None
+        cursor = None
+        try:
+            fecha_entrada_dt = datetime.strptime(fecha_entrada, "%Y-%m-%dT%H:%M")
+            fecha_salida_dt = datetime.strptime(fecha_salida, "%Y-%m-%dT%H:%M")
+            porcentaje = Decimal(str(porcentaje_anticipo))
+            if fecha_salida_dt <= fecha_entrada_dt or not (0 <= porcentaje <= 100):
+                logger.warning("Fechas o porcentaje de anticipo inválidos")
+                return False
+
+            if indice_disponibilidad.cargado and indice_disponibilidad.hay_conflicto(id_habitacion, fecha_entrada_dt, fecha_salida_dt):
+                logger.warning(f"Conflicto de fechas/horas para habitación {id_habitacion}")
+                return False
+
+            conn = conectar()
+            cursor = conn.cursor(dictionary=True)
+            # Con la habitación bloqueada, otra reserva simultánea espera a que esta confirme o se descarte
+            conn.start_transaction()
+            _bloquear_habitaciones(cursor, [id_habitacion])
+
+            # Habitación, precio y conflicto de fechas en un solo viaje
+            cursor.execute("""
+                SELECT h.id, h.numero_habitacion, h.tipo, h.precio_por_noche, h.estado,
+                       EXISTS (
+                           SELECT 1 FROM reservas r
+                           WHERE r.id_habitacion = h.id
+                             AND r.estado = 'confirmada'
+                             AND NOT (r.fecha_salida <= %s OR r.fecha_entrada >= %s)
+                       ) AS conflicto
+                FROM habitaciones h
+                WHERE h.id = %s
+            """, (fecha_entrada_dt, fecha_salida_dt, id_habitacion))
+            habitacion = cursor.fetchone()
+            if not habitacion or habitacion['estado'] == 'mantenimiento':
+                logger.warning(f"Habitación {id_habitacion} no está disponible")
+                return False
+            if habitacion['conflicto']:
+                logger.warning(f"Conflicto de fechas/horas para habitación {id_habitacion}")
+                return False
+
+            dias = calcular_dias(fecha_entrada_dt, fecha_salida_dt)
+            centavos = Decimal('0.01')
+            # Mismo cálculo que la cotización que se mostró en la búsqueda
+            monto_total = tabla_tarifas().cotizar(habitacion['tipo'], habitacion['precio_por_noche'],
+                                                  fecha_entrada_dt, dias)['monto_total']
+            monto_anticipo = (monto_total * porcentaje / 100).quantize(centavos, ROUND_HALF_UP)
+            monto_restante = monto_total - monto_anticipo
+
+            # La reserva se inserta ya con los datos del anticipo: no hace falta el UPDATE posterior
+            cursor.execute("""
+                INSERT INTO reservas (id_cliente, id_habitacion, fecha_entrada, fecha_salida, monto, estado,
+                                      monto_anticipo, porcentaje_anticipo)
+                VALUES (%s, %s, %s, %s, %s, 'confirmada', %s, %s)
+            """, (id_cliente, habitacion['id'], fecha_entrada_dt, fecha_salida_dt, monto_total, monto_anticipo, porcentaje))
+            reserva_id = cursor.lastrowid
+            cursor.execute("""
+                INSERT INTO anticipos (id_reserva, monto_total, porcentaje_anticipo, monto_anticipo, monto_restante)
+                VALUES (%s, %s, %s, %s, %s)
+            """, (reserva_id, monto_total, porcentaje, monto_anticipo, monto_restante))
+            _registrar_en_resumen(cursor, reservas=[(habitacion['id'], fecha_entrada_dt, fecha_salida_dt, monto_total)],
+                                  anticipos=[(habitacion['id'], datetime.now(), monto_anticipo)])
+            _registrar_cambios(cursor, 'reserva', [reserva_id], 'alta')
+
+            conn.commit()
+            _notificar_escritura('reservas')
+            cache_entidades.invalidar('reserva', reserva_id)
+            indice_disponibilidad.registrar_reserva(reserva_id, habitacion['id'], fecha_entrada_dt, fecha_salida_dt)
+            logger.info(f"Reserva {reserva_id} con anticipo creada para habitación {id_habitacion}, cliente {id_cliente}")
+            return {
+                'id': reserva_id,
+                'id_cliente': id_cliente,
+                'id_habitacion': habitacion['id'],
+                'numero_habitacion': habitacion['numero_habitacion'],
+                'tipo_habitacion': habitacion['tipo'],
+                'fecha_entrada': fecha_entrada_dt,
+                'fecha_salida': fecha_salida_dt,
+                'dias': dias,
+                'precio_por_noche': habitacion['precio_por_noche'],
+                'monto_total': monto_total,
+                'porcentaje_anticipo': porcentaje,
+                'monto_anticipo': monto_anticipo,
+                'monto_restante': monto_restante,
+                'estado': 'confirmada',
+            }
+        except mysql.connector.Error as e:
+            if conn:
+                conn.rollback()
+            if _reintentar_tras_bloqueo(e, intento):
+                continue
+            logger.error(f"Error al crear reserva con anticipo: {e}")
+            return None
+        except (ValueError, ArithmeticError) as e:
+            logger.error(f"Datos de reserva inválidos: {e}")
+            return None
+        finally:
+            if cursor:
+                cursor.close()
+            if conn:
+                conn.close()
+
+def upsert_clientes(clientes):
+    """Inserta o actualiza clientes por dni_pasaporte_cpf con executemany; devuelve {dni: id_cliente}"""
+    conn = None
+    cursor = None
+    try:
+        conn = conectar()
+        cursor = conn.cursor(dictionary=True)
+        # Los datos de contacto vacíos no pisan los que ya estaban cargados
+        cursor.executemany("""
+            INSERT INTO clientes (nombre, apellido, dni_pasaporte_cpf, telefono, email, direccion)
+            VALUES (%s, %s, %s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE
+                nombre = VALUES(nombre),
+                apellido = VALUES(apellido),
+                telefono = COALESCE(NULLIF(VALUES(telefono), ''), telefono),
+                email = COALESCE(NULLIF(VALUES(email), ''), email),
+                direccion = COALESCE(NULLIF(VALUES(direccion), ''), direccion)
+        """, [(c['nombre'], c['apellido'], c['dni'], c.get('telefono', ''), c.get('email', ''), c.get('direccion', ''))
+              for c in clientes])
+        ids = _cargar_relacionados(cursor, """
+            SELECT id_cliente, nombre, apellido, dni_pasaporte_cpf, telefono, email FROM clientes
+        """, 'dni_pasaporte_cpf', ids=[c['dni'] for c in clientes])
+        _registrar_cambios(cursor, 'cliente', [filas[0]['id_cliente'] for filas in ids.values()])
+        conn.commit()
+        _notificar_escritura('clientes')
+        cache_entidades.invalidar('cliente', *(filas[0]['id_cliente'] for filas in ids.values()))
+        # Las reservas cacheadas llevan el nombre del cliente
+        cache_entidades.invalidar('reserva')
+        if indice_clientes.cargado:
+            for filas in ids.values():
+                indice_clientes.agregar(filas[0])
+        logger.info(f"{len(clientes)} clientes insertados o actualizados")
+        return {dni: filas[0]['id_cliente'] for dni, filas in ids.items()}
+    except mysql.connector.Error as e:
+        logger.error(f"Error al insertar clientes en lote: {e}")
+        if conn:
+            conn.rollback()
+        return None
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+
+def listar_habitaciones_basico():
+    """Lista habitaciones sin reservas (id, número, tipo, precio y estado)"""
+    conn = None
+    cursor = None
+    try:
+        conn = conectar()
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute("SELECT id, numero_habitacion, tipo, precio_por_noche, estado FROM habitaciones ORDER BY numero_habitacion")
+        return cursor.fetchall()
+    except mysql.connector.Error as e:
+        logger.error(f"Error al listar habitaciones: {e}")
+        return []
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+
+_CONSULTA_CONFIRMADAS_EN_RANGO = """
+            SELECT id, id_habitacion, fecha_entrada, fecha_salida
+            FROM reservas
+            WHERE estado = 'confirmada'
+              AND fecha_salida > %s
+              AND fecha_entrada < %s
+            ORDER BY fecha_entrada
+        """
+
+def reservas_confirmadas_en_rango(ids_habitacion, desde, hasta):
+    """Reservas confirmadas de las habitaciones dadas que se solapan con [desde, hasta), agrupadas por habitación"""
     conn = None
     cursor = None
     try:
         conn = conectar()
         cursor = conn.cursor(dictionary=True)
+        return _cargar_relacionados(cursor, _CONSULTA_CONFIRMADAS_EN_RANGO, 'id_habitacion',
+                                    ids=ids_habitacion, params=(desde, hasta))
+    except mysql.connector.Error as e:
+        logger.error(f"Error al consultar reservas en rango: {e}")
+        return None
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+
+def _consultar_tuplas(consulta, params=()):
+    """Como _consultar_todas pero con filas en tuplas, para convertirlas en arreglos sin diccionarios"""
+    conn = None
+    cursor = None
+    try:
+        conn = conectar()
+        cursor = conn.cursor()
+        cursor.execute(consulta, tuple(params))
+        return cursor.fetchall()
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+
+def reservas_para_ocupacion(desde, hasta):
+    """Habitaciones e intervalos (id_habitacion, segundos de entrada y de salida contados desde `desde`)
+    de las reservas confirmadas u ocupadas que se solapan con [desde, hasta)"""
+    resultados = ejecutar_en_paralelo({
+        'habitaciones': listar_habitaciones_basico,
+        # MySQL calcula los desplazamientos: la grilla los recibe como enteros listos para vectorizar
+        'reservas': (_consultar_tuplas, """
+            SELECT id_habitacion,
+                   TIMESTAMPDIFF(SECOND, %s, fecha_entrada),
+                   TIMESTAMPDIFF(SECOND, %s, fecha_salida)
+            FROM reservas
+            WHERE estado IN ('confirmada', 'ocupada')
+              AND fecha_salida > %s
+              AND fecha_entrada < %s
+        """, (desde, desde, desde, hasta)),
+    })
+    if resultados['reservas'] is None:
+        logger.error("Error al consultar reservas para la grilla de ocupación")
+        return None, None
+    return resultados['habitaciones'], resultados['reservas']
+
+def _insertar_reservas_y_anticipos(cursor, reservas):
+    """Inserta reservas confirmadas y sus anticipos con el cursor dado (sin commit); devuelve los ids en orden"""
+    # Una sentencia por reserva para tomar su id de lastrowid: no depende de que los ids de un
+    # INSERT de varias filas salgan consecutivos ni de volver a buscarlas por habitación y fecha
+    ids = []
+    for r in reservas:
         cursor.execute("""
+            INSERT INTO reservas (id_cliente, id_habitacion, fecha_entrada, fecha_salida, monto, estado,
+                                  monto_anticipo, porcentaje_anticipo)
+            VALUES (%s, %s, %s, %s, %s, 'confirmada', %s, %s)
+        """, (r['id_cliente'], r['id_habitacion'], r['fecha_entrada'], r['fecha_salida'], r['monto_total'],
+              r['monto_anticipo'], r['porcentaje_anticipo']))
+        ids.append(cursor.lastrowid)
+
+    cursor.executemany("""
+        INSERT INTO anticipos (id_reserva, monto_total, porcentaje_anticipo, monto_anticipo, monto_restante)
+        VALUES (%s, %s, %s, %s, %s)
+    """, [(id_reserva, r['monto_total'], r['porcentaje_anticipo'], r['monto_anticipo'], r['monto_restante'])
+          for id_reserva, r in zip(ids, reservas)])
+    ahora = datetime.now()
+    _registrar_en_resumen(
+        cursor,
+        reservas=[(r['id_habitacion'], r['fecha_entrada'], r['fecha_salida'], r['monto_total']) for r in reservas],
+        anticipos=[(r['id_habitacion'], ahora, r['monto_anticipo']) for r in reservas])
+    _registrar_cambios(cursor, 'reserva', ids, 'alta')
+    return ids
+
+def _sin_conflictos(cursor, reservas):
+    """Posiciones de las reservas que no se solapan con las confirmadas ni con las anteriores del mismo bloque"""
+    existentes = _cargar_relacionados(
+        cursor, _CONSULTA_CONFIRMADAS_EN_RANGO, 'id_habitacion', ids=[r['id_habitacion'] for r in reservas],
+        params=(min(r['fecha_entrada'] for r in reservas), max(r['fecha_salida'] for r in reservas)))
+    ocupacion = {}
+    for id_habitacion, filas in existentes.items():
+        intervalos = ocupacion[id_habitacion] = disponibilidad.IntervalosHabitacion()
+        for f in filas:
+            intervalos.agregar(f['id'], f['fecha_entrada'], f['fecha_salida'])
+    posiciones = []
+    for i, r in enumerate(reservas):
+        intervalos = ocupacion.setdefault(r['id_habitacion'], disponibilidad.IntervalosHabitacion())
+        if intervalos.hay_conflicto(r['fecha_entrada'], r['fecha_salida']):
+            continue
+        intervalos.agregar(('bloque', i), r['fecha_entrada'], r['fecha_salida'])
+        posiciones.append(i)
+    return posiciones
+
+def insertar_reservas_con_anticipos(reservas):
+    """Inserta un bloque de reservas y sus anticipos en una transacción.
+
+    Bloquea las habitaciones del bloque y vuelve a verificar los solapamientos dentro de la
+    transacción, así una reserva confirmada por otra vía después de la validación previa no queda
+    duplicada. Devuelve los ids en el mismo orden, con None en las reservas rechazadas por
+    conflicto, o None si falló el bloque.
+    """
+    for intento in range(REINTENTOS_BLOQUEO + 1):
+        conn = None
+        cursor = None
+        try:
+            conn = conectar()
+            cursor = conn.cursor(dictionary=True)
+            conn.start_transaction()
+            _bloquear_habitaciones(cursor, {r['id_habitacion'] for r in reservas})
+            posiciones = _sin_conflictos(cursor, reservas)
+            aceptadas = [reservas[i] for i in posiciones]
+            ids = [None] * len(reservas)
+            if aceptadas:
+                for i, id_reserva in zip(posiciones, _insertar_reservas_y_anticipos(cursor, aceptadas)):
+                    ids[i] = id_reserva
+            conn.commit()
+            if len(aceptadas) < len(reservas):
+                logger.warning(f"{len(reservas) - len(aceptadas)} reservas del bloque rechazadas por conflicto")
+            if aceptadas:
+                _notificar_escritura('reservas')
+                cache_entidades.invalidar('reserva', *(ids[i] for i in posiciones))
+                for i in posiciones:
+                    r = reservas[i]
+                    indice_disponibilidad.registrar_reserva(ids[i], r['id_habitacion'], r['fecha_entrada'], r['fecha_salida'])
+            return ids
+        except mysql.connector.Error as e:
+            if conn:
+                conn.rollback()
+            if _reintentar_tras_bloqueo(e, intento):
+                continue
+            logger.error(f"Error al insertar bloque de reservas: {e}")
+            return None
+        finally:
+            if cursor:
+                cursor.close()
+            if conn:
+                conn.close()
+
+def buscar_habitaciones_grupo(fecha_entrada, fecha_salida, requisito, precio_max=None):
+    """Busca conjuntos de habitaciones libres que cubran un requisito como {'doble': 3, 'suite': 2}.
+
+    El requisito también puede venir como texto ("3 dobles + 2 suites"); en ese caso se valida
+    contra los tipos existentes y lanza ValueError si no se entiende.
+    """
+    tareas = {'libres': (listar_habitaciones_disponibles, fecha_entrada, fecha_salida)}
+    if isinstance(requisito, str):
+        tareas['habitaciones'] = listar_habitaciones_basico
+    lecturas = ejecutar_en_paralelo(tareas, defecto=[])
+    if isinstance(requisito, str):
+        requisito = disponibilidad.parsear_requisito(requisito, {h['tipo'] for h in lecturas['habitaciones']})
+    libres = lecturas['libres']
+    resultado = disponibilidad.buscar_grupo(libres, requisito, precio_max)
+    logger.info(f"Búsqueda de grupo {requisito}: {'factible' if resultado['factible'] else 'sin cupo'}")
+    return resultado
+
+# Hora de entrada y salida que se propone en las búsquedas por fechas flexibles
+HORA_ESTADIA = 12
+MAX_DIAS_FLEXIBLES = 366
+ORDENES_FLEXIBLES = {
+    'primera': lambda e: (e['fecha_entrada'], e['precio_por_noche'], e['numero_habitacion']),
+    'economica': lambda e: (e['precio_por_noche'], e['fecha_entrada'], e['numero_habitacion']),
+}
+
+def buscar_estadias_flexibles(desde, hasta, noches, tipo=None, orden='primera', limite=20):
+    """Estadías de `noches` noches que empiezan entre las fechas `desde` y `hasta` (inclusive).
+
+    Devuelve por habitación la primera entrada posible, cuántas entradas entran en la ventana
+    y sus tramos, ordenadas por fecha ('primera') o por precio ('economica'). Lanza ValueError
+    con parámetros inválidos y devuelve None si no se pudo cargar el índice.
+    """
+    if orden not in ORDENES_FLEXIBLES:
+        raise ValueError(f"Orden desconocido: {orden}")
+    if noches < 1 or hasta < desde or (hasta - desde).days >= MAX_DIAS_FLEXIBLES:
+        raise ValueError(f"Indique al menos una noche y una ventana de hasta {MAX_DIAS_FLEXIBLES} días")
+
+    paso = timedelta(days=1)
+    duracion = timedelta(days=noches)
+    primera = datetime(desde.year, desde.month, desde.day, HORA_ESTADIA)
+    ultima = datetime(hasta.year, hasta.month, hasta.day, HORA_ESTADIA)
+    ahora = datetime.now()
+    if primera < ahora:
+        primera += paso * -((primera - ahora) // paso)
+    if primera > ultima:
+        return []
+
+    indice = _indice_cargado()
+    if not indice:
+        logger.error("No se pudo cargar el índice para la búsqueda flexible")
+        return None
+    tabla = tabla_tarifas()
+    estadias = []
+    for habitacion, tramos in indice.estadias_libres(primera, ultima, duracion, paso, tipo=tipo):
+        entrada = primera + paso * tramos[0][0]
+        estadias.append({
+            'id_habitacion': habitacion['id'],
+            'numero_habitacion': habitacion['numero_habitacion'],
+            'tipo': habitacion['tipo'],
+            'precio_por_noche': habitacion['precio_por_noche'],
+            'fecha_entrada': entrada,
+            'fecha_salida': entrada + duracion,
+            'monto': tabla.cotizar(habitacion['tipo'], habitacion['precio_por_noche'], entrada, noches)['monto_total'],
+            'entradas_posibles': sum(k_final - k_inicial + 1 for k_inicial, k_final in tramos),
+            'tramos': [(primera + paso * k_inicial, primera + paso * k_final) for k_inicial, k_final in tramos],
+        })
+    estadias.sort(key=ORDENES_FLEXIBLES[orden])
+    logger.info(f"Búsqueda flexible de {noches} noches: {len(estadias)} habitaciones con lugar")
+    return estadias[:limite]
+
+def crear_reserva_grupo(id_cliente, ids_habitacion, fecha_entrada, fecha_salida, porcentaje_anticipo):
+    """Reserva todas las habitaciones del conjunto o ninguna; devuelve la lista de reservas creadas"""
+    for intento in range(REINTENTOS_BLOQUEO + 1):
+        conn = None
+        cursor = None
+        try:
+            fecha_entrada_dt = datetime.strptime(fecha_entrada, "%Y-%m-%dT%H:%M")
+            fecha_salida_dt = datetime.strptime(fecha_salida, "%Y-%m-%dT%H:%M")
+            porcentaje = Decimal(str(porcentaje_anticipo))
+            ids_habitacion = list(dict.fromkeys(int(i) for i in ids_habitacion))
+            if fecha_salida_dt <= fecha_entrada_dt or not (0 <= porcentaje <= 100) or not ids_habitacion:
+                logger.warning("Fechas, porcentaje de anticipo o habitaciones inválidos")
+                return False
+
+            if indice_disponibilidad.cargado and any(
+                    indice_disponibilidad.hay_conflicto(i, fecha_entrada_dt, fecha_salida_dt) for i in ids_habitacion):
+                logger.warning(f"Conflicto de fechas/horas en el grupo {ids_habitacion}")
+                return False
+
+            conn = conectar()
+            cursor = conn.cursor(dictionary=True)
+
+            # Bloquear las habitaciones del grupo y verificar conflictos de todas en un solo viaje
+            conn.start_transaction()
+            _bloquear_habitaciones(cursor, ids_habitacion)
+            marcadores = ", ".join(["%s"] * len(ids_habitacion))
+            cursor.execute(f"""
+                SELECT h.id, h.numero_habitacion, h.tipo, h.precio_por_noche, h.estado,
+                       EXISTS (
+                           SELECT 1 FROM reservas r
+                           WHERE r.id_habitacion = h.id
+                             AND r.estado = 'confirmada'
+                             AND NOT (r.fecha_salida <= %s OR r.fecha_entrada >= %s)
+                       ) AS conflicto
+                FROM habitaciones h
+                WHERE h.id IN ({marcadores})
+            """, (fecha_entrada_dt, fecha_salida_dt, *ids_habitacion))
+            habitaciones = {h['id']: h for h in cursor.fetchall()}
+            rechazadas = [i for i in ids_habitacion
+                          if i not in habitaciones or habitaciones[i]['estado'] == 'mantenimiento' or habitaciones[i]['conflicto']]
+            if rechazadas:
+                logger.warning(f"Habitaciones no disponibles en el grupo: {rechazadas}")
+                conn.rollback()
+                return False
+
+            dias = calcular_dias(fecha_entrada_dt, fecha_salida_dt)
+            centavos = Decimal('0.01')
+            tabla = tabla_tarifas()
+            reservas = []
+            for id_habitacion in ids_habitacion:
+                habitacion = habitaciones[id_habitacion]
+                monto_total = tabla.cotizar(habitacion['tipo'], habitacion['precio_por_noche'],
+                                            fecha_entrada_dt, dias)['monto_total']
+                monto_anticipo = (monto_total * porcentaje / 100).quantize(centavos, ROUND_HALF_UP)
+                reservas.append({
+                    'id_cliente': id_cliente,
+                    'id_habitacion': id_habitacion,
+                    'numero_habitacion': habitacion['numero_habitacion'],
+                    'tipo_habitacion': habitacion['tipo'],
+                    'fecha_entrada': fecha_entrada_dt,
+                    'fecha_salida': fecha_salida_dt,
+                    'dias': dias,
+                    'precio_por_noche': habitacion['precio_por_noche'],
+                    'monto_total': monto_total,
+                    'porcentaje_anticipo': porcentaje,
+                    'monto_anticipo': monto_anticipo,
+                    'monto_restante': monto_total - monto_anticipo,
+                    'estado': 'confirmada',
+                })
+            ids = _insertar_reservas_y_anticipos(cursor, reservas)
+
+            conn.commit()
+            _notificar_escritura('reservas')
+            cache_entidades.invalidar('reserva', *ids)
+            for id_reserva, r in zip(ids, reservas):
+                r['id'] = id_reserva
+                indice_disponibilidad.registrar_reserva(id_reserva, r['id_habitacion'], fecha_entrada_dt, fecha_salida_dt)
+            logger.info(f"Reserva de grupo {ids} creada para cliente {id_cliente}")
+            return reservas
+        except mysql.connector.Error as e:
+            if conn:
+                conn.rollback()
+            if _reintentar_tras_bloqueo(e, intento):
+                continue
+            logger.error(f"Error al crear reserva de grupo: {e}")
+            return None
+        except (ValueError, ArithmeticError, KeyError) as e:
+            logger.error(f"Datos de reserva de grupo inválidos: {e}")
+            if conn:
+                conn.rollback()
+            return None
+        finally:
+            if cursor:
+                cursor.close()
+            if conn:
+                conn.close()
+
+_CONSULTA_RESERVAS_CON_ANTICIPOS = """
             SELECT 
                 r.id,
                 r.fecha_entrada,
@@ -551,8 +1911,113 @@ def listar_reservas_con_anticipos():
             FROM reservas r
             JOIN clientes c ON r.id_cliente = c.id_cliente
             JOIN habitaciones h ON r.id_habitacion = h.id
-            ORDER BY r.fecha_entrada DESC
-        """)
+            {donde}
+            ORDER BY r.fecha_entrada DESC, r.id DESC
+        """
+
+def _filtros_reservas(filtros):
+    """Condiciones SQL sobre reservas r para los filtros de listado"""
+    condiciones = []
+    params = []
+    if filtros.get('desde'):
+        condiciones.append("r.fecha_entrada >= %s")
+        params.append(filtros['desde'])
+    if filtros.get('hasta'):
+        condiciones.append("r.fecha_entrada < %s")
+        params.append(filtros['hasta'] + timedelta(days=1))
+    if filtros.get('estado'):
+        condiciones.append("r.estado = %s")
+        params.append(filtros['estado'])
+    if filtros.get('id_habitacion'):
+        condiciones.append("r.id_habitacion = %s")
+        params.append(filtros['id_habitacion'])
+    if filtros.get('id_cliente'):
+        condiciones.append("r.id_cliente = %s")
+        params.append(filtros['id_cliente'])
+    return condiciones, params
+
+_CONSULTA_ANTICIPOS = """
+            SELECT
+                a.id,
+                a.id_reserva,
+                r.id_cliente,
+                c.nombre,
+                c.apellido,
+                c.dni_pasaporte_cpf,
+                a.monto_total,
+                a.porcentaje_anticipo,
+                a.monto_anticipo,
+                a.monto_restante,
+                a.fecha_anticipo,
+                r.fecha_entrada,
+                r.estado as estado_reserva
+            FROM anticipos a
+            JOIN reservas r ON a.id_reserva = r.id
+            JOIN clientes c ON r.id_cliente = c.id_cliente
+            {donde}
+            ORDER BY a.id
+        """
+
+# Filas que se piden por vuelta al exportar: la memoria queda acotada a un lote
+EXPORTACION_LOTE = int(os.environ.get('DB_EXPORTACION_LOTE', 2000))
+EXPORTACIONES = ('reservas', 'clientes', 'anticipos')
+
+def _consulta_exportacion(nombre, filtros):
+    """Consulta y parámetros de cada exportación, con los mismos filtros que los listados"""
+    if nombre == 'reservas':
+        condiciones, params = _filtros_reservas(filtros)
+        return _CONSULTA_RESERVAS_CON_ANTICIPOS.format(donde=_donde(condiciones)), params
+    if nombre == 'anticipos':
+        condiciones, params = _filtros_reservas(filtros)
+        return _CONSULTA_ANTICIPOS.format(donde=_donde(condiciones)), params
+    if nombre == 'clientes':
+        condiciones, params = _filtros_clientes(filtros)
+        origen = f"(SELECT * FROM clientes c {_donde(condiciones)})" if condiciones else "clientes"
+        return _CONSULTA_CLIENTES.format(origen=origen), params
+    raise ValueError(f"Exportación desconocida: {nombre}")
+
+def exportar_filas(nombre, filtros=None, lote=None):
+    """Generador de una exportación: primero la tupla de columnas y después cada fila como tupla.
+
+    Usa un cursor sin buffer y fetchmany, así que las filas se leen del socket a medida que se
+    consumen. La conexión queda prestada hasta agotar o cerrar el generador; si se abandona a
+    medias se descarta, porque quedan filas sin leer.
+    """
+    consulta, params = _consulta_exportacion(nombre, filtros or {})
+    lote = lote or EXPORTACION_LOTE
+    conn = None
+    cursor = None
+    completa = False
+    try:
+        conn = conectar_lectura()
+        cursor = conn.cursor(buffered=False)
+        cursor.execute(consulta, tuple(params))
+        yield tuple(cursor.column_names)
+        while True:
+            filas = cursor.fetchmany(lote)
+            if not filas:
+                break
+            yield from filas
+        completa = True
+    except mysql.connector.Error as e:
+        logger.error(f"Error al exportar {nombre}: {e}")
+        raise
+    finally:
+        if completa:
+            cursor.close()
+            conn.close()
+        elif conn:
+            conn.descartar()
+
+def listar_reservas_con_anticipos(filtros=None):
+    """Lista todas las reservas con información de anticipos"""
+    conn = None
+    cursor = None
+    try:
+        conn = conectar_lectura()
+        cursor = conn.cursor(dictionary=True)
+        condiciones, params = _filtros_reservas(filtros or {})
+        cursor.execute(_CONSULTA_RESERVAS_CON_ANTICIPOS.format(donde=_donde(condiciones)), tuple(params))
         reservas = cursor.fetchall()
         return reservas
     except mysql.connector.Error as e:
@@ -563,4 +2028,400 @@ def listar_reservas_con_anticipos():
             cursor.close()
         if conn:
             conn.close()
-    
\ No newline at end of file
+
+def pagina_reservas(filtros=None, cursor_pagina=None, limite=50):
+    """Página de reservas con anticipos ordenada por (fecha_entrada DESC, id DESC) con paginación por clave"""
+    conn = None
+    cursor = None
+    try:
+        condiciones, params = _filtros_reservas(filtros or {})
+        if cursor_pagina:
+            fecha, ultimo_id = decodificar_cursor(cursor_pagina)
+            fecha = datetime.fromisoformat(fecha)
+            condiciones.append("(r.fecha_entrada < %s OR (r.fecha_entrada = %s AND r.id < %s))")
+            params.extend([fecha, fecha, int(ultimo_id)])
+
+        conn = conectar_lectura()
+        cursor = conn.cursor(dictionary=True)
+        sql = _CONSULTA_RESERVAS_CON_ANTICIPOS.format(donde=_donde(condiciones)) + " LIMIT %s"
+        cursor.execute(sql, tuple(params) + (limite + 1,))
+        filas = cursor.fetchall()
+
+        siguiente = None
+        if len(filas) > limite:
+            filas = filas[:limite]
+            siguiente = codificar_cursor(filas[-1]['fecha_entrada'], filas[-1]['id'])
+        return {'filas': filas, 'siguiente': siguiente}
+    except mysql.connector.Error as e:
+        logger.error(f"Error al paginar reservas: {e}")
+        return {'filas': [], 'siguiente': None}
+    except (ValueError, TypeError) as e:
+        logger.error(f"Error en parámetros de paginación: {e}")
+        return {'filas': [], 'siguiente': None}
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+
+# Horas tras la fecha de entrada después de las cuales una reserva confirmada sin anticipo
+# se da por no presentada y se cancela (0 = no vencer nunca; las reservas simples no llevan anticipo)
+GRACIA_SIN_ANTICIPO_HORAS = float(os.environ.get('DB_GRACIA_SIN_ANTICIPO_HORAS', 0))
+
+def _actualizar_por_ids(cursor, sentencia, ids, params=(), lote=1000):
+    """Ejecuta `sentencia` (con {ids} donde va la lista) en lotes de ids; devuelve las filas afectadas"""
+    afectadas = 0
+    for inicio in range(0, len(ids), lote):
+        bloque = ids[inicio:inicio + lote]
+        marcadores = ", ".join(["%s"] * len(bloque))
+        cursor.execute(sentencia.format(ids=marcadores), tuple(bloque) + tuple(params))
+        afectadas += cursor.rowcount
+    return afectadas
+
+def aplicar_transiciones(ahora=None):
+    """Aplica en una transacción las salidas, vencimientos y entradas pendientes hasta `ahora`.
+
+    Salidas: las reservas confirmadas u ocupadas cuya fecha de salida pasó quedan 'finalizada'.
+    Vencimientos: con DB_GRACIA_SIN_ANTICIPO_HORAS, las confirmadas sin anticipo cuya entrada pasó
+    hace más de ese plazo quedan 'cancelada'. Sus habitaciones 'ocupada' vuelven a 'disponible' si no
+    sigue otra estadía, y las habitaciones 'disponible' con una estadía en curso pasan a 'ocupada'
+    ('ocupada' no impide reservar otras fechas; sólo 'mantenimiento' bloquea las reservas).
+    La reserva sigue 'confirmada' durante la estadía porque los controles de solapamiento sólo
+    miran ese estado; 'mantenimiento' nunca se toca.
+
+    Todo se decide por el estado actual de las filas: repetir la llamada no cambia nada y una sola
+    llamada después de una caída recupera todas las transiciones atrasadas. Devuelve los conteos
+    de cada transición, o None ante un error de base de datos.
+    """
+    ahora = ahora or datetime.now()
+    conn = None
+    cursor = None
+    try:
+        conn = conectar()
+        cursor = conn.cursor()
+        vencidas = []
+        if GRACIA_SIN_ANTICIPO_HORAS > 0:
+            cursor.execute("""
+                SELECT id, id_habitacion, fecha_entrada, fecha_salida, monto FROM reservas
+                WHERE estado = 'confirmada' AND fecha_entrada <= %s AND monto_anticipo IS NULL
+                FOR UPDATE
+            """, (ahora - timedelta(hours=GRACIA_SIN_ANTICIPO_HORAS),))
+            vencidas = cursor.fetchall()
+        cursor.execute("""
+            SELECT id, id_habitacion FROM reservas
+            WHERE estado IN ('confirmada', 'ocupada') AND fecha_salida <= %s
+            FOR UPDATE
+        """, (ahora,))
+        ids_vencidas = {r[0] for r in vencidas}
+        finalizadas = [r for r in cursor.fetchall() if r[0] not in ids_vencidas]
+
+        _actualizar_por_ids(cursor, "UPDATE reservas SET estado = 'finalizada' WHERE id IN ({ids})",
+                            [r[0] for r in finalizadas])
+        _actualizar_por_ids(cursor, "UPDATE reservas SET estado = 'cancelada' WHERE id IN ({ids})",
+                            [r[0] for r in vencidas])
+        # Las canceladas dejan de sumar noches e ingresos; sus anticipos quedan cobrados
+        _registrar_en_resumen(cursor, quitar=[r[1:] for r in vencidas])
+
+        # Con las salidas ya aplicadas, las confirmadas con entrada vencida son las estadías en curso
+        cursor.execute("""
+            SELECT DISTINCT id_habitacion FROM reservas
+            WHERE estado IN ('confirmada', 'ocupada') AND fecha_entrada <= %s
+        """, (ahora,))
+        en_curso = {fila[0] for fila in cursor.fetchall()}
+
+        liberables = sorted({r[1] for r in finalizadas + vencidas} - en_curso)
+        liberadas = []
+        if liberables:
+            cursor.execute(f"""
+                SELECT id FROM habitaciones
+                WHERE estado = 'ocupada' AND id IN ({", ".join(["%s"] * len(liberables))})
+                FOR UPDATE
+            """, tuple(liberables))
+            liberadas = [fila[0] for fila in cursor.fetchall()]
+            _actualizar_por_ids(cursor, "UPDATE habitaciones SET estado = 'disponible' WHERE id IN ({ids})", liberadas)
+
+        ocupadas = []
+        if en_curso:
+            cursor.execute(f"""
+                SELECT id FROM habitaciones
+                WHERE estado = 'disponible' AND id IN ({", ".join(["%s"] * len(en_curso))})
+                FOR UPDATE
+            """, tuple(sorted(en_curso)))
+            ocupadas = [fila[0] for fila in cursor.fetchall()]
+            _actualizar_por_ids(cursor, "UPDATE habitaciones SET estado = 'ocupada' WHERE id IN ({ids})", ocupadas)
+        _registrar_cambios(cursor, 'reserva', [r[0] for r in finalizadas + vencidas])
+        _registrar_cambios(cursor, 'habitacion', liberadas + ocupadas)
+        conn.commit()
+    except mysql.connector.Error as e:
+        logger.error(f"Error al aplicar transiciones de estado: {e}")
+        if conn:
+            conn.rollback()
+        return None
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+
+    if finalizadas or vencidas:
+        _notificar_escritura('reservas', 'habitaciones')
+        cache_entidades.invalidar('reserva', *[r[0] for r in finalizadas + vencidas])
+        for id_reserva, *_ in finalizadas + vencidas:
+            indice_disponibilidad.quitar_reserva(id_reserva)
+    elif liberadas or ocupadas:
+        _notificar_escritura('habitaciones')
+    if liberadas or ocupadas:
+        cache_entidades.invalidar('habitacion', *liberadas, *ocupadas)
+    for id_habitacion in liberadas:
+        indice_disponibilidad.actualizar_habitacion(id_habitacion, estado='disponible')
+    for id_habitacion in ocupadas:
+        indice_disponibilidad.actualizar_habitacion(id_habitacion, estado='ocupada')
+
+    resultado = {'finalizadas': len(finalizadas), 'canceladas': len(vencidas),
+                 'liberadas': len(liberadas), 'ocupadas': len(ocupadas)}
+    if any(resultado.values()):
+        logger.info(f"Transiciones aplicadas: {resultado}")
+    return resultado
+
+_CONSULTA_MOMENTOS = """
+    SELECT fecha_entrada, 0 FROM reservas
+    WHERE estado = 'confirmada' AND fecha_entrada > %s AND fecha_entrada <= %s
+    UNION ALL
+    SELECT fecha_salida, 0 FROM reservas
+    WHERE estado IN ('confirmada', 'ocupada') AND fecha_salida > %s AND fecha_salida <= %s
+"""
+
+_CONSULTA_MOMENTOS_VENCIMIENTO = """
+    UNION ALL
+    SELECT fecha_entrada, 1 FROM reservas
+    WHERE estado = 'confirmada' AND fecha_entrada > %s AND fecha_entrada <= %s
+      AND monto_anticipo IS NULL
+"""
+
+def momentos_de_transicion(desde, hasta):
+    """Momentos en (desde, hasta] en que aplicar_transiciones tendrá algo que hacer, ordenados"""
+    consulta = _CONSULTA_MOMENTOS
+    params = (desde, hasta, desde, hasta)
+    gracia = timedelta(hours=GRACIA_SIN_ANTICIPO_HORAS)
+    if GRACIA_SIN_ANTICIPO_HORAS > 0:
+        consulta += _CONSULTA_MOMENTOS_VENCIMIENTO
+        params += (desde - gracia, hasta - gracia)
+    try:
+        filas = _consultar_tuplas(consulta, params)
+    except mysql.connector.Error as e:
+        logger.error(f"Error al consultar momentos de transición: {e}")
+        return None
+    return sorted({momento + gracia if por_vencer else momento for momento, por_vencer in filas})
+
+def resumen_ingresos(desde, hasta, agrupacion='dia', tipo=None):
+    """Ingresos y ocupación en [desde, hasta) por día, mes o tipo, leídos sólo del resumen diario.
+
+    Devuelve el diccionario de reportes.resumir (filas con noches, ingresos, ocupación, ADR y RevPAR
+    más el total), None ante un error de base de datos; lanza ValueError con parámetros inválidos.
+    """
+    conn = None
+    cursor = None
+    try:
+        condicion_tipo = " AND tipo = %s" if tipo else ""
+        params = (desde, hasta) + ((tipo,) if tipo else ())
+        conn = conectar_lectura()
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute(f"""
+            SELECT fecha, tipo, noches, ingresos, llegadas, anticipos, pagos
+            FROM resumen_diario
+            WHERE fecha >= %s AND fecha < %s{condicion_tipo}
+            ORDER BY fecha
+        """, params)
+        filas = cursor.fetchall()
+        cursor.execute(f"SELECT tipo, COUNT(*) AS cantidad FROM habitaciones{' WHERE tipo = %s' if tipo else ''} GROUP BY tipo",
+                       (tipo,) if tipo else ())
+        habitaciones_por_tipo = {fila['tipo']: fila['cantidad'] for fila in cursor.fetchall()}
+        return reportes.resumir(filas, habitaciones_por_tipo, desde, hasta, agrupacion)
+    except mysql.connector.Error as e:
+        logger.error(f"Error al consultar el resumen de ingresos: {e}")
+        return None
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+
+_CONSULTAS_RECALCULO = (
+    ('reservas', """
+        SELECT r.estado, h.tipo, r.fecha_entrada, r.fecha_salida, r.monto
+        FROM reservas r
+        JOIN habitaciones h ON h.id = r.id_habitacion
+    """),
+    ('anticipos', """
+        SELECT h.tipo, a.fecha_anticipo, a.monto_anticipo
+        FROM anticipos a
+        JOIN reservas r ON r.id = a.id_reserva
+        JOIN habitaciones h ON h.id = r.id_habitacion
+    """),
+    ('pagos', """
+        SELECT h.tipo, p.fecha_pago, p.monto
+        FROM pagos p
+        JOIN reservas r ON r.id = p.id_reserva
+        JOIN habitaciones h ON h.id = r.id_habitacion
+    """),
+)
+
+def recalcular_resumen(desde=None, hasta=None, lote=None):
+    """Reconstruye el resumen diario desde reservas, anticipos y pagos (todo, o sólo las fechas en [desde, hasta)).
+
+    Recorre las tablas con un cursor sin buffer en lotes de `lote` filas, acumula en memoria (una fila
+    por día y tipo) y reemplaza las filas del rango en una sola transacción. Devuelve la cantidad de
+    filas escritas, o None ante un error de base de datos.
+    """
+    lote = lote or EXPORTACION_LOTE
+    desde = reportes.como_fecha(desde) if desde else None
+    hasta = reportes.como_fecha(hasta) if hasta else None
+    en_rango = lambda fecha: (desde is None or fecha >= desde) and (hasta is None or fecha < hasta)
+    acumulado = {}
+    conn = None
+    cursor = None
+    completa = False
+    try:
+        conn = conectar()
+        for nombre, consulta in _CONSULTAS_RECALCULO:
+            cursor = conn.cursor(buffered=False)
+            cursor.execute(consulta)
+            while True:
+                filas = cursor.fetchmany(lote)
+                if not filas:
+                    break
+                if nombre == 'reservas':
+                    aportes = [aporte for estado, tipo, entrada, salida, monto in filas
+                               if estado in reportes.ESTADOS_VENDIDOS
+                               for aporte in reportes.aportes_reserva(tipo, entrada, salida, monto)]
+                else:
+                    aportes = [reportes.aporte_cobro(tipo, momento, monto, nombre)
+                               for tipo, momento, monto in filas if monto and momento]
+                reportes.sumar([a for a in aportes if en_rango(a[0])], acumulado)
+            cursor.close()
+
+        cursor = conn.cursor()
+        if desde is None and hasta is None:
+            cursor.execute("DELETE FROM resumen_diario")
+        else:
+            cursor.execute("DELETE FROM resumen_diario WHERE fecha >= %s AND fecha < %s",
+                           (desde or date.min, hasta or date.max))
+        filas = [(fecha, tipo, *valores) for (fecha, tipo), valores in sorted(acumulado.items())]
+        for inicio in range(0, len(filas), lote):
+            cursor.executemany("""
+                INSERT INTO resumen_diario (fecha, tipo, noches, ingresos, llegadas, anticipos, pagos)
+                VALUES (%s, %s, %s, %s, %s, %s, %s)
+            """, filas[inicio:inicio + lote])
+        conn.commit()
+        completa = True
+        logger.info(f"Resumen diario recalculado: {len(filas)} filas")
+        return len(filas)
+    except mysql.connector.Error as e:
+        logger.error(f"Error al recalcular el resumen diario: {e}")
+        return None
+    finally:
+        if completa:
+            cursor.close()
+            conn.close()
+        elif conn:
+            # Puede haber filas sin leer en el socket: se descarta la conexión y con ella la transacción
+            conn.descartar()
+
+# Horas que se conservan en la tabla cambios; una pantalla desconectada más tiempo vuelve a cargar todo
+CAMBIOS_HORAS = float(os.environ.get('DB_CAMBIOS_HORAS', 24))
+
+_CONSULTA_CAMBIOS = """
+    SELECT id, entidad, id_entidad, operacion FROM cambios
+    WHERE id > %s
+    ORDER BY id
+    LIMIT %s
+"""
+
+# Estado actual de las entidades que cambiaron, por id (se filtra con _cargar_relacionados)
+_CONSULTAS_ENTIDADES_CAMBIADAS = {
+    'habitacion': ("""
+        SELECT id, numero_habitacion, tipo, precio_por_noche, estado FROM habitaciones
+    """, 'id', 'id'),
+    'reserva': ("""
+        SELECT r.id, r.id_habitacion, r.id_cliente, r.fecha_entrada, r.fecha_salida, r.monto, r.estado,
+               r.monto_anticipo, h.numero_habitacion, c.nombre, c.apellido
+        FROM reservas r
+        JOIN habitaciones h ON h.id = r.id_habitacion
+        JOIN clientes c ON c.id_cliente = r.id_cliente
+    """, 'id', 'r.id'),
+    'cliente': ("""
+        SELECT id_cliente, nombre, apellido, dni_pasaporte_cpf, telefono, email FROM clientes
+    """, 'id_cliente', 'id_cliente'),
+}
+
+def ultimo_cambio():
+    """Id del último cambio registrado (0 si no hay ninguno), o None ante un error de base de datos"""
+    try:
+        filas = _consultar_tuplas("SELECT MAX(id) FROM cambios")
+    except mysql.connector.Error as e:
+        logger.error(f"Error al consultar el último cambio: {e}")
+        return None
+    return filas[0][0] or 0
+
+def leer_cambios(desde_id, limite=500):
+    """Cambios con id mayor que `desde_id` y el estado actual de cada entidad que cambió.
+
+    Devuelve {'ids': ids de cambio leídos en orden, 'cambios': [...]}, con un elemento por entidad
+    (el de su último cambio leído): id, entidad, id_entidad, operacion y datos, que es la fila
+    actual o None si ya no existe. Una sola consulta por tipo de entidad sin importar cuántos
+    cambios haya. None ante un error de base de datos.
+    """
+    conn = None
+    cursor = None
+    try:
+        conn = conectar()
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute(_CONSULTA_CAMBIOS, (desde_id, limite))
+        filas = cursor.fetchall()
+        ultimos = {}
+        for fila in filas:
+            ultimos.pop((fila['entidad'], fila['id_entidad']), None)
+            ultimos[(fila['entidad'], fila['id_entidad'])] = fila
+        datos = {}
+        for entidad, (consulta, clave, columna) in _CONSULTAS_ENTIDADES_CAMBIADAS.items():
+            ids = [id_entidad for (tipo, id_entidad) in ultimos if tipo == entidad]
+            if ids:
+                datos[entidad] = _cargar_relacionados(cursor, consulta, clave, ids=ids, columna=columna)
+        cambios = []
+        for (entidad, id_entidad), fila in ultimos.items():
+            actuales = datos.get(entidad, {}).get(id_entidad)
+            cambios.append({**fila, 'datos': actuales[0] if actuales else None})
+        return {'ids': [fila['id'] for fila in filas], 'cambios': cambios}
+    except mysql.connector.Error as e:
+        logger.error(f"Error al leer los cambios desde {desde_id}: {e}")
+        return None
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
+
+def purgar_cambios(horas=None):
+    """Borra los cambios de hace más de `horas` (DB_CAMBIOS_HORAS); devuelve cuántos, o None ante un error"""
+    limite = datetime.now() - timedelta(hours=CAMBIOS_HORAS if horas is None else horas)
+    conn = None
+    cursor = None
+    try:
+        conn = conectar()
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM cambios WHERE momento < %s", (limite,))
+        borrados = cursor.rowcount
+        conn.commit()
+        if borrados:
+            logger.info(f"{borrados} cambios anteriores a {limite:%Y-%m-%d %H:%M} purgados")
+        return borrados
+    except mysql.connector.Error as e:
+        logger.error(f"Error al purgar cambios: {e}")
+        if conn:
+            conn.rollback()
+        return None
+    finally:
+        if cursor:
+            cursor.close()
+        if conn:
+            conn.close()
@@ -0,0 +1,338 @@
+from bisect import bisect_left, bisect_right
+from decimal import Decimal
+from itertools import accumulate
+import logging
+import re
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class IntervalosHabitacion:
+    """Reservas confirmadas de una habitación ordenadas por fecha de entrada"""
+
+    __slots__ = ('entradas', 'salidas', 'ids', '_max_salida')
+
+    def __init__(self):
+        self.entradas = []
+        self.salidas = []
+        self.ids = []
+        # Máximo acumulado de salidas; se recalcula sólo cuando hace falta
+        self._max_salida = None
+
+    def __len__(self):
+        return len(self.ids)
+
+    def agregar(self, id_reserva, fecha_entrada, fecha_salida):
+        pos = bisect_right(self.entradas, fecha_entrada)
+        self.entradas.insert(pos, fecha_entrada)
+        self.salidas.insert(pos, fecha_salida)
+        self.ids.insert(pos, id_reserva)
+        self._max_salida = None
+
+    def quitar(self, id_reserva):
+        try:
+            pos = self.ids.index(id_reserva)
+        except ValueError:
+            return None
+        intervalo = (self.entradas.pop(pos), self.salidas.pop(pos))
+        self.ids.pop(pos)
+        self._max_salida = None
+        return intervalo
+
+    def hay_conflicto(self, fecha_entrada, fecha_salida):
+        """True si alguna reserva se solapa con [fecha_entrada, fecha_salida)"""
+        # Sólo pueden solaparse las reservas que entran antes de fecha_salida
+        k = bisect_left(self.entradas, fecha_salida)
+        if k == 0:
+            return False
+        if self._max_salida is None:
+            self._max_salida = list(accumulate(self.salidas, max))
+        return self._max_salida[k - 1] > fecha_entrada
+
+    def hay_entrada_entre(self, desde, hasta):
+        """True si alguna reserva entra en el rango (desde, hasta]"""
+        return bisect_right(self.entradas, hasta) > bisect_right(self.entradas, desde)
+
+    def intervalos(self):
+        return list(zip(self.ids, self.entradas, self.salidas))
+
+    def tramos_libres(self, primera_entrada, ultima_entrada, duracion, paso):
+        """Tramos (k_inicial, k_final) de entradas primera_entrada + k*paso en las que cabe una
+        estadía de `duracion` sin solaparse con ninguna reserva.
+
+        Recorre una sola vez las reservas que tocan la ventana: cada hueco entre reservas
+        (fusionando las que se pisan) aporta un tramo contiguo de entradas posibles.
+        """
+        ultimo = (ultima_entrada - primera_entrada) // paso
+        fin_ventana = ultima_entrada + duracion
+        if self._max_salida is None:
+            self._max_salida = list(accumulate(self.salidas, max))
+        # Las reservas anteriores a este punto terminan antes de la ventana
+        desde = bisect_right(self._max_salida, primera_entrada)
+        hasta = bisect_left(self.entradas, fin_ventana)
+        tramos = []
+
+        def agregar(inicio_hueco, fin_hueco):
+            k_inicial = max(0, -((primera_entrada - inicio_hueco) // paso))
+            k_final = min(ultimo, (fin_hueco - duracion - primera_entrada) // paso)
+            if k_inicial <= k_final:
+                tramos.append((k_inicial, k_final))
+
+        libre_desde = primera_entrada
+        for entrada, salida in zip(self.entradas[desde:hasta], self.salidas[desde:hasta]):
+            if entrada > libre_desde:
+                agregar(libre_desde, entrada)
+            libre_desde = max(libre_desde, salida)
+        if libre_desde < fin_ventana:
+            agregar(libre_desde, fin_ventana)
+        return tramos
+
+
+class IndiceDisponibilidad:
+    """Índice en memoria de habitaciones y reservas confirmadas para búsquedas de disponibilidad"""
+
+    def __init__(self, ttl=0):
+        self.ttl = ttl
+        self._lock = threading.RLock()
+        self._habitaciones = {}
+        self._intervalos = {}
+        self._reserva_habitacion = {}
+        self._cargado_en = None
+
+    @property
+    def cargado(self):
+        if self._cargado_en is None:
+            return False
+        return not self.ttl or time.monotonic() - self._cargado_en < self.ttl
+
+    @property
+    def vence_en(self):
+        """Segundos hasta que vence la carga actual; None si no está cargado o no tiene TTL"""
+        if self._cargado_en is None or not self.ttl:
+            return None
+        return self._cargado_en + self.ttl - time.monotonic()
+
+    def reconstruir(self, habitaciones, reservas, vigente=None):
+        """Reemplaza el contenido del índice con filas de habitaciones y reservas confirmadas.
+
+        `vigente` se llama con el lock tomado justo antes del reemplazo: si devuelve False las filas
+        quedaron viejas (hubo escrituras mientras se leían), se descartan y se devuelve False.
+        """
+        nuevas_habitaciones = {h['id']: dict(h) for h in habitaciones}
+        nuevos_intervalos = {id_hab: IntervalosHabitacion() for id_hab in nuevas_habitaciones}
+        reserva_habitacion = {}
+        for r in sorted(reservas, key=lambda r: r['fecha_entrada']):
+            intervalos = nuevos_intervalos.setdefault(r['id_habitacion'], IntervalosHabitacion())
+            # Carga ordenada: append directo sin búsqueda binaria
+            intervalos.entradas.append(r['fecha_entrada'])
+            intervalos.salidas.append(r['fecha_salida'])
+            intervalos.ids.append(r['id'])
+            reserva_habitacion[r['id']] = r['id_habitacion']
+        with self._lock:
+            if vigente is not None and not vigente():
+                return False
+            self._habitaciones = nuevas_habitaciones
+            self._intervalos = nuevos_intervalos
+            self._reserva_habitacion = reserva_habitacion
+            self._cargado_en = time.monotonic()
+        logger.info(f"Índice de disponibilidad cargado: {len(nuevas_habitaciones)} habitaciones, {len(reserva_habitacion)} reservas")
+        return True
+
+    def invalidar(self):
+        with self._lock:
+            self._cargado_en = None
+
+    def actualizar_habitacion(self, id_habitacion, **campos):
+        with self._lock:
+            habitacion = self._habitaciones.get(int(id_habitacion))
+            if habitacion is None:
+                # Habitación desconocida: el índice quedó desactualizado
+                self._cargado_en = None
+                return
+            habitacion.update(campos)
+
+    def registrar_reserva(self, id_reserva, id_habitacion, fecha_entrada, fecha_salida):
+        with self._lock:
+            id_habitacion = int(id_habitacion)
+            self._intervalos.setdefault(id_habitacion, IntervalosHabitacion()).agregar(
+                id_reserva, fecha_entrada, fecha_salida)
+            self._reserva_habitacion[id_reserva] = id_habitacion
+
+    def quitar_reserva(self, id_reserva):
+        """Quita una reserva que dejó de estar confirmada"""
+        with self._lock:
+            id_habitacion = self._reserva_habitacion.pop(id_reserva, None)
+            if id_habitacion is not None:
+                self._intervalos[id_habitacion].quitar(id_reserva)
+
+    def extender_reserva(self, id_reserva, nueva_fecha_salida):
+        with self._lock:
+            id_habitacion = self._reserva_habitacion.get(id_reserva)
+            if id_habitacion is None:
+                return
+            intervalos = self._intervalos[id_habitacion]
+            fecha_entrada, _ = intervalos.quitar(id_reserva)
+            intervalos.agregar(id_reserva, fecha_entrada, nueva_fecha_salida)
+
+    def habitacion(self, id_habitacion):
+        with self._lock:
+            habitacion = self._habitaciones.get(int(id_habitacion))
+            return dict(habitacion) if habitacion else None
+
+    def hay_conflicto(self, id_habitacion, fecha_entrada, fecha_salida):
+        with self._lock:
+            intervalos = self._intervalos.get(int(id_habitacion))
+            return bool(intervalos) and intervalos.hay_conflicto(fecha_entrada, fecha_salida)
+
+    def conflicto_extension(self, id_reserva, nueva_fecha_salida):
+        """True si otra reserva de la misma habitación entra antes de la nueva salida"""
+        with self._lock:
+            id_habitacion = self._reserva_habitacion.get(id_reserva)
+            if id_habitacion is None:
+                return False
+            intervalos = self._intervalos[id_habitacion]
+            pos = intervalos.ids.index(id_reserva)
+            return intervalos.hay_entrada_entre(intervalos.salidas[pos], nueva_fecha_salida)
+
+    def disponibles(self, fecha_entrada, fecha_salida):
+        """Habitaciones fuera de mantenimiento sin reservas solapadas, ordenadas por número"""
+        with self._lock:
+            libres = [
+                dict(h) for id_hab, h in self._habitaciones.items()
+                if h.get('estado') != 'mantenimiento'
+                and not self._intervalos[id_hab].hay_conflicto(fecha_entrada, fecha_salida)
+            ]
+        libres.sort(key=lambda h: h['numero_habitacion'])
+        return libres
+
+    def estadias_libres(self, primera_entrada, ultima_entrada, duracion, paso, tipo=None):
+        """Por cada habitación fuera de mantenimiento (y del tipo dado), los tramos de entradas posibles; omite las que no tienen"""
+        with self._lock:
+            resultado = []
+            for id_hab, h in self._habitaciones.items():
+                if h.get('estado') == 'mantenimiento' or (tipo and h.get('tipo') != tipo):
+                    continue
+                tramos = self._intervalos[id_hab].tramos_libres(primera_entrada, ultima_entrada, duracion, paso)
+                if tramos:
+                    resultado.append((dict(h), tramos))
+        return resultado
+
+    def comparar(self, habitaciones, reservas):
+        """Diferencias entre el índice y las filas actuales de la base de datos"""
+        diferencias = []
+        with self._lock:
+            esperadas = {r['id']: (r['id_habitacion'], r['fecha_entrada'], r['fecha_salida']) for r in reservas}
+            actuales = {}
+            for id_hab, intervalos in self._intervalos.items():
+                for id_reserva, entrada, salida in intervalos.intervalos():
+                    actuales[id_reserva] = (id_hab, entrada, salida)
+            for id_reserva in esperadas.keys() - actuales.keys():
+                diferencias.append(f"Reserva {id_reserva} falta en el índice")
+            for id_reserva in actuales.keys() - esperadas.keys():
+                diferencias.append(f"Reserva {id_reserva} sobra en el índice")
+            for id_reserva in esperadas.keys() & actuales.keys():
+                if esperadas[id_reserva] != actuales[id_reserva]:
+                    diferencias.append(f"Reserva {id_reserva} difiere: índice {actuales[id_reserva]}, base {esperadas[id_reserva]}")
+            for h in habitaciones:
+                indexada = self._habitaciones.get(h['id'])
+                if indexada is None:
+                    diferencias.append(f"Habitación {h['id']} falta en el índice")
+                elif indexada.get('estado') != h['estado']:
+                    diferencias.append(f"Habitación {h['id']} con estado {indexada.get('estado')} en el índice y {h['estado']} en la base")
+            for id_hab in self._habitaciones.keys() - {h['id'] for h in habitaciones}:
+                diferencias.append(f"Habitación {id_hab} sobra en el índice")
+        return diferencias
+
+
+_REQUISITO = re.compile(r"(\d+)\s*x?\s*([a-záéíóúñ]+)", re.I)
+
+
+def parsear_requisito(texto, tipos):
+    """Convierte "3 dobles + 2 suites" en {'doble': 3, 'suite': 2} usando los tipos conocidos"""
+    requisito = {}
+    conocidos = {t.lower(): t for t in tipos}
+    for cantidad, palabra in _REQUISITO.findall(texto or ''):
+        palabra = palabra.lower()
+        # Plural en -s o -es: "dobles" -> "doble", "simples" -> "simple"
+        tipo = conocidos.get(palabra) or conocidos.get(palabra[:-1]) or conocidos.get(palabra[:-2])
+        if tipo is None:
+            raise ValueError(f"Tipo de habitación desconocido: {palabra}")
+        requisito[tipo] = requisito.get(tipo, 0) + int(cantidad)
+    if not requisito or not all(n > 0 for n in requisito.values()):
+        raise ValueError("Indique cantidades y tipos, p. ej. '3 dobles + 2 suites'")
+    return requisito
+
+
+def piso(habitacion):
+    """Piso según el número de habitación (101 -> '1', 1204 -> '12')"""
+    numero = str(habitacion['numero_habitacion'])
+    return numero[:-2] if len(numero) > 2 and numero.isdigit() else '0'
+
+
+def _bits(mascara):
+    """Posiciones de los bits encendidos, de menor a mayor"""
+    posiciones = []
+    while mascara:
+        bajo = mascara & -mascara
+        posiciones.append(bajo.bit_length() - 1)
+        mascara ^= bajo
+    return posiciones
+
+
+def buscar_grupo(libres, requisito, precio_max=None, maximo_conjuntos=3):
+    """Conjuntos de habitaciones libres que cubren `requisito` ({tipo: cantidad}).
+
+    `libres` son las habitaciones disponibles para el rango pedido. Se arman máscaras de bits
+    por tipo, por piso y por precio sobre las habitaciones ordenadas por precio; cada
+    combinación se resuelve con AND de máscaras y conteo de bits. Devuelve el conjunto más
+    económico y, si existen, conjuntos que entran completos en un mismo piso.
+    """
+    libres = sorted(libres, key=lambda h: (Decimal(str(h['precio_por_noche'])), str(h['numero_habitacion'])))
+    por_tipo = {}
+    por_piso = {}
+    dentro_precio = 0
+    for i, h in enumerate(libres):
+        bit = 1 << i
+        por_tipo[h['tipo']] = por_tipo.get(h['tipo'], 0) | bit
+        por_piso[piso(h)] = por_piso.get(piso(h), 0) | bit
+        if precio_max is None or Decimal(str(h['precio_por_noche'])) <= precio_max:
+            dentro_precio |= bit
+
+    candidatos = {tipo: por_tipo.get(tipo, 0) & dentro_precio for tipo in requisito}
+    disponibles = {tipo: bin(mascara).count('1') for tipo, mascara in candidatos.items()}
+    faltantes = {tipo: n - disponibles[tipo] for tipo, n in requisito.items() if disponibles[tipo] < n}
+
+    def conjunto(criterio, restriccion):
+        elegidas = []
+        for tipo, n in requisito.items():
+            # Los bits bajos son las habitaciones más baratas del tipo
+            elegidas.extend(_bits(candidatos[tipo] & restriccion)[:n])
+        habitaciones = [libres[i] for i in sorted(elegidas)]
+        return {
+            'criterio': criterio,
+            'habitaciones': habitaciones,
+            'precio_por_noche_total': sum(Decimal(str(h['precio_por_noche'])) for h in habitaciones),
+        }
+
+    conjuntos = []
+    if not faltantes:
+        conjuntos.append(conjunto('mas_economico', -1))
+        mismo_piso = [
+            conjunto(f"piso {nombre}", mascara) for nombre, mascara in por_piso.items()
+            if all(bin(candidatos[tipo] & mascara).count('1') >= n for tipo, n in requisito.items())
+        ]
+        mismo_piso.sort(key=lambda c: c['precio_por_noche_total'])
+        for candidato in mismo_piso:
+            if len(conjuntos) >= maximo_conjuntos:
+                break
+            if [h['id'] for h in candidato['habitaciones']] != [h['id'] for h in conjuntos[0]['habitaciones']]:
+                conjuntos.append(candidato)
+    return {
+        'factible': not faltantes,
+        'requisito': requisito,
+        'disponibles': disponibles,
+        'faltantes': faltantes,
+        'conjuntos': conjuntos,
+    }
@@ -0,0 +1,75 @@
+from datetime import date, datetime
+import csv
+import io
+import json
+import logging
+import zlib
+
+import database
+
+logger = logging.getLogger(__name__)
+
+FORMATOS = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson; charset=utf-8',
+}
+# Filas por bloque de texto que se entrega al servidor
+FILAS_POR_BLOQUE = 500
+
+
+def _valor_json(valor):
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    return str(valor)
+
+
+def _bloques_csv(columnas, filas):
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    escritor.writerow(columnas)
+    for n, fila in enumerate(filas, 1):
+        escritor.writerow(fila)
+        if n % FILAS_POR_BLOQUE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+_CODIFICADOR = json.JSONEncoder(default=_valor_json, ensure_ascii=False)
+
+
+def _bloques_jsonl(columnas, filas):
+    lineas = []
+    for fila in filas:
+        lineas.append(_CODIFICADOR.encode(dict(zip(columnas, fila))))
+        if len(lineas) >= FILAS_POR_BLOQUE:
+            yield '\n'.join(lineas) + '\n'
+            lineas = []
+    if lineas:
+        yield '\n'.join(lineas) + '\n'
+
+
+def _comprimir(bloques):
+    """Comprime en gzip a medida que llegan los bloques, sin acumular la salida"""
+    compresor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for bloque in bloques:
+        datos = compresor.compress(bloque)
+        if datos:
+            yield datos
+    yield compresor.flush()
+
+
+def exportar(nombre, formato='csv', filtros=None, gzip=False):
+    """Generador de bytes con la exportación `nombre` en CSV o JSON-lines, opcionalmente en gzip.
+
+    La consulta se ejecuta al crearlo, así los errores de base de datos o de parámetros
+    aparecen antes de empezar a responder; las filas se leen después, lote por lote.
+    """
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato de exportación desconocido: {formato}")
+    filas = database.exportar_filas(nombre, filtros)
+    columnas = next(filas)
+    bloques = _bloques_csv(columnas, filas) if formato == 'csv' else _bloques_jsonl(columnas, filas)
+    bloques = (bloque.encode('utf-8') for bloque in bloques)
+    return _comprimir(bloques) if gzip else bloques
@@ -0,0 +1,181 @@
+from datetime import datetime
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+import csv
+import io
+import json
+import logging
+
+import database
+from disponibilidad import IntervalosHabitacion
+
+logger = logging.getLogger(__name__)
+
+CENTAVOS = Decimal('0.01')
+PORCENTAJE_ANTICIPO_DEFECTO = Decimal('30')
+
+
+def leer_filas(contenido, formato='csv'):
+    """Convierte el contenido de un archivo CSV, JSON o JSON-lines en una lista de diccionarios"""
+    if isinstance(contenido, bytes):
+        contenido = contenido.decode('utf-8-sig')
+    if formato == 'csv':
+        return [dict(fila) for fila in csv.DictReader(io.StringIO(contenido))]
+    if formato == 'json':
+        texto = contenido.strip()
+        if texto.startswith('['):
+            return json.loads(texto)
+        return [json.loads(linea) for linea in texto.splitlines() if linea.strip()]
+    raise ValueError(f"Formato de importación desconocido: {formato}")
+
+
+def _texto(fila, campo):
+    valor = fila.get(campo)
+    return str(valor).strip() if valor is not None else ''
+
+
+def _validar_fila(numero, fila, habitaciones_por_numero, habitaciones_por_id, tabla):
+    """Normaliza una fila; devuelve (cliente, reserva o None) o lanza ValueError con el motivo"""
+    if not isinstance(fila, dict):
+        raise ValueError("La fila debe ser un objeto con los campos por nombre")
+    dni = _texto(fila, 'dni_pasaporte_cpf') or _texto(fila, 'dni')
+    nombre = _texto(fila, 'nombre')
+    apellido = _texto(fila, 'apellido')
+    if not dni or not nombre or not apellido:
+        raise ValueError("Nombre, apellido y DNI son obligatorios")
+    cliente = {
+        'dni': dni,
+        'nombre': nombre,
+        'apellido': apellido,
+        'telefono': _texto(fila, 'telefono'),
+        'email': _texto(fila, 'email'),
+        'direccion': _texto(fila, 'direccion'),
+    }
+
+    numero_habitacion = _texto(fila, 'numero_habitacion')
+    id_habitacion = _texto(fila, 'id_habitacion')
+    fecha_entrada = _texto(fila, 'fecha_entrada')
+    fecha_salida = _texto(fila, 'fecha_salida')
+    if not (numero_habitacion or id_habitacion or fecha_entrada or fecha_salida):
+        return cliente, None
+
+    if numero_habitacion:
+        habitacion = habitaciones_por_numero.get(numero_habitacion)
+    else:
+        habitacion = habitaciones_por_id.get(int(id_habitacion)) if id_habitacion.isdigit() else None
+    if not habitacion:
+        raise ValueError(f"Habitación {numero_habitacion or id_habitacion} no existe")
+    if habitacion['estado'] == 'mantenimiento':
+        raise ValueError(f"Habitación {habitacion['numero_habitacion']} no está disponible ({habitacion['estado']})")
+    try:
+        entrada = datetime.fromisoformat(fecha_entrada)
+        salida = datetime.fromisoformat(fecha_salida)
+    except ValueError:
+        raise ValueError("Fechas inválidas, use AAAA-MM-DD HH:MM")
+    if salida <= entrada:
+        raise ValueError("La fecha de salida debe ser posterior a la de entrada")
+    try:
+        porcentaje = Decimal(_texto(fila, 'porcentaje_anticipo') or PORCENTAJE_ANTICIPO_DEFECTO)
+    except InvalidOperation:
+        raise ValueError("Porcentaje de anticipo inválido")
+    if not porcentaje.is_finite():
+        raise ValueError("Porcentaje de anticipo inválido")
+    if not 0 <= porcentaje <= 100:
+        raise ValueError("El porcentaje de anticipo debe estar entre 0 y 100")
+
+    # Mismo cálculo que la cotización de la búsqueda y las reservas del formulario
+    monto_total = tabla.cotizar(habitacion['tipo'], habitacion['precio_por_noche'], entrada,
+                                database.calcular_dias(entrada, salida))['monto_total']
+    monto_anticipo = (monto_total * porcentaje / 100).quantize(CENTAVOS, ROUND_HALF_UP)
+    reserva = {
+        'fila': numero,
+        'dni': dni,
+        'id_habitacion': habitacion['id'],
+        'numero_habitacion': habitacion['numero_habitacion'],
+        'fecha_entrada': entrada,
+        'fecha_salida': salida,
+        'monto_total': monto_total,
+        'porcentaje_anticipo': porcentaje,
+        'monto_anticipo': monto_anticipo,
+        'monto_restante': monto_total - monto_anticipo,
+    }
+    return cliente, reserva
+
+
+def importar(filas, lote=500):
+    """Importa clientes y reservas en bloque; devuelve el resultado por fila y un resumen"""
+    resultados = [None] * len(filas)
+    habitaciones = database.listar_habitaciones_basico()
+    por_numero = {str(h['numero_habitacion']): h for h in habitaciones}
+    por_id = {h['id']: h for h in habitaciones}
+    tabla = database.tabla_tarifas()
+
+    # 1. Validación en memoria
+    clientes = {}
+    reservas = []
+    for i, fila in enumerate(filas):
+        try:
+            cliente, reserva = _validar_fila(i + 1, fila, por_numero, por_id, tabla)
+        except (ValueError, TypeError) as e:
+            resultados[i] = {'fila': i + 1, 'estado': 'error', 'mensaje': str(e)}
+            continue
+        clientes[cliente['dni']] = cliente
+        if reserva:
+            reservas.append(reserva)
+        else:
+            resultados[i] = {'fila': i + 1, 'estado': 'cliente', 'mensaje': "Cliente importado sin reserva"}
+
+    # 2. Conflictos contra la base y dentro del propio lote en una pasada por habitación
+    aceptadas = []
+    if reservas:
+        existentes = database.reservas_confirmadas_en_rango(
+            [r['id_habitacion'] for r in reservas],
+            min(r['fecha_entrada'] for r in reservas),
+            max(r['fecha_salida'] for r in reservas))
+        if existentes is None:
+            raise RuntimeError("No se pudieron consultar las reservas existentes")
+        ocupacion = {}
+        for id_habitacion, filas_existentes in existentes.items():
+            intervalos = ocupacion[id_habitacion] = IntervalosHabitacion()
+            for r in filas_existentes:
+                intervalos.agregar(r['id'], r['fecha_entrada'], r['fecha_salida'])
+        for reserva in reservas:
+            intervalos = ocupacion.setdefault(reserva['id_habitacion'], IntervalosHabitacion())
+            if intervalos.hay_conflicto(reserva['fecha_entrada'], reserva['fecha_salida']):
+                resultados[reserva['fila'] - 1] = {
+                    'fila': reserva['fila'], 'estado': 'conflicto',
+                    'mensaje': f"Habitación {reserva['numero_habitacion']} ocupada entre {reserva['fecha_entrada']} y {reserva['fecha_salida']}"}
+                continue
+            intervalos.agregar(('fila', reserva['fila']), reserva['fecha_entrada'], reserva['fecha_salida'])
+            aceptadas.append(reserva)
+
+    # 3. Clientes con executemany (sólo los de filas válidas)
+    ids_clientes = {}
+    if clientes:
+        ids_clientes = database.upsert_clientes(list(clientes.values()))
+        if ids_clientes is None:
+            raise RuntimeError("No se pudieron guardar los clientes")
+
+    # 4. Reservas y anticipos en transacciones por bloque
+    for inicio in range(0, len(aceptadas), lote):
+        bloque = aceptadas[inicio:inicio + lote]
+        for reserva in bloque:
+            reserva['id_cliente'] = ids_clientes[reserva['dni']]
+        # La transacción bloquea las habitaciones y repite la verificación: una reserva cargada
+        # por otra vía desde el paso 2 deja la fila en conflicto en lugar de duplicarla
+        ids = database.insertar_reservas_con_anticipos(bloque)
+        for j, reserva in enumerate(bloque):
+            if ids is None:
+                resultado = {'fila': reserva['fila'], 'estado': 'error', 'mensaje': "Error al guardar el bloque de reservas"}
+            elif ids[j] is None:
+                resultado = {'fila': reserva['fila'], 'estado': 'conflicto',
+                             'mensaje': f"Habitación {reserva['numero_habitacion']} reservada durante la importación entre {reserva['fecha_entrada']} y {reserva['fecha_salida']}"}
+            else:
+                resultado = {'fila': reserva['fila'], 'estado': 'importada', 'id_reserva': ids[j],
+                             'mensaje': f"Reserva {ids[j]} en habitación {reserva['numero_habitacion']}"}
+            resultados[reserva['fila'] - 1] = resultado
+
+    resumen = {}
+    for resultado in resultados:
+        resumen[resultado['estado']] = resumen.get(resultado['estado'], 0) + 1
+    logger.info(f"Importación terminada: {resumen}")
+    return {'resultados': resultados, 'resumen': resumen}
@@ -0,0 +1,317 @@
+from collections import deque
+import contextvars
+import logging
+import os
+import re
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+logger_lentas = logging.getLogger('consultas_lentas')
+
+# Consultas más lentas que este umbral se registran en el log de consultas lentas
+UMBRAL_LENTA_MS = float(os.environ.get('DB_CONSULTA_LENTA_MS', 200))
+# Ventana (segundos) que cubren los histogramas de /admin/metrics
+VENTANA = float(os.environ.get('METRICAS_VENTANA', 300))
+INSTRUMENTAR = os.environ.get('DB_INSTRUMENTAR', '1') != '0'
+
+LIMITES_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+MAX_CONSULTAS_POR_PETICION = 50
+
+_peticion = contextvars.ContextVar('metricas_peticion', default=None)
+# Función que lanzó la tarea en curso de database.ejecutar_en_paralelo
+_origen = contextvars.ContextVar('metricas_origen', default=None)
+_modulo = __name__
+
+
+class HistogramaRodante:
+    """Histograma de duraciones que cubre los últimos `ventana` segundos en `segmentos` tramos"""
+
+    def __init__(self, ventana=VENTANA, segmentos=10, limites=LIMITES_MS):
+        self.limites = limites
+        self.duracion_segmento = ventana / segmentos
+        self._lock = threading.Lock()
+        # Cada tramo: [número de tramo, cuentas por cubeta, cantidad, total_ms, max_ms]
+        self._segmentos = deque(maxlen=segmentos)
+
+    def _tramo_actual(self, ahora):
+        numero = int(ahora // self.duracion_segmento)
+        if not self._segmentos or self._segmentos[-1][0] != numero:
+            self._segmentos.append([numero, [0] * (len(self.limites) + 1), 0, 0.0, 0.0])
+        return self._segmentos[-1]
+
+    def observar(self, ms):
+        cubeta = len(self.limites)
+        for i, limite in enumerate(self.limites):
+            if ms <= limite:
+                cubeta = i
+                break
+        with self._lock:
+            tramo = self._tramo_actual(time.monotonic())
+            tramo[1][cubeta] += 1
+            tramo[2] += 1
+            tramo[3] += ms
+            tramo[4] = max(tramo[4], ms)
+
+    def resumen(self):
+        """Cantidad, total, máximo, percentiles aproximados y cuentas por cubeta en la ventana"""
+        minimo = int(time.monotonic() // self.duracion_segmento) - self._segmentos.maxlen + 1
+        cuentas = [0] * (len(self.limites) + 1)
+        cantidad = 0
+        total = 0.0
+        maximo = 0.0
+        with self._lock:
+            for numero, cubetas, n, suma, mayor in self._segmentos:
+                if numero < minimo:
+                    continue
+                cuentas = [a + b for a, b in zip(cuentas, cubetas)]
+                cantidad += n
+                total += suma
+                maximo = max(maximo, mayor)
+        resultado = {
+            'cantidad': cantidad,
+            'total_ms': round(total, 3),
+            'promedio_ms': round(total / cantidad, 3) if cantidad else 0.0,
+            'max_ms': round(maximo, 3),
+        }
+        for nombre, q in (('p50_ms', 0.50), ('p95_ms', 0.95), ('p99_ms', 0.99)):
+            resultado[nombre] = self._percentil(cuentas, cantidad, q, maximo)
+        # Lista de [límite superior en ms, cantidad] para conservar el orden en JSON
+        resultado['cubetas'] = [[limite, n] for limite, n in zip(self.limites, cuentas)] + [['+inf', cuentas[-1]]]
+        return resultado
+
+    def _percentil(self, cuentas, cantidad, q, maximo):
+        # Límite superior de la cubeta que contiene el percentil, acotado por el máximo visto
+        if not cantidad:
+            return 0.0
+        objetivo = q * cantidad
+        acumulado = 0
+        for limite, n in zip(self.limites + (maximo,), cuentas):
+            acumulado += n
+            if acumulado >= objetivo:
+                return round(min(limite, maximo), 3)
+        return round(maximo, 3)
+
+
+class Peticion:
+    """Consultas ejecutadas durante una petición Flask"""
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        # Las tareas de database.ejecutar_en_paralelo agregan consultas desde otros hilos
+        self._lock = threading.Lock()
+        self.cantidad = 0
+        self.duracion_ms = 0.0
+        self.filas = 0
+        self.por_funcion = {}
+        self.consultas = []
+
+    def agregar(self, consulta):
+        with self._lock:
+            self.cantidad += 1
+            self.duracion_ms += consulta['duracion_ms']
+            self.filas += consulta['filas']
+            acumulado = self.por_funcion.setdefault(consulta['funcion'], [0, 0.0])
+            acumulado[0] += 1
+            acumulado[1] += consulta['duracion_ms']
+            if len(self.consultas) < MAX_CONSULTAS_POR_PETICION:
+                self.consultas.append(consulta)
+
+    def server_timing(self, total_ms):
+        return (f'db;dur={self.duracion_ms:.1f};desc="{self.cantidad} consultas", '
+                f'app;dur={max(total_ms - self.duracion_ms, 0.0):.1f}, total;dur={total_ms:.1f}')
+
+    def funciones_mas_lentas(self, cantidad=3):
+        orden = sorted(self.por_funcion.items(), key=lambda par: par[1][1], reverse=True)
+        return [{'funcion': f, 'consultas': n, 'ms': round(ms, 2)} for f, (n, ms) in orden[:cantidad]]
+
+
+# Histogramas por consulta normalizada y por ruta, y últimas consultas lentas
+_histogramas_consultas = {}
+_histogramas_rutas = {}
+_lentas = deque(maxlen=100)
+_registro_lock = threading.Lock()
+
+
+def _histograma(tabla, clave):
+    histograma = tabla.get(clave)
+    if histograma is None:
+        with _registro_lock:
+            histograma = tabla.setdefault(clave, HistogramaRodante())
+    return histograma
+
+
+_ESPACIOS = re.compile(r"\s+")
+_LISTA_PARAMETROS = re.compile(r"%s(?:\s*,\s*%s)+")
+
+
+def normalizar_sql(sql):
+    """Texto de la consulta en una línea; las listas IN de largo variable cuentan como una sola"""
+    if isinstance(sql, bytes):
+        sql = sql.decode('utf-8', 'replace')
+    return _LISTA_PARAMETROS.sub("%s, ...", _ESPACIOS.sub(" ", sql).strip())
+
+
+def forma_parametros(params, muchos=False):
+    """Tipos de los parámetros sin sus valores, p. ej. (int, datetime) o 500x(str, str)"""
+    if muchos:
+        filas = list(params or ())
+        return f"{len(filas)}x{forma_parametros(filas[0])}" if filas else "0x()"
+    if not params:
+        return "()"
+    if isinstance(params, dict):
+        return "{" + ", ".join(f"{k}: {type(v).__name__}" for k, v in params.items()) + "}"
+    return "(" + ", ".join(type(p).__name__ for p in params) + ")"
+
+
+def _funcion_llamadora():
+    """Primera función pública fuera de este módulo en la pila (los helpers _x se saltean)"""
+    frame = sys._getframe(2)
+    primera = None
+    while frame is not None:
+        modulo = frame.f_globals.get('__name__')
+        if modulo == 'concurrent.futures.thread':
+            # Hilo del ejecutor paralelo: la función pública es la que lanzó la tarea
+            return _origen.get() or primera or '?'
+        if modulo != _modulo:
+            nombre = f"{modulo}.{frame.f_code.co_name}"
+            primera = primera or nombre
+            if not frame.f_code.co_name.startswith(('_', '<')):
+                return nombre
+        frame = frame.f_back
+    return primera or '?'
+
+
+def marcar_origen(nombre):
+    _origen.set(nombre)
+
+
+def registrar_consulta(consulta):
+    """Agrega una consulta terminada a la petición en curso, a su histograma y al log de lentas"""
+    peticion = _peticion.get()
+    if peticion is not None:
+        peticion.agregar(consulta)
+    _histograma(_histogramas_consultas, consulta['sql']).observar(consulta['duracion_ms'])
+    if consulta['duracion_ms'] >= UMBRAL_LENTA_MS:
+        _lentas.append(dict(consulta, momento=time.strftime("%Y-%m-%d %H:%M:%S")))
+        logger_lentas.warning(f"{consulta['duracion_ms']:.1f} ms en {consulta['funcion']} "
+                              f"({consulta['filas']} filas, parámetros {consulta['parametros']}): {consulta['sql']}")
+
+
+class CursorInstrumentado:
+    """Cursor que mide cada sentencia, incluido el tiempo de leer sus filas"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self._consulta = None
+
+    def __getattr__(self, nombre):
+        return getattr(self._cursor, nombre)
+
+    def _iniciar(self, sql, forma):
+        self._terminar()
+        self._consulta = {'sql': normalizar_sql(sql), 'parametros': forma, 'funcion': _funcion_llamadora(),
+                          'duracion_ms': 0.0, 'filas': 0}
+
+    def _medir(self, operacion, *args):
+        inicio = time.perf_counter()
+        try:
+            return operacion(*args)
+        finally:
+            if self._consulta is not None:
+                self._consulta['duracion_ms'] += (time.perf_counter() - inicio) * 1000
+
+    def _terminar(self):
+        consulta, self._consulta = self._consulta, None
+        if consulta is None:
+            return
+        if not consulta['filas'] and consulta['sql'][:6].upper() in ('INSERT', 'UPDATE', 'DELETE'):
+            consulta['filas'] = max(getattr(self._cursor, 'rowcount', 0) or 0, 0)
+        consulta['duracion_ms'] = round(consulta['duracion_ms'], 3)
+        registrar_consulta(consulta)
+
+    def execute(self, sql, params=None, *args, **kwargs):
+        self._iniciar(sql, forma_parametros(params))
+        return self._medir(lambda: self._cursor.execute(sql, params, *args, **kwargs))
+
+    def executemany(self, sql, secuencia, *args, **kwargs):
+        secuencia = list(secuencia)
+        self._iniciar(sql, forma_parametros(secuencia, muchos=True))
+        return self._medir(lambda: self._cursor.executemany(sql, secuencia, *args, **kwargs))
+
+    def fetchone(self):
+        fila = self._medir(self._cursor.fetchone)
+        if fila is not None and self._consulta is not None:
+            self._consulta['filas'] += 1
+        return fila
+
+    def fetchmany(self, size=1):
+        filas = self._medir(self._cursor.fetchmany, size)
+        if self._consulta is not None:
+            self._consulta['filas'] += len(filas)
+        return filas
+
+    def fetchall(self):
+        filas = self._medir(self._cursor.fetchall)
+        if self._consulta is not None:
+            self._consulta['filas'] += len(filas)
+        return filas
+
+    def __iter__(self):
+        while True:
+            fila = self.fetchone()
+            if fila is None:
+                return
+            yield fila
+
+    def close(self):
+        self._terminar()
+        return self._cursor.close()
+
+
+def instrumentar_cursor(cursor):
+    """Envoltorio que usa el pool para los cursores que crea database.py"""
+    return CursorInstrumentado(cursor) if INSTRUMENTAR else cursor
+
+
+def iniciar_peticion():
+    peticion = Peticion()
+    _peticion.set(peticion)
+    return peticion
+
+
+def terminar_peticion(ruta, estado):
+    """Cierra la petición en curso, la suma al histograma de su ruta y la devuelve con su duración"""
+    peticion = _peticion.get()
+    _peticion.set(None)
+    if peticion is None:
+        return None, 0.0
+    total_ms = (time.perf_counter() - peticion.inicio) * 1000
+    _histograma(_histogramas_rutas, ruta).observar(total_ms)
+    if estado >= 500:
+        _histograma(_histogramas_rutas, f"{ruta} [{estado}]").observar(total_ms)
+    return peticion, total_ms
+
+
+def resumen():
+    """Histogramas por consulta y por ruta de la ventana actual, y las últimas consultas lentas"""
+    with _registro_lock:
+        consultas = list(_histogramas_consultas.items())
+        rutas = list(_histogramas_rutas.items())
+    consultas = sorted(((sql, h.resumen()) for sql, h in consultas), key=lambda par: par[1]['total_ms'], reverse=True)
+    rutas = sorted(((ruta, h.resumen()) for ruta, h in rutas), key=lambda par: par[1]['total_ms'], reverse=True)
+    return {
+        'ventana_s': VENTANA,
+        'umbral_lenta_ms': UMBRAL_LENTA_MS,
+        'rutas': [dict(datos, ruta=ruta) for ruta, datos in rutas if datos['cantidad']],
+        'consultas': [dict(datos, sql=sql) for sql, datos in consultas if datos['cantidad']],
+        'lentas': list(_lentas)[::-1],
+    }
+
+
+def reiniciar():
+    with _registro_lock:
+        _histogramas_consultas.clear()
+        _histogramas_rutas.clear()
+        _lentas.clear()
@@ -0,0 +1,488 @@
+import mysql.connector
+import ast
+import logging
+import os
+import re
+
+import database
+
+logger = logging.getLogger(__name__)
+
+# Cada paso es idempotente: ('sql', sentencia), ('indice', tabla, nombre, columnas, unico)
+# o ('columna', tabla, nombre, definicion). Los índices y columnas se verifican en
+# information_schema antes de crearlos o borrarlos porque MySQL no tiene IF NOT EXISTS para ellos.
+MIGRACIONES = [
+    {
+        'version': 1,
+        'descripcion': "Esquema base del hotel",
+        'subir': [
+            ('sql', """
+                CREATE TABLE IF NOT EXISTS admins (
+                    id INT AUTO_INCREMENT PRIMARY KEY,
+                    username VARCHAR(50) NOT NULL,
+                    password VARCHAR(255) NOT NULL
+                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+            """),
+            ('sql', """
+                CREATE TABLE IF NOT EXISTS clientes (
+                    id_cliente INT AUTO_INCREMENT PRIMARY KEY,
+                    nombre VARCHAR(100) NOT NULL,
+                    apellido VARCHAR(100) NOT NULL,
+                    dni_pasaporte_cpf VARCHAR(30) NOT NULL,
+                    telefono VARCHAR(30),
+                    email VARCHAR(100),
+                    direccion VARCHAR(255),
+                    fecha_registro DATETIME DEFAULT CURRENT_TIMESTAMP
+                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+            """),
+            ('sql', """
+                CREATE TABLE IF NOT EXISTS habitaciones (
+                    id INT AUTO_INCREMENT PRIMARY KEY,
+                    numero_habitacion VARCHAR(10) NOT NULL,
+                    tipo VARCHAR(30) NOT NULL,
+                    precio_por_noche DECIMAL(10,2) NOT NULL,
+                    estado ENUM('disponible', 'ocupada', 'mantenimiento') NOT NULL DEFAULT 'disponible'
+                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+            """),
+            ('sql', """
+                CREATE TABLE IF NOT EXISTS reservas (
+                    id INT AUTO_INCREMENT PRIMARY KEY,
+                    id_cliente INT NOT NULL,
+                    id_habitacion INT NOT NULL,
+                    fecha_entrada DATETIME NOT NULL,
+                    fecha_salida DATETIME NOT NULL,
+                    monto DECIMAL(10,2) NOT NULL,
+                    estado VARCHAR(20) NOT NULL DEFAULT 'confirmada',
+                    CONSTRAINT fk_reservas_cliente FOREIGN KEY (id_cliente) REFERENCES clientes (id_cliente),
+                    CONSTRAINT fk_reservas_habitacion FOREIGN KEY (id_habitacion) REFERENCES habitaciones (id)
+                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+            """),
+            ('sql', """
+                CREATE TABLE IF NOT EXISTS pagos (
+                    id INT AUTO_INCREMENT PRIMARY KEY,
+                    id_reserva INT NOT NULL,
+                    metodo_pago VARCHAR(20) NOT NULL,
+                    monto DECIMAL(10,2) NOT NULL,
+                    fecha_pago DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    CONSTRAINT fk_pagos_reserva FOREIGN KEY (id_reserva) REFERENCES reservas (id)
+                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+            """),
+            ('sql', """
+                CREATE TABLE IF NOT EXISTS anticipos (
+                    id INT AUTO_INCREMENT PRIMARY KEY,
+                    id_reserva INT NOT NULL,
+                    monto_total DECIMAL(10,2) NOT NULL,
+                    porcentaje_anticipo DECIMAL(5,2) NOT NULL,
+                    monto_anticipo DECIMAL(10,2) NOT NULL,
+                    monto_restante DECIMAL(10,2) NOT NULL,
+                    fecha_anticipo DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    CONSTRAINT fk_anticipos_reserva FOREIGN KEY (id_reserva) REFERENCES reservas (id)
+                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+            """),
+        ],
+        'bajar': [
+            ('sql', "DROP TABLE IF EXISTS anticipos"),
+            ('sql', "DROP TABLE IF EXISTS pagos"),
+            ('sql', "DROP TABLE IF EXISTS reservas"),
+            ('sql', "DROP TABLE IF EXISTS habitaciones"),
+            ('sql', "DROP TABLE IF EXISTS clientes"),
+            ('sql', "DROP TABLE IF EXISTS admins"),
+        ],
+    },
+    {
+        'version': 2,
+        'descripcion': "Columnas de anticipo en reservas",
+        'subir': [
+            ('columna', 'reservas', 'monto_anticipo', "DECIMAL(10,2) NULL"),
+            ('columna', 'reservas', 'porcentaje_anticipo', "DECIMAL(5,2) NULL"),
+        ],
+        'bajar': [
+            ('columna', 'reservas', 'porcentaje_anticipo', None),
+            ('columna', 'reservas', 'monto_anticipo', None),
+        ],
+    },
+    {
+        'version': 3,
+        'descripcion': "Índices para las consultas de database.py",
+        'subir': [
+            # Conflictos de fechas y reservas por habitación (índice, reservar, extender)
+            ('indice', 'reservas', 'idx_reservas_habitacion_estado_fechas',
+             ('id_habitacion', 'estado', 'fecha_entrada', 'fecha_salida'), False),
+            # Listado paginado por (fecha_entrada DESC, id DESC); InnoDB agrega el id al índice
+            ('indice', 'reservas', 'idx_reservas_fecha_entrada', ('fecha_entrada',), False),
+            # Reservas futuras por estado (habitaciones, llegadas y salidas del día)
+            ('indice', 'reservas', 'idx_reservas_estado_salida', ('estado', 'fecha_salida'), False),
+            ('indice', 'reservas', 'idx_reservas_cliente_estado', ('id_cliente', 'estado'), False),
+            ('indice', 'clientes', 'uq_clientes_dni', ('dni_pasaporte_cpf',), True),
+            ('indice', 'habitaciones', 'uq_habitaciones_numero', ('numero_habitacion',), True),
+            ('indice', 'habitaciones', 'idx_habitaciones_estado', ('estado',), False),
+            ('indice', 'pagos', 'idx_pagos_reserva', ('id_reserva',), False),
+            ('indice', 'anticipos', 'idx_anticipos_reserva', ('id_reserva',), False),
+            ('indice', 'admins', 'uq_admins_username', ('username',), True),
+        ],
+        'bajar': [
+            ('indice', 'admins', 'uq_admins_username', None, None),
+            ('indice', 'anticipos', 'idx_anticipos_reserva', None, None),
+            ('indice', 'pagos', 'idx_pagos_reserva', None, None),
+            ('indice', 'habitaciones', 'idx_habitaciones_estado', None, None),
+            ('indice', 'habitaciones', 'uq_habitaciones_numero', None, None),
+            ('indice', 'clientes', 'uq_clientes_dni', None, None),
+            ('indice', 'reservas', 'idx_reservas_cliente_estado', None, None),
+            ('indice', 'reservas', 'idx_reservas_estado_salida', None, None),
+            ('indice', 'reservas', 'idx_reservas_fecha_entrada', None, None),
+            ('indice', 'reservas', 'idx_reservas_habitacion_estado_fechas', None, None),
+        ],
+    },
+    {
+        'version': 4,
+        'descripcion': "Índices de prefijo para la búsqueda de clientes",
+        'subir': [
+            # LIKE 'termino%' por columna; MySQL combina los OR con index_merge
+            ('indice', 'clientes', 'idx_clientes_apellido_nombre', ('apellido', 'nombre'), False),
+            ('indice', 'clientes', 'idx_clientes_nombre', ('nombre',), False),
+            ('indice', 'clientes', 'idx_clientes_email', ('email',), False),
+            ('indice', 'clientes', 'idx_clientes_telefono', ('telefono',), False),
+        ],
+        'bajar': [
+            ('indice', 'clientes', 'idx_clientes_telefono', None, None),
+            ('indice', 'clientes', 'idx_clientes_email', None, None),
+            ('indice', 'clientes', 'idx_clientes_nombre', None, None),
+            ('indice', 'clientes', 'idx_clientes_apellido_nombre', None, None),
+        ],
+    },
+    {
+        'version': 5,
+        'descripcion': "Índice de entradas por estado para el planificador de transiciones",
+        'subir': [
+            # Estadías en curso y próximas entradas; las salidas usan idx_reservas_estado_salida
+            ('indice', 'reservas', 'idx_reservas_estado_entrada', ('estado', 'fecha_entrada'), False),
+        ],
+        'bajar': [
+            ('indice', 'reservas', 'idx_reservas_estado_entrada', None, None),
+        ],
+    },
+    {
+        'version': 6,
+        'descripcion': "Resumen diario de ingresos y ocupación por tipo de habitación",
+        'subir': [
+            # Se llena con `flask --app app recalcular-resumen` y después se mantiene con cada escritura
+            ('sql', """
+                CREATE TABLE IF NOT EXISTS resumen_diario (
+                    fecha DATE NOT NULL,
+                    tipo VARCHAR(30) NOT NULL,
+                    noches INT NOT NULL DEFAULT 0,
+                    ingresos DECIMAL(14,2) NOT NULL DEFAULT 0,
+                    llegadas INT NOT NULL DEFAULT 0,
+                    anticipos DECIMAL(14,2) NOT NULL DEFAULT 0,
+                    pagos DECIMAL(14,2) NOT NULL DEFAULT 0,
+                    PRIMARY KEY (fecha, tipo)
+                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+            """),
+        ],
+        'bajar': [
+            ('sql', "DROP TABLE IF EXISTS resumen_diario"),
+        ],
+    },
+    {
+        'version': 7,
+        'descripcion': "Tarifas por temporada, día de la semana y tipo, y descuentos por estadía",
+        'subir': [
+            ('sql', """
+                CREATE TABLE IF NOT EXISTS tarifas (
+                    id INT AUTO_INCREMENT PRIMARY KEY,
+                    nombre VARCHAR(100) NOT NULL,
+                    tipo VARCHAR(30) NULL,
+                    desde DATE NULL,
+                    hasta DATE NULL,
+                    dias_semana VARCHAR(20) NULL,
+                    precio DECIMAL(10,2) NULL,
+                    factor DECIMAL(6,4) NULL,
+                    prioridad INT NOT NULL DEFAULT 0
+                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+            """),
+            ('sql', """
+                CREATE TABLE IF NOT EXISTS descuentos_estadia (
+                    id INT AUTO_INCREMENT PRIMARY KEY,
+                    tipo VARCHAR(30) NULL,
+                    noches_minimas INT NOT NULL,
+                    porcentaje DECIMAL(5,2) NOT NULL
+                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+            """),
+        ],
+        'bajar': [
+            ('sql', "DROP TABLE IF EXISTS descuentos_estadia"),
+            ('sql', "DROP TABLE IF EXISTS tarifas"),
+        ],
+    },
+    {
+        'version': 8,
+        'descripcion': "Registro de cambios para las pantallas en vivo",
+        'subir': [
+            # Una fila por entidad escrita, en la misma transacción que la escritura (ver tablero.py)
+            ('sql', """
+                CREATE TABLE IF NOT EXISTS cambios (
+                    id BIGINT AUTO_INCREMENT PRIMARY KEY,
+                    entidad VARCHAR(20) NOT NULL,
+                    id_entidad INT NOT NULL,
+                    operacion VARCHAR(20) NOT NULL,
+                    momento DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+                ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+            """),
+            # Para la purga de los cambios viejos
+            ('indice', 'cambios', 'idx_cambios_momento', ('momento',), False),
+        ],
+        'bajar': [
+            ('sql', "DROP TABLE IF EXISTS cambios"),
+        ],
+    },
+]
+
+
+def _existe_indice(cursor, tabla, nombre):
+    cursor.execute("""
+        SELECT 1 FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+        LIMIT 1
+    """, (tabla, nombre))
+    return cursor.fetchone() is not None
+
+
+def _existe_columna(cursor, tabla, nombre):
+    cursor.execute("""
+        SELECT 1 FROM information_schema.columns
+        WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s
+    """, (tabla, nombre))
+    return cursor.fetchone() is not None
+
+
+def _aplicar_paso(cursor, paso, subir):
+    tipo = paso[0]
+    if tipo == 'sql':
+        cursor.execute(paso[1])
+    elif tipo == 'indice':
+        _, tabla, nombre, columnas, unico = paso
+        existe = _existe_indice(cursor, tabla, nombre)
+        if subir and not existe:
+            cursor.execute(f"CREATE {'UNIQUE ' if unico else ''}INDEX {nombre} ON {tabla} ({', '.join(columnas)})")
+        elif not subir and existe:
+            cursor.execute(f"DROP INDEX {nombre} ON {tabla}")
+    elif tipo == 'columna':
+        _, tabla, nombre, definicion = paso
+        existe = _existe_columna(cursor, tabla, nombre)
+        if subir and not existe:
+            cursor.execute(f"ALTER TABLE {tabla} ADD COLUMN {nombre} {definicion}")
+        elif not subir and existe:
+            cursor.execute(f"ALTER TABLE {tabla} DROP COLUMN {nombre}")
+    else:
+        raise ValueError(f"Paso de migración desconocido: {tipo}")
+
+
+def _versiones_aplicadas(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migraciones (
+            version INT PRIMARY KEY,
+            descripcion VARCHAR(255) NOT NULL,
+            aplicada_en DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4
+    """)
+    cursor.execute("SELECT version FROM schema_migraciones")
+    return {fila[0] for fila in cursor.fetchall()}
+
+
+def estado():
+    """Lista las migraciones con la marca de aplicada o pendiente"""
+    conn = database.conectar()
+    cursor = conn.cursor()
+    try:
+        aplicadas = _versiones_aplicadas(cursor)
+        return [(m['version'], m['descripcion'], m['version'] in aplicadas) for m in MIGRACIONES]
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def migrar(hasta=None):
+    """Aplica en orden las migraciones pendientes hasta la versión indicada; devuelve las aplicadas"""
+    conn = database.conectar()
+    cursor = conn.cursor()
+    aplicadas_ahora = []
+    try:
+        aplicadas = _versiones_aplicadas(cursor)
+        for migracion in MIGRACIONES:
+            if hasta is not None and migracion['version'] > hasta:
+                break
+            if migracion['version'] in aplicadas:
+                continue
+            # El DDL de MySQL confirma implícitamente: cada paso debe poder repetirse
+            for paso in migracion['subir']:
+                _aplicar_paso(cursor, paso, subir=True)
+            cursor.execute("INSERT INTO schema_migraciones (version, descripcion) VALUES (%s, %s)",
+                           (migracion['version'], migracion['descripcion']))
+            conn.commit()
+            aplicadas_ahora.append(migracion['version'])
+            logger.info(f"Migración {migracion['version']} aplicada: {migracion['descripcion']}")
+        return aplicadas_ahora
+    finally:
+        cursor.close()
+        conn.close()
+
+
+def revertir(hasta):
+    """Revierte en orden inverso las migraciones aplicadas posteriores a la versión `hasta`"""
+    conn = database.conectar()
+    cursor = conn.cursor()
+    revertidas = []
+    try:
+        aplicadas = _versiones_aplicadas(cursor)
+        for migracion in reversed(MIGRACIONES):
+            if migracion['version'] <= hasta or migracion['version'] not in aplicadas:
+                continue
+            for paso in migracion['bajar']:
+                _aplicar_paso(cursor, paso, subir=False)
+            cursor.execute("DELETE FROM schema_migraciones WHERE version = %s", (migracion['version'],))
+            conn.commit()
+            revertidas.append(migracion['version'])
+            logger.info(f"Migración {migracion['version']} revertida: {migracion['descripcion']}")
+        return revertidas
+    finally:
+        cursor.close()
+        conn.close()
+
+
+# Valores de ejemplo para los %s de las consultas según la columna con la que se comparan
+_VALORES_EJEMPLO = [
+    ('fecha', "'2030-01-01 12:00:00'"),
+    ('estado', "'confirmada'"),
+    ('dni', "'00000000'"),
+    ('username', "'admin'"),
+    ('password', "'admin'"),
+    ('numero', "'101'"),
+]
+# Relleno de las consultas armadas con str.format en database.py
+_RELLENOS = {'origen': 'clientes', 'donde': '', 'otros': ''}
+
+
+def _valor_ejemplo(coincidencia):
+    previo = coincidencia.string[max(0, coincidencia.start() - 80):coincidencia.start()]
+    columna = re.search(r"([A-Za-z_.]+)\s*(?:[<>=!]+|IN\s*\(|LIKE)\s*$", previo, re.I)
+    if re.search(r"LIMIT\s*$", previo, re.I):
+        return "50"
+    if columna:
+        for fragmento, valor in _VALORES_EJEMPLO:
+            if fragmento in columna.group(1).lower():
+                return valor
+    return "1"
+
+
+# Recorridos completos intencionales por función (o constante de consulta) de database.py y las
+# tablas, con el nombre o alias que muestra EXPLAIN, que pueden recorrer. Cualquier otro paso
+# ALL hace fallar `flask verificar-consultas`.
+RECORRIDOS_PERMITIDOS = {
+    # Cargas completas de los índices en memoria y de las tablas de tarifas
+    '_consultar_datos_indice': {'habitaciones', 'reservas'},
+    '_consultar_clientes_busqueda': {'clientes'},
+    'tabla_tarifas': {'tarifas', 'descuentos_estadia'},
+    # Listados de todas las habitaciones (decenas o cientos de filas)
+    'listar_todas_habitaciones': {'habitaciones'},
+    'listar_habitaciones_basico': {'habitaciones'},
+    'listar_habitaciones_disponibles': {'h'},
+    '_CONSULTA_HABITACIONES_LOTE': {'habitaciones'},
+    'resumen_ingresos': {'habitaciones'},
+    # Contadores del panel sobre tablas completas
+    'obtener_estadisticas': {'habitaciones', 'reservas', 'clientes'},
+    # Listados y exportaciones sin filtros: devuelven (o recorren en lotes) todas las filas
+    'listar_reservas': {'r', 'c', 'h'},
+    '_CONSULTA_CLIENTES': {'c', 'h'},
+    '_CONSULTA_RESERVAS_CON_ANTICIPOS': {'r', 'c', 'h'},
+    '_CONSULTA_ANTICIPOS': {'a', 'r', 'c'},
+    # Reconstrucción completa del resumen diario
+    '_CONSULTAS_RECALCULO': {'r', 'a', 'p', 'h'},
+    # Se filtran por id al ejecutarse (_cargar_relacionados dentro de leer_cambios)
+    '_CONSULTAS_ENTIDADES_CAMBIADAS': {'habitaciones', 'clientes', 'r', 'h', 'c'},
+}
+
+
+def _filtro_por_lotes(llamada):
+    """Columna del `IN` que _cargar_relacionados agrega a la consulta de la llamada, o None"""
+    if not (isinstance(llamada, ast.Call) and getattr(llamada.func, 'id', None) == '_cargar_relacionados'):
+        return None
+    argumentos = {k.arg: k.value for k in llamada.keywords}
+    if 'ids' not in argumentos:
+        return None
+    columna = argumentos.get('columna', llamada.args[2] if len(llamada.args) > 2 else argumentos.get('clave'))
+    return columna.value if isinstance(columna, ast.Constant) else None
+
+
+def consultas_de_database(ruta=None):
+    """Consultas SELECT literales de database.py con el nombre de la función que las ejecuta.
+
+    Las que se pasan a _cargar_relacionados con `ids` llevan el filtro `columna IN (...)` que se
+    les agrega al ejecutarse.
+    """
+    ruta = ruta or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'database.py')
+    with open(ruta, encoding='utf-8') as f:
+        arbol = ast.parse(f.read())
+    consultas = []
+    for nodo in arbol.body:
+        nombre = getattr(nodo, 'name', None)
+        if isinstance(nodo, ast.Assign):
+            nombre = nodo.targets[0].id if isinstance(nodo.targets[0], ast.Name) else None
+        dentro_de_fstring = set()
+        filtros = {}
+        for interno in ast.walk(nodo):
+            columna = _filtro_por_lotes(interno)
+            if columna and len(interno.args) > 1:
+                filtros[id(interno.args[1])] = columna
+        for interno in ast.walk(nodo):
+            if isinstance(interno, ast.JoinedStr):
+                # f-string: las partes interpoladas (marcadores de IN, condiciones) se prueban como un %s
+                dentro_de_fstring.update(id(parte) for parte in interno.values)
+                texto = ''.join(parte.value if isinstance(parte, ast.Constant) else '%s'
+                                for parte in interno.values).strip()
+            elif (isinstance(interno, ast.Constant) and isinstance(interno.value, str)
+                  and id(interno) not in dentro_de_fstring):
+                texto = interno.value.strip()
+            else:
+                continue
+            if texto.upper().startswith('SELECT') and ' FROM ' in texto.upper().replace('\n', ' '):
+                if id(interno) in filtros:
+                    texto = database._agregar_filtro(texto, f"{filtros[id(interno)]} IN (%s)")
+                consultas.append((nombre, texto))
+    return consultas
+
+
+def verificar_planes():
+    """Ejecuta EXPLAIN sobre las consultas de database.py; devuelve los recorridos completos no permitidos.
+
+    Todo paso ALL sobre una tabla cuenta, aunque el optimizador haya descartado un índice
+    disponible, salvo los de RECORRIDOS_PERMITIDOS. Conviene correrlo contra una base con un
+    volumen parecido al real: con tablas casi vacías MySQL prefiere recorrerlas completas.
+    """
+    conn = database.conectar()
+    cursor = conn.cursor(dictionary=True)
+    problemas = []
+    try:
+        for funcion, consulta in consultas_de_database():
+            sql = consulta.format_map(_RELLENOS) if '{' in consulta else consulta
+            sql = re.sub(r"%s", _valor_ejemplo, sql)
+            try:
+                cursor.execute(f"EXPLAIN {sql}")
+                plan = cursor.fetchall()
+            except mysql.connector.Error as e:
+                problemas.append({'funcion': funcion, 'tabla': None, 'detalle': f"EXPLAIN falló: {e}"})
+                continue
+            for paso in plan:
+                tabla = paso.get('table') or ''
+                # Las tablas derivadas (<derivedN>, <unionN,M>) ya se cuentan en los pasos que las llenan
+                if paso.get('type') != 'ALL' or tabla.startswith('<'):
+                    continue
+                if tabla in RECORRIDOS_PERMITIDOS.get(funcion, ()):
+                    continue
+                indices = f"; descartó {paso['possible_keys']}" if paso.get('possible_keys') else ""
+                problemas.append({'funcion': funcion, 'tabla': tabla,
+                                  'detalle': f"Recorrido completo de {tabla} ({paso.get('rows')} filas estimadas{indices})"})
+        return problemas
+    finally:
+        cursor.close()
+        conn.close()
+
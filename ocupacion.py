@@ -0,0 +1,142 @@
+from datetime import datetime, timedelta
+from itertools import chain
+import logging
+
+try:
+    import numpy as np
+except ImportError:  # NumPy es opcional: sin él se pinta con bytearray por habitación
+    np = None
+
+logger = logging.getLogger(__name__)
+
+RESOLUCIONES = {
+    # paso de cada columna y si se marca por noche (muestra a la medianoche siguiente) o por solapamiento
+    'dia': (timedelta(days=1), 'noche'),
+    'hora': (timedelta(hours=1), 'solapamiento'),
+}
+MAX_COLUMNAS = {'dia': 731, 'hora': 24 * 62}
+
+
+class GrillaOcupacion:
+    """Matriz habitaciones x columnas (días u horas) con 1 donde la habitación está ocupada"""
+
+    def __init__(self, habitaciones, desde, resolucion, columnas, filas):
+        self.habitaciones = habitaciones
+        self.desde = desde
+        self.resolucion = resolucion
+        self.columnas = columnas
+        # numpy.ndarray bool (habitaciones x columnas) o lista de bytearray
+        self.filas = filas
+
+    @property
+    def paso(self):
+        return RESOLUCIONES[self.resolucion][0]
+
+    def ocupadas_por_columna(self):
+        if np is not None and isinstance(self.filas, np.ndarray):
+            return self.filas.sum(axis=0).tolist()
+        # bytes.count por columna: transponer con zip recorre en C cada columna
+        return [bytes(columna).count(1) for columna in zip(*self.filas)] if self.filas else [0] * self.columnas
+
+    def fila_texto(self, i):
+        """Ocupación de la habitación i como texto de '0' y '1'"""
+        fila = self.filas[i]
+        if np is not None and isinstance(fila, np.ndarray):
+            return (fila.view(np.uint8) + 48).tobytes().decode('ascii')
+        return bytes(fila).translate(_A_TEXTO).decode('ascii')
+
+    def como_dict(self):
+        ocupadas = self.ocupadas_por_columna()
+        total = len(self.habitaciones)
+        return {
+            'desde': self.desde.isoformat(),
+            'hasta': (self.desde + self.paso * self.columnas).isoformat(),
+            'resolucion': self.resolucion,
+            'columnas': [(self.desde + self.paso * k).isoformat() for k in range(self.columnas)],
+            'habitaciones': [
+                {'id': h['id'], 'numero_habitacion': h['numero_habitacion'], 'tipo': h['tipo'],
+                 'estado': h['estado'], 'ocupacion': self.fila_texto(i)}
+                for i, h in enumerate(self.habitaciones)
+            ],
+            'ocupadas': ocupadas,
+            'tasas': [round(n / total, 4) if total else 0.0 for n in ocupadas],
+            'tasa_promedio': round(sum(ocupadas) / (total * self.columnas), 4) if total and self.columnas else 0.0,
+        }
+
+
+_A_TEXTO = bytes.maketrans(b'\x00\x01', b'01')
+
+
+def _limites(inicio, fin, paso, modo, columnas):
+    """Columna inicial y final (exclusiva) de cada intervalo, recortadas a la ventana.
+
+    En modo 'noche' la columna k cuenta si la reserva cubre la medianoche que cierra ese día
+    (una estadía de 14:00 a 10:00 del día siguiente ocupa una noche); en modo 'solapamiento'
+    basta con tocar cualquier parte de la columna.
+    """
+    segundos = paso.total_seconds()
+    desplazamiento = segundos if modo == 'noche' else 0.0
+    if np is not None:
+        a = (inicio - desplazamiento) / segundos
+        s = np.ceil(a) if modo == 'noche' else np.floor(a)
+        e = np.ceil((fin - desplazamiento) / segundos)
+        return np.clip(s, 0, columnas).astype(np.int64), np.clip(e, 0, columnas).astype(np.int64)
+    limites = []
+    for a, b in zip(inicio, fin):
+        a = (a - desplazamiento) / segundos
+        s = -int(-a // 1) if modo == 'noche' else int(a // 1)
+        e = -int(-((b - desplazamiento) / segundos) // 1)
+        limites.append((min(max(s, 0), columnas), min(max(e, 0), columnas)))
+    return limites
+
+
+def construir_grilla(habitaciones, intervalos, desde, columnas, resolucion='dia'):
+    """Pinta los intervalos sobre la grilla.
+
+    `intervalos` son tuplas (id_habitacion, segundos_entrada, segundos_salida) con los segundos
+    contados desde `desde`, tal como los devuelve database.reservas_para_ocupacion.
+    """
+    if resolucion not in RESOLUCIONES:
+        raise ValueError(f"Resolución desconocida: {resolucion}")
+    if not 0 < columnas <= MAX_COLUMNAS[resolucion]:
+        raise ValueError(f"La ventana debe tener entre 1 y {MAX_COLUMNAS[resolucion]} columnas")
+    paso, modo = RESOLUCIONES[resolucion]
+
+    if not habitaciones:
+        return GrillaOcupacion(habitaciones, desde, resolucion, columnas, [])
+
+    if np is not None:
+        # fromiter sobre la secuencia aplanada evita crear un objeto por tupla
+        datos = np.fromiter(chain.from_iterable(intervalos), np.int64, 3 * len(intervalos)).reshape(-1, 3)
+        # Fila de cada intervalo buscando su habitación en los ids ordenados
+        ids = np.array([h['id'] for h in habitaciones], dtype=np.int64)
+        orden = np.argsort(ids)
+        ordenados = ids[orden]
+        pos = np.minimum(np.searchsorted(ordenados, datos[:, 0]), len(ids) - 1)
+        conocidas = ordenados[pos] == datos[:, 0]
+        filas = orden[pos[conocidas]]
+        s, e = _limites(datos[conocidas, 1], datos[conocidas, 2], paso, modo, columnas)
+        validas = e > s
+        # Arreglo de diferencias: +1 al entrar, -1 al salir y suma acumulada por fila
+        ancho = columnas + 1
+        total = len(habitaciones) * ancho
+        diferencias = (np.bincount(filas[validas] * ancho + s[validas], minlength=total)
+                       - np.bincount(filas[validas] * ancho + e[validas], minlength=total))
+        matriz = np.cumsum(diferencias.reshape(len(habitaciones), ancho), axis=1)[:, :columnas] > 0
+        return GrillaOcupacion(habitaciones, desde, resolucion, columnas, matriz)
+
+    posicion = {h['id']: i for i, h in enumerate(habitaciones)}
+    intervalos = [i for i in intervalos if i[0] in posicion]
+    filas = [bytearray(columnas) for _ in habitaciones]
+    limites = _limites([i[1] for i in intervalos], [i[2] for i in intervalos], paso, modo, columnas)
+    for (id_habitacion, _, _), (s, e) in zip(intervalos, limites):
+        if e > s:
+            filas[posicion[id_habitacion]][s:e] = b'\x01' * (e - s)
+    return GrillaOcupacion(habitaciones, desde, resolucion, columnas, filas)
+
+
+def ventana(desde, dias, resolucion='dia'):
+    """Inicio alineado y cantidad de columnas para `dias` días desde la fecha `desde`"""
+    inicio = datetime(desde.year, desde.month, desde.day)
+    columnas = dias if resolucion == 'dia' else dias * 24
+    return inicio, columnas
@@ -0,0 +1,184 @@
+from datetime import datetime, timedelta
+import heapq
+import itertools
+import logging
+import os
+import threading
+import time
+
+import database
+
+logger = logging.getLogger(__name__)
+
+# Momentos de entrada y salida que se cargan por adelantado
+HORIZONTE = timedelta(hours=float(os.environ.get('PLANIFICADOR_HORIZONTE_HORAS', 6)))
+# Espera máxima entre vueltas; en cada una se mira si cambiaron las reservas para recargar los momentos
+SONDEO = float(os.environ.get('PLANIFICADOR_SONDEO', 30))
+# Recarga de momentos aunque la versión no cambie (escrituras de otros procesos con caché en memoria)
+RECARGA = float(os.environ.get('PLANIFICADOR_RECARGA', 300))
+# Intervalo de revisión de los datos derivados; los índices que vencen antes de dos revisiones se recargan
+DERIVADOS = float(os.environ.get('PLANIFICADOR_DERIVADOS', 60))
+# Intervalo de purga de la tabla cambios (se conservan DB_CAMBIOS_HORAS)
+PURGA_CAMBIOS = float(os.environ.get('PLANIFICADOR_PURGA_CAMBIOS', 3600))
+
+TRANSICION = 'transiciones'
+
+
+def refrescar_derivados():
+    """Recarga fuera de las peticiones los índices en memoria que están por vencer"""
+    recargados = []
+    for nombre, indice, reconstruir in (
+            ('disponibilidad', database.indice_disponibilidad, database.reconstruir_indice_disponibilidad),
+            ('clientes', database.indice_clientes, database.reconstruir_indice_clientes)):
+        vence_en = indice.vence_en
+        # Un índice ya vencido no se usa desde hace rato: se deja que lo cargue la próxima petición
+        if vence_en is not None and 0 <= vence_en < 2 * DERIVADOS and reconstruir():
+            recargados.append(nombre)
+    return recargados
+
+
+class Planificador:
+    """Aplica las transiciones de estado de reservas y habitaciones a su hora y corre tareas periódicas.
+
+    Los próximos momentos de entrada y salida (hasta HORIZONTE) y las tareas periódicas esperan en
+    un montículo ordenado por hora; el bucle duerme hasta el primero, como mucho SONDEO segundos.
+    Cada momento vencido dispara database.aplicar_transiciones, que decide por el estado de la base:
+    un momento de más no cambia nada y al arrancar se aplica de una vez todo lo atrasado.
+    """
+
+    def __init__(self, tareas=None):
+        # nombre -> (intervalo en segundos, función sin argumentos)
+        self.tareas = dict(tareas or {})
+        self._eventos = []
+        self._orden = itertools.count()
+        self._condicion = threading.Condition()
+        self._detenido = False
+        self._hilo = None
+        self._pendiente = True
+        self._version = None
+        self._cargado_en = None
+        self._cargado_hasta = None
+        self.ultimas = {}
+
+    def _programar(self, momento, tipo):
+        heapq.heappush(self._eventos, (momento, next(self._orden), tipo))
+
+    def _hay_que_recargar(self, ahora):
+        return (self._cargado_en is None
+                or time.monotonic() - self._cargado_en >= RECARGA
+                or ahora >= self._cargado_hasta - HORIZONTE / 2
+                or database.version_datos('reservas') != self._version)
+
+    def _cargar_momentos(self, ahora):
+        # La versión se toma antes de consultar: un cambio durante la consulta fuerza otra recarga
+        version = database.version_datos('reservas')
+        momentos = database.momentos_de_transicion(ahora, ahora + HORIZONTE)
+        if momentos is None:
+            return
+        self._eventos = [evento for evento in self._eventos if evento[2] != TRANSICION]
+        heapq.heapify(self._eventos)
+        for momento in momentos:
+            self._programar(momento, TRANSICION)
+        self._version = version
+        self._cargado_en = time.monotonic()
+        self._cargado_hasta = ahora + HORIZONTE
+        # Sólo se cargan momentos posteriores a `ahora`: una reserva escrita desde la recarga
+        # anterior con entrada ya pasada no quedaría programada. Aplicar es idempotente, así que
+        # después de cada recarga se aplica una vez lo que esté vencido
+        self._pendiente = True
+
+    def _correr(self, nombre, funcion):
+        try:
+            resultado = funcion()
+        except Exception:
+            logger.exception(f"Error en la tarea {nombre} del planificador")
+            resultado = None
+        self.ultimas[nombre] = (datetime.now(), resultado)
+        return resultado
+
+    def aplicar_pendientes(self):
+        """Aplica ya las transiciones atrasadas; devuelve los conteos o None si falló la base"""
+        resultado = self._correr(TRANSICION, database.aplicar_transiciones)
+        # Si falla se reintenta en la próxima vuelta aunque el momento ya no esté en el montículo
+        self._pendiente = resultado is None
+        return resultado
+
+    def bucle(self):
+        """Corre hasta detener(): en un hilo propio o como proceso de `flask planificador`"""
+        ahora = datetime.now()
+        for nombre, (intervalo, _) in self.tareas.items():
+            self._programar(ahora + timedelta(seconds=intervalo), nombre)
+        while not self._detenido:
+            ahora = datetime.now()
+            if self._hay_que_recargar(ahora):
+                self._cargar_momentos(ahora)
+            transicion = self._pendiente
+            while self._eventos and self._eventos[0][0] <= ahora:
+                _, _, tipo = heapq.heappop(self._eventos)
+                if tipo == TRANSICION:
+                    transicion = True
+                    continue
+                intervalo, funcion = self.tareas[tipo]
+                self._correr(tipo, funcion)
+                self._programar(datetime.now() + timedelta(seconds=intervalo), tipo)
+            if transicion:
+                self.aplicar_pendientes()
+
+            espera = SONDEO
+            if self._eventos:
+                espera = min(espera, (self._eventos[0][0] - datetime.now()).total_seconds())
+            with self._condicion:
+                if not self._detenido:
+                    self._condicion.wait(max(espera, 0))
+
+    def iniciar(self):
+        if self._hilo and self._hilo.is_alive():
+            return
+        self._detenido = False
+        self._hilo = threading.Thread(target=self.bucle, name='planificador', daemon=True)
+        self._hilo.start()
+        logger.info("Planificador de transiciones iniciado")
+
+    def detener(self, timeout=5):
+        with self._condicion:
+            self._detenido = True
+            self._condicion.notify_all()
+        if self._hilo and self._hilo is not threading.current_thread():
+            self._hilo.join(timeout)
+
+    def estado(self):
+        eventos = list(self._eventos)
+        proximos = sorted(eventos)[:5]
+        return {
+            'activo': bool(self._hilo and self._hilo.is_alive()),
+            'eventos': len(eventos),
+            'proximos': [{'momento': momento.isoformat(), 'tipo': tipo} for momento, _, tipo in proximos],
+            'ultimas': {
+                nombre: {'momento': momento.isoformat(), 'resultado': resultado}
+                for nombre, (momento, resultado) in self.ultimas.items()
+            },
+        }
+
+
+_planificador = None
+_pid = None
+_lock = threading.Lock()
+
+def iniciar_en_proceso():
+    """Arranca una vez por proceso (también en cada worker después de un fork) el planificador en un hilo"""
+    global _planificador, _pid
+    if _planificador is not None and _pid == os.getpid():
+        return _planificador
+    with _lock:
+        if _planificador is None or _pid != os.getpid():
+            _planificador = Planificador({'derivados': (DERIVADOS, refrescar_derivados),
+                                          'cambios': (PURGA_CAMBIOS, database.purgar_cambios)})
+            _pid = os.getpid()
+            _planificador.iniciar()
+    return _planificador
+
+def estado():
+    """Estado del planificador de este proceso, o None si no corre aquí"""
+    if _planificador is None or _pid != os.getpid():
+        return None
+    return _planificador.estado()
@@ -0,0 +1,490 @@
+import mysql.connector
+from mysql.connector import errors
+from collections import deque
+import itertools
+import logging
+import os
+import threading
+import time
+import weakref
+
+logger = logging.getLogger(__name__)
+
+# Pools vivos del proceso, para reiniciarlos en los hijos tras un fork
+_pools = weakref.WeakSet()
+
+
+def _entero_entorno(nombre, defecto):
+    valor = os.environ.get(nombre)
+    return int(valor) if valor not in (None, '') else defecto
+
+
+def _decimal_entorno(nombre, defecto):
+    valor = os.environ.get(nombre)
+    return float(valor) if valor not in (None, '') else defecto
+
+
+def configuracion_desde_entorno():
+    """Parámetros de conexión MySQL leídos de variables de entorno"""
+    return {
+        'host': os.environ.get('DB_HOST', 'localhost'),
+        'port': _entero_entorno('DB_PORT', 3306),
+        'user': os.environ.get('DB_USER', 'root'),
+        'password': os.environ.get('DB_PASSWORD', ''),
+        'database': os.environ.get('DB_NAME', 'hotel'),
+        'charset': 'utf8mb4',
+        'collation': 'utf8mb4_general_ci',
+    }
+
+
+def replicas_desde_entorno():
+    """Parámetros de conexión de cada réplica de DB_REPLICAS ('host:puerto,host2'); lista vacía sin réplicas.
+
+    Usuario, contraseña y base son los del primario salvo DB_REPLICA_USER y DB_REPLICA_PASSWORD.
+    """
+    base = configuracion_desde_entorno()
+    base['user'] = os.environ.get('DB_REPLICA_USER', base['user'])
+    base['password'] = os.environ.get('DB_REPLICA_PASSWORD', base['password'])
+    # Una réplica caída no debe demorar la lectura más que esto antes de ir al primario
+    base['connection_timeout'] = _entero_entorno('DB_REPLICA_TIMEOUT_CONEXION', 2)
+    replicas = []
+    for direccion in os.environ.get('DB_REPLICAS', '').split(','):
+        host, _, puerto = direccion.strip().partition(':')
+        if host:
+            replicas.append({**base, 'host': host, 'port': int(puerto) if puerto else base['port']})
+    return replicas
+
+
+def opciones_replicas_desde_entorno():
+    """Pausa tras un fallo, retraso máximo tolerado, intervalo de medición y espera por una conexión de las réplicas"""
+    return {
+        'pausa': _decimal_entorno('DB_REPLICA_PAUSA', 30.0),
+        'espera': _decimal_entorno('DB_REPLICA_ESPERA', 0.05),
+        'retraso_max': _decimal_entorno('DB_REPLICA_RETRASO_MAX', 5.0),
+        'revision': _decimal_entorno('DB_REPLICA_REVISION', 10.0),
+    }
+
+
+def opciones_pool_desde_entorno():
+    """Tamaños, timeouts y límites de reciclado del pool leídos de variables de entorno"""
+    return {
+        'minimo': _entero_entorno('DB_POOL_MIN', 1),
+        'maximo': _entero_entorno('DB_POOL_MAX', 10),
+        'timeout': _decimal_entorno('DB_POOL_TIMEOUT', 5.0),
+        'max_usos': _entero_entorno('DB_POOL_MAX_USOS', 1000),
+        'max_edad': _decimal_entorno('DB_POOL_MAX_EDAD', 3600.0),
+        'ping_tras': _decimal_entorno('DB_POOL_PING_TRAS', 5.0),
+    }
+
+
+def fabrica_mysql(**config):
+    """Devuelve una función que abre conexiones MySQL nuevas con la configuración dada"""
+    config = config or configuracion_desde_entorno()
+
+    def fabrica():
+        return mysql.connector.connect(**config)
+    return fabrica
+
+
+class _Entrada:
+    """Conexión física administrada por el pool"""
+
+    __slots__ = ('conexion', 'creada', 'ultimo_uso', 'usos', 'generacion')
+
+    def __init__(self, conexion, generacion):
+        ahora = time.monotonic()
+        self.conexion = conexion
+        self.creada = ahora
+        self.ultimo_uso = ahora
+        self.usos = 0
+        self.generacion = generacion
+
+
+class ConexionAgrupada:
+    """Conexión prestada por el pool; close() la devuelve en lugar de cerrarla"""
+
+    def __init__(self, pool, entrada):
+        self._pool = pool
+        self._entrada = entrada
+
+    def __getattr__(self, nombre):
+        entrada = self.__dict__.get('_entrada')
+        if entrada is None:
+            raise errors.OperationalError("La conexión ya fue devuelta al pool")
+        return getattr(entrada.conexion, nombre)
+
+    def cursor(self, *args, **kwargs):
+        cursor = self.__getattr__('cursor')(*args, **kwargs)
+        envolver = self._pool.envolver_cursor
+        return envolver(cursor) if envolver else cursor
+
+    def close(self):
+        entrada, self._entrada = self._entrada, None
+        if entrada is not None:
+            self._pool.devolver(entrada)
+
+    def descartar(self):
+        """Cierra la conexión física en vez de devolverla (p. ej. con filas sin leer en el socket)"""
+        entrada, self._entrada = self._entrada, None
+        if entrada is not None:
+            self._pool.descartar(entrada)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class PoolConexiones:
+    """Pool de conexiones seguro para hilos y para servidores pre-fork"""
+
+    def __init__(self, fabrica=None, minimo=1, maximo=10, timeout=5.0,
+                 max_usos=1000, max_edad=3600.0, ping_tras=5.0, nombre='primario', envolver_cursor=None):
+        if maximo < 1 or minimo < 0 or minimo > maximo:
+            raise ValueError("Tamaños de pool inválidos")
+        self.fabrica = fabrica or fabrica_mysql()
+        self.minimo = minimo
+        self.maximo = maximo
+        self.timeout = timeout
+        self.max_usos = max_usos
+        self.max_edad = max_edad
+        self.ping_tras = ping_tras
+        self.nombre = nombre
+        # Función opcional que envuelve cada cursor creado (instrumentación de consultas)
+        self.envolver_cursor = envolver_cursor
+        self._reiniciar_estado()
+        _pools.add(self)
+
+    def _reiniciar_estado(self):
+        # No se cierran las conexiones heredadas: el socket lo sigue usando el padre
+        self._cond = threading.Condition()
+        self._inactivas = deque()
+        self._en_uso = 0
+        self._pid = os.getpid()
+        self._generacion = getattr(self, '_generacion', 0) + 1
+        self._precalentado = False
+        self._stats = {
+            'prestamos': 0,
+            'creadas': 0,
+            'recicladas': 0,
+            'descartadas': 0,
+            'esperas': 0,
+            'timeouts': 0,
+            'espera_total': 0.0,
+            'espera_max': 0.0,
+        }
+
+    def _verificar_proceso(self):
+        if self._pid != os.getpid():
+            self._reiniciar_estado()
+
+    def _expirada(self, entrada, ahora):
+        if self.max_usos and entrada.usos >= self.max_usos:
+            return True
+        return bool(self.max_edad) and ahora - entrada.creada >= self.max_edad
+
+    def _crear(self):
+        entrada = _Entrada(self.fabrica(), self._generacion)
+        with self._cond:
+            self._stats['creadas'] += 1
+        return entrada
+
+    def _cerrar(self, entrada):
+        try:
+            entrada.conexion.close()
+        except Exception as e:
+            logger.debug(f"Error al cerrar conexión del pool {self.nombre}: {e}")
+
+    def _esta_viva(self, conexion):
+        try:
+            return conexion.is_connected()
+        except Exception:
+            return False
+
+    def _precalentar(self):
+        faltantes = self.minimo - len(self._inactivas) - self._en_uso
+        for _ in range(max(faltantes, 0)):
+            try:
+                entrada = self._crear()
+            except Exception as e:
+                logger.warning(f"No se pudo precalentar el pool {self.nombre}: {e}")
+                break
+            with self._cond:
+                sobra = len(self._inactivas) + self._en_uso >= self.maximo
+                if not sobra:
+                    self._inactivas.appendleft(entrada)
+            if sobra:
+                self._cerrar(entrada)
+                break
+
+    def obtener(self, timeout=None):
+        """Presta una conexión, esperando como máximo `timeout` segundos (por defecto el del pool)"""
+        timeout = self.timeout if timeout is None else timeout
+        inicio = time.monotonic()
+        limite = inicio + timeout
+        entrada = None
+        with self._cond:
+            self._verificar_proceso()
+            precalentar = not self._precalentado
+            self._precalentado = True
+        if precalentar:
+            self._precalentar()
+        with self._cond:
+            esperando = False
+            while True:
+                if self._inactivas:
+                    # LIFO: la conexión más reciente es la que menos probablemente esté caída
+                    entrada = self._inactivas.pop()
+                    break
+                if self._en_uso + len(self._inactivas) < self.maximo:
+                    break
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    self._stats['timeouts'] += 1
+                    raise errors.PoolError(
+                        f"Pool {self.nombre} agotado: {self.maximo} conexiones en uso tras {timeout}s")
+                if not esperando:
+                    esperando = True
+                    self._stats['esperas'] += 1
+                self._cond.wait(restante)
+            self._en_uso += 1
+            espera = time.monotonic() - inicio
+            self._stats['prestamos'] += 1
+            self._stats['espera_total'] += espera
+            self._stats['espera_max'] = max(self._stats['espera_max'], espera)
+
+        try:
+            entrada = self._validar(entrada)
+            if entrada is None:
+                entrada = self._crear()
+        except Exception:
+            with self._cond:
+                self._en_uso -= 1
+                self._cond.notify()
+            raise
+        entrada.usos += 1
+        return ConexionAgrupada(self, entrada)
+
+    def _validar(self, entrada):
+        """Devuelve la entrada si sigue siendo utilizable, o None si hay que abrir otra"""
+        if entrada is None:
+            return None
+        ahora = time.monotonic()
+        if self._expirada(entrada, ahora):
+            self._cerrar(entrada)
+            with self._cond:
+                self._stats['recicladas'] += 1
+            return None
+        if ahora - entrada.ultimo_uso >= self.ping_tras and not self._esta_viva(entrada.conexion):
+            self._cerrar(entrada)
+            with self._cond:
+                self._stats['descartadas'] += 1
+            logger.warning(f"Conexión caída descartada del pool {self.nombre}")
+            return None
+        return entrada
+
+    def devolver(self, entrada):
+        """Recibe una conexión prestada; deshace transacciones abiertas antes de reutilizarla"""
+        conservar = True
+        if self._pid != os.getpid():
+            # Conexión de antes de un fork: el socket pertenece al proceso padre
+            return
+        if entrada.generacion != self._generacion:
+            self._cerrar(entrada)
+            return
+        try:
+            if getattr(entrada.conexion, 'in_transaction', False):
+                entrada.conexion.rollback()
+        except Exception as e:
+            logger.warning(f"Conexión descartada al devolverla al pool {self.nombre}: {e}")
+            conservar = False
+        ahora = time.monotonic()
+        if conservar and self._expirada(entrada, ahora):
+            conservar = False
+            with self._cond:
+                self._stats['recicladas'] += 1
+        if not conservar:
+            self._cerrar(entrada)
+        entrada.ultimo_uso = ahora
+        with self._cond:
+            if entrada.generacion != self._generacion:
+                if conservar:
+                    self._cerrar(entrada)
+                return
+            self._en_uso -= 1
+            if conservar:
+                self._inactivas.append(entrada)
+            self._cond.notify()
+
+    def descartar(self, entrada):
+        """Cierra una conexión prestada que no puede volver al pool y libera su lugar"""
+        self._cerrar(entrada)
+        if self._pid != os.getpid():
+            return
+        with self._cond:
+            if entrada.generacion != self._generacion:
+                return
+            self._en_uso -= 1
+            self._stats['descartadas'] += 1
+            self._cond.notify()
+
+    def cerrar_todas(self):
+        """Cierra las conexiones inactivas; las prestadas se cierran al devolverse"""
+        with self._cond:
+            inactivas = list(self._inactivas)
+            self._inactivas.clear()
+            self._generacion += 1
+            self._en_uso = 0
+            self._precalentado = False
+            self._cond.notify_all()
+        for entrada in inactivas:
+            self._cerrar(entrada)
+
+    def estadisticas(self):
+        """Métricas del pool: conexiones en uso, inactivas y tiempos de espera"""
+        with self._cond:
+            stats = dict(self._stats)
+            en_uso = self._en_uso
+            inactivas = len(self._inactivas)
+        prestamos = stats['prestamos']
+        return {
+            'nombre': self.nombre,
+            'en_uso': en_uso,
+            'inactivas': inactivas,
+            'maximo': self.maximo,
+            'prestamos': prestamos,
+            'creadas': stats['creadas'],
+            'recicladas': stats['recicladas'],
+            'descartadas': stats['descartadas'],
+            'esperas': stats['esperas'],
+            'timeouts': stats['timeouts'],
+            'espera_promedio_ms': round(stats['espera_total'] * 1000 / prestamos, 3) if prestamos else 0.0,
+            'espera_max_ms': round(stats['espera_max'] * 1000, 3),
+        }
+
+
+class ConjuntoReplicas:
+    """Pools de las réplicas de lectura, usadas por turno y salteando las que no están sanas.
+
+    Una réplica que no acepta conexiones queda fuera `pausa` segundos. Con `retraso_max` > 0, cada
+    `revision` segundos se mide su atraso con SHOW REPLICA STATUS sobre la conexión prestada y
+    queda fuera hasta la próxima medición si lo supera o si la replicación está detenida. Si no se
+    puede medir (sin permiso REPLICATION CLIENT o una copia que no replica) sólo se vigila la
+    conexión. obtener() devuelve None cuando ninguna está sana: la lectura va al primario.
+
+    Un pool de réplica agotado no es una réplica caída: se espera por él como mucho `espera`
+    segundos y, si sigue lleno, esa lectura pasa a la réplica siguiente o al primario sin sacarla
+    de turno.
+    """
+
+    def __init__(self, pools, pausa=30.0, retraso_max=5.0, revision=10.0, espera=0.05):
+        self.pools = list(pools)
+        self.pausa = pausa
+        self.espera = espera
+        self.retraso_max = retraso_max
+        self.revision = revision
+        self._lock = threading.Lock()
+        self._turno = itertools.count()
+        self._estado = {pool.nombre: {'fuera_hasta': 0.0, 'motivo': None, 'medida_en': None, 'medible': True,
+                                      'retraso': None, 'lecturas': 0, 'fallos': 0, 'agotada': 0}
+                        for pool in self.pools}
+
+    def __len__(self):
+        return len(self.pools)
+
+    def _sacar(self, pool, motivo, duracion):
+        estado = self._estado[pool.nombre]
+        with self._lock:
+            estado['fuera_hasta'] = time.monotonic() + duracion
+            estado['motivo'] = motivo
+            estado['fallos'] += 1
+        logger.warning(f"Réplica {pool.nombre} fuera de turno por {duracion:g} s: {motivo}")
+
+    def _toca_medir(self, estado, ahora):
+        # Una sola petición por intervalo mide; las demás usan la última medición
+        with self._lock:
+            if not estado['medible'] or (estado['medida_en'] is not None and ahora - estado['medida_en'] < self.revision):
+                return False
+            estado['medida_en'] = ahora
+            return True
+
+    def _medir_retraso(self, pool, conexion):
+        """True si la réplica está al día (o no se puede medir); False si queda fuera de turno"""
+        estado = self._estado[pool.nombre]
+        try:
+            cursor = conexion.cursor(dictionary=True)
+            try:
+                cursor.execute("SHOW REPLICA STATUS")
+                fila = cursor.fetchone()
+            finally:
+                cursor.close()
+        except Exception as e:
+            estado['medible'] = False
+            logger.warning(f"No se puede medir el atraso de la réplica {pool.nombre}; sólo se vigila la conexión: {e}")
+            return True
+        if fila is None:
+            return True
+        retraso = fila.get('Seconds_Behind_Source')
+        estado['retraso'] = retraso
+        if retraso is None or retraso > self.retraso_max:
+            self._sacar(pool, "replicación detenida" if retraso is None else f"atraso de {retraso} s", self.revision)
+            return False
+        return True
+
+    def obtener(self):
+        """Conexión de la próxima réplica sana, o None si no hay ninguna"""
+        ahora = time.monotonic()
+        inicio = next(self._turno)
+        for i in range(len(self.pools)):
+            pool = self.pools[(inicio + i) % len(self.pools)]
+            estado = self._estado[pool.nombre]
+            if estado['fuera_hasta'] > ahora:
+                continue
+            try:
+                conexion = pool.obtener(timeout=self.espera)
+            except errors.PoolError:
+                with self._lock:
+                    estado['agotada'] += 1
+                continue
+            except Exception as e:
+                self._sacar(pool, f"sin conexión: {e}", self.pausa)
+                continue
+            if self.retraso_max and self._toca_medir(estado, ahora) and not self._medir_retraso(pool, conexion):
+                conexion.close()
+                continue
+            with self._lock:
+                estado['lecturas'] += 1
+            return conexion
+        return None
+
+    def cerrar_todas(self):
+        for pool in self.pools:
+            pool.cerrar_todas()
+
+    def estadisticas(self):
+        """Estado de cada réplica (sana o no y por qué, atraso medido, lecturas) y las métricas de su pool"""
+        ahora = time.monotonic()
+        with self._lock:
+            estados = {nombre: dict(estado) for nombre, estado in self._estado.items()}
+        return {
+            pool.nombre: {
+                'sana': estados[pool.nombre]['fuera_hasta'] <= ahora,
+                'motivo': estados[pool.nombre]['motivo'] if estados[pool.nombre]['fuera_hasta'] > ahora else None,
+                'retraso': estados[pool.nombre]['retraso'],
+                'lecturas': estados[pool.nombre]['lecturas'],
+                'fallos': estados[pool.nombre]['fallos'],
+                'agotada': estados[pool.nombre]['agotada'],
+                'pool': pool.estadisticas(),
+            }
+            for pool in self.pools
+        }
+
+
+def _reiniciar_pools_tras_fork():
+    for pool in list(_pools):
+        pool._reiniciar_estado()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reiniciar_pools_tras_fork)
@@ -0,0 +1,131 @@
+from datetime import date, datetime, timedelta
+from decimal import Decimal, ROUND_DOWN, ROUND_HALF_UP
+
+CENTAVOS = Decimal('0.01')
+AGRUPACIONES = ('dia', 'mes', 'tipo')
+# Columnas acumuladas por (fecha, tipo) en la tabla resumen_diario
+COLUMNAS = ('noches', 'ingresos', 'llegadas', 'anticipos', 'pagos')
+# Un reporte por día no devuelve más de diez años de filas
+MAX_DIAS = 3660
+# Estados de reserva que ocupan noches y suman ingresos
+ESTADOS_VENDIDOS = ('confirmada', 'ocupada', 'finalizada')
+
+
+def como_fecha(valor):
+    """Fecha (date) de un datetime o de una fecha"""
+    return valor.date() if isinstance(valor, datetime) else valor
+
+
+def _vacio():
+    return {'noches': 0, 'ingresos': Decimal('0'), 'llegadas': 0, 'anticipos': Decimal('0'), 'pagos': Decimal('0')}
+
+
+def noches(fecha_entrada, fecha_salida):
+    """Fechas de las noches de una estadía: del día de entrada al anterior a la salida (al menos una)"""
+    entrada = como_fecha(fecha_entrada)
+    cantidad = max(1, (como_fecha(fecha_salida) - entrada).days)
+    return [entrada + timedelta(days=i) for i in range(cantidad)]
+
+
+def aportes_reserva(tipo, fecha_entrada, fecha_salida, monto, signo=1):
+    """Filas (fecha, tipo, noches, ingresos, llegadas, anticipos, pagos) que una reserva suma al resumen.
+
+    El monto se reparte en partes iguales por noche y los centavos que sobran van a la última, así
+    que la suma por fecha coincide con el monto. Con signo=-1 se descuenta (cancelación o extensión).
+    """
+    fechas = noches(fecha_entrada, fecha_salida)
+    monto = Decimal(str(monto))
+    por_noche = (monto / len(fechas)).quantize(CENTAVOS, ROUND_DOWN)
+    resto = monto - por_noche * len(fechas)
+    aportes = []
+    for i, fecha in enumerate(fechas):
+        ingreso = por_noche + resto if i == len(fechas) - 1 else por_noche
+        aportes.append((fecha, tipo, signo, signo * ingreso, signo if i == 0 else 0, 0, 0))
+    return aportes
+
+
+def aporte_cobro(tipo, momento, monto, columna='anticipos'):
+    """Fila del resumen para un anticipo o pago cobrado en `momento`"""
+    monto = Decimal(str(monto))
+    return (como_fecha(momento), tipo, 0, 0, 0,
+            monto if columna == 'anticipos' else 0, monto if columna == 'pagos' else 0)
+
+
+def sumar(aportes, acumulado=None):
+    """Acumula aportes en {(fecha, tipo): [noches, ingresos, llegadas, anticipos, pagos]}"""
+    acumulado = {} if acumulado is None else acumulado
+    for fecha, tipo, *valores in aportes:
+        fila = acumulado.setdefault((fecha, tipo), list(_vacio().values()))
+        for i, valor in enumerate(valores):
+            fila[i] += valor
+    return acumulado
+
+
+def _dias_por_mes(desde, hasta):
+    dias = {}
+    fecha = desde
+    while fecha < hasta:
+        mes = fecha.replace(day=1)
+        siguiente = (mes + timedelta(days=32)).replace(day=1)
+        dias[mes] = (min(siguiente, hasta) - fecha).days
+        fecha = siguiente
+    return dias
+
+
+def _indicadores(grupo, disponibles):
+    """Ocupación (%), ADR (ingreso por noche vendida) y RevPAR (ingreso por noche disponible)"""
+    noches_vendidas = grupo['noches']
+    ingresos = grupo['ingresos']
+    grupo['disponibles'] = disponibles
+    grupo['ocupacion'] = round(100 * noches_vendidas / disponibles, 2) if disponibles else None
+    grupo['adr'] = (ingresos / noches_vendidas).quantize(CENTAVOS, ROUND_HALF_UP) if noches_vendidas else None
+    grupo['revpar'] = (ingresos / disponibles).quantize(CENTAVOS, ROUND_HALF_UP) if disponibles else None
+    return grupo
+
+
+def resumir(filas, habitaciones_por_tipo, desde, hasta, agrupacion='dia'):
+    """Agrupa filas del resumen diario por día, mes o tipo de habitación y calcula los indicadores.
+
+    `filas` son diccionarios con fecha, tipo y las COLUMNAS; [desde, hasta) son fechas. Las noches
+    disponibles se calculan con la cantidad actual de habitaciones de cada tipo.
+    """
+    if agrupacion not in AGRUPACIONES:
+        raise ValueError(f"Agrupación desconocida: {agrupacion}")
+    desde, hasta = como_fecha(desde), como_fecha(hasta)
+    total_dias = (hasta - desde).days
+    if total_dias <= 0 or total_dias > MAX_DIAS:
+        raise ValueError(f"El rango debe tener entre 1 y {MAX_DIAS} días")
+    inventario = sum(habitaciones_por_tipo.values())
+
+    if agrupacion == 'dia':
+        claves = {desde + timedelta(days=i): inventario for i in range(total_dias)}
+        clave_de = lambda fila: fila['fecha']
+    elif agrupacion == 'mes':
+        claves = {mes: inventario * dias for mes, dias in _dias_por_mes(desde, hasta).items()}
+        clave_de = lambda fila: fila['fecha'].replace(day=1)
+    else:
+        claves = {tipo: cantidad * total_dias for tipo, cantidad in sorted(habitaciones_por_tipo.items())}
+        clave_de = lambda fila: fila['tipo']
+
+    grupos = {clave: _vacio() for clave in claves}
+    total = _vacio()
+    for fila in filas:
+        clave = clave_de(fila)
+        grupo = grupos.get(clave)
+        if grupo is None:
+            grupo = grupos[clave] = _vacio()
+        for columna in COLUMNAS:
+            grupo[columna] += fila[columna]
+            total[columna] += fila[columna]
+
+    resultado = []
+    for clave, grupo in grupos.items():
+        grupo[agrupacion] = clave.isoformat() if isinstance(clave, date) else clave
+        resultado.append(_indicadores(grupo, claves.get(clave, 0)))
+    return {
+        'desde': desde.isoformat(),
+        'hasta': hasta.isoformat(),
+        'agrupacion': agrupacion,
+        'filas': resultado,
+        'total': _indicadores(total, inventario * total_dias),
+    }
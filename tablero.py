@@ -0,0 +1,219 @@
+from collections import deque
+from datetime import date, datetime
+from decimal import Decimal
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+import database
+
+logger = logging.getLogger(__name__)
+
+# Segundos entre lecturas de la tabla cambios mientras haya al menos una pantalla conectada
+INTERVALO = float(os.environ.get('TABLERO_INTERVALO', 2))
+# Eventos recientes que se reenvían a una pantalla que se reconecta con Last-Event-ID
+MEMORIA = int(os.environ.get('TABLERO_MEMORIA', 500))
+# Cambios leídos por consulta; si hay más, la siguiente vuelta sigue desde el último
+LOTE = int(os.environ.get('TABLERO_LOTE', 500))
+# Espera por un id salteado: una transacción que tomó ese id puede no haber confirmado todavía
+ESPERA_HUECO = float(os.environ.get('TABLERO_ESPERA_HUECO', 5))
+# Duración de cada conexión SSE; el navegador se reconecta solo y no se retiene un worker para siempre
+DURACION = float(os.environ.get('TABLERO_DURACION', 300))
+# Comentario periódico para que proxies y navegador no den la conexión por muerta
+LATIDO = float(os.environ.get('TABLERO_LATIDO', 15))
+RECONEXION_MS = 3000
+
+
+def _a_json(valor):
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    if isinstance(valor, Decimal):
+        return str(valor)
+    raise TypeError(f"No se puede serializar {type(valor).__name__}")
+
+
+def texto_sse(evento):
+    """Un evento en formato text/event-stream; el id es el último cambio que incluye"""
+    datos = json.dumps(evento['datos'], default=_a_json, ensure_ascii=False)
+    return f"id: {evento['id']}\nevent: {evento['tipo']}\ndata: {datos}\n\n"
+
+
+class Difusor:
+    """Lee la tabla cambios una vez por intervalo y reparte los cambios a todas las pantallas conectadas.
+
+    Un solo hilo por proceso consulta `id > último leído` (el recorrido por clave primaria no crece
+    con la tabla) y sólo mientras haya suscriptores; cada pantalla tiene su cola y recibe el mismo
+    evento. Los últimos MEMORIA eventos se guardan para reenviar a quien se reconecta con
+    Last-Event-ID; si se perdió más que eso, recibe 'reinicio' y vuelve a cargar la página.
+
+    Los ids de AUTO_INCREMENT se toman al insertar pero se ven al confirmar: un id salteado puede
+    ser de una transacción en curso. La lectura se detiene antes del hueco hasta ESPERA_HUECO
+    segundos; pasado ese plazo se da por una transacción descartada.
+    """
+
+    def __init__(self, intervalo=INTERVALO, memoria=MEMORIA):
+        self.intervalo = intervalo
+        self._suscriptores = set()
+        self._recientes = deque(maxlen=memoria)
+        self._condicion = threading.Condition()
+        self._ultimo = None
+        self._hueco = None
+        self._hilo = None
+        self._detenido = False
+        self.consultas = 0
+        self.eventos = 0
+
+    def _hasta_sin_huecos(self, ids):
+        """Último id que se puede dar por leído sin saltear una transacción que no confirmó"""
+        esperado = self._ultimo + 1
+        for id_cambio in ids:
+            if id_cambio != esperado:
+                if self._hueco is None or self._hueco[0] != esperado:
+                    self._hueco = (esperado, time.monotonic())
+                if time.monotonic() - self._hueco[1] < ESPERA_HUECO:
+                    return esperado - 1
+            esperado = id_cambio + 1
+        return esperado - 1
+
+    def revisar(self):
+        """Una lectura de la tabla cambios; devuelve el evento repartido o None si no hubo cambios"""
+        if self._ultimo is None:
+            ultimo = database.ultimo_cambio()
+            if ultimo is None:
+                return None
+            with self._condicion:
+                if self._ultimo is None:
+                    self._ultimo = ultimo
+        lectura = database.leer_cambios(self._ultimo, LOTE)
+        self.consultas += 1
+        if not lectura or not lectura['ids']:
+            return None
+        hasta = self._hasta_sin_huecos(lectura['ids'])
+        cambios = [cambio for cambio in lectura['cambios'] if cambio['id'] <= hasta]
+        if hasta == self._ultimo:
+            return None
+        evento = {'id': hasta, 'previo': self._ultimo, 'tipo': 'cambios', 'datos': cambios}
+        with self._condicion:
+            self._ultimo = hasta
+            self._recientes.append(evento)
+            colas = list(self._suscriptores)
+        for cola in colas:
+            cola.put(evento)
+        self.eventos += 1
+        return evento
+
+    def suscribir(self, desde=None):
+        """Cola de eventos para una pantalla y los eventos a enviarle primero.
+
+        Sin `desde` recibe un 'inicio' con el último id; con `desde` (Last-Event-ID) recibe los
+        eventos que se perdió, o un 'reinicio' si ya no están en memoria.
+        """
+        if self._ultimo is None:
+            ultimo = database.ultimo_cambio()
+            with self._condicion:
+                if self._ultimo is None and ultimo is not None:
+                    self._ultimo = ultimo
+        cola = queue.Queue()
+        with self._condicion:
+            self._suscriptores.add(cola)
+            if len(self._suscriptores) == 1:
+                # La primera pantalla despierta al hilo, que dormía sin consultar
+                self._condicion.notify_all()
+            ultimo = self._ultimo or 0
+            if desde is None:
+                pendientes = [{'id': ultimo, 'tipo': 'inicio', 'datos': {}}]
+            elif desde >= ultimo:
+                pendientes = []
+            elif self._recientes and self._recientes[0]['previo'] <= desde:
+                pendientes = [evento for evento in self._recientes if evento['id'] > desde]
+            else:
+                pendientes = [{'id': ultimo, 'tipo': 'reinicio', 'datos': {}}]
+        self.iniciar()
+        return cola, pendientes
+
+    def desuscribir(self, cola):
+        with self._condicion:
+            self._suscriptores.discard(cola)
+
+    def flujo(self, desde=None, duracion=DURACION):
+        """Texto SSE para una pantalla hasta `duracion` segundos; se desuscribe al cerrarse la conexión"""
+        cola, pendientes = self.suscribir(desde)
+        try:
+            yield f"retry: {RECONEXION_MS}\n\n"
+            for evento in pendientes:
+                yield texto_sse(evento)
+            fin = time.monotonic() + duracion
+            while time.monotonic() < fin:
+                try:
+                    evento = cola.get(timeout=max(min(LATIDO, fin - time.monotonic()), 0))
+                except queue.Empty:
+                    yield ": latido\n\n"
+                    continue
+                yield texto_sse(evento)
+        finally:
+            self.desuscribir(cola)
+
+    def bucle(self):
+        while True:
+            with self._condicion:
+                # Sin pantallas conectadas no se consulta la base
+                while not self._suscriptores and not self._detenido:
+                    self._condicion.wait()
+                if self._detenido:
+                    return
+            try:
+                self.revisar()
+            except Exception:
+                logger.exception("Error al leer los cambios para el tablero")
+            with self._condicion:
+                if not self._detenido:
+                    self._condicion.wait(self.intervalo)
+
+    def iniciar(self):
+        with self._condicion:
+            if self._hilo and self._hilo.is_alive():
+                return
+            self._detenido = False
+            self._hilo = threading.Thread(target=self.bucle, name='tablero', daemon=True)
+            self._hilo.start()
+
+    def detener(self, timeout=5):
+        with self._condicion:
+            self._detenido = True
+            self._condicion.notify_all()
+        if self._hilo and self._hilo is not threading.current_thread():
+            self._hilo.join(timeout)
+
+    def estado(self):
+        return {
+            'activo': bool(self._hilo and self._hilo.is_alive()),
+            'suscriptores': len(self._suscriptores),
+            'ultimo': self._ultimo,
+            'consultas': self.consultas,
+            'eventos': self.eventos,
+        }
+
+
+_difusor = None
+_pid = None
+_lock = threading.Lock()
+
+def difusor_del_proceso():
+    """El difusor de este proceso (uno nuevo en cada worker después de un fork)"""
+    global _difusor, _pid
+    if _difusor is not None and _pid == os.getpid():
+        return _difusor
+    with _lock:
+        if _difusor is None or _pid != os.getpid():
+            _difusor = Difusor()
+            _pid = os.getpid()
+    return _difusor
+
+def estado():
+    """Estado del difusor de este proceso, o None si no se creó aquí"""
+    if _difusor is None or _pid != os.getpid():
+        return None
+    return _difusor.estado()
@@ -0,0 +1,193 @@
+from datetime import date, datetime, timedelta
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from itertools import accumulate
+import calendar
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+CENTAVOS = Decimal('0.01')
+DIAS_SEMANA = ('lunes', 'martes', 'miercoles', 'jueves', 'viernes', 'sabado', 'domingo')
+
+
+def _decimal(valor, campo):
+    if valor is None or valor == '':
+        return None
+    try:
+        numero = Decimal(str(valor))
+    except InvalidOperation:
+        raise ValueError(f"{campo} no es un número: {valor!r}")
+    if not numero.is_finite():
+        raise ValueError(f"{campo} no es un número: {valor!r}")
+    return numero
+
+
+def _fecha(valor, campo):
+    if valor is None or valor == '':
+        return None
+    if isinstance(valor, datetime):
+        return valor.date()
+    if isinstance(valor, date):
+        return valor
+    try:
+        return date.fromisoformat(str(valor))
+    except ValueError:
+        raise ValueError(f"{campo} debe tener formato AAAA-MM-DD: {valor!r}")
+
+
+def _dias_semana(valor):
+    """Conjunto de días (0 = lunes) desde '4,5', 'viernes,sabado' o una lista; None es todos"""
+    if valor is None or valor == '' or valor == []:
+        return None
+    partes = valor.split(',') if isinstance(valor, str) else valor
+    dias = set()
+    for parte in partes:
+        parte = str(parte).strip().lower().replace('é', 'e').replace('á', 'a')
+        if parte.isdigit() and int(parte) < 7:
+            dias.add(int(parte))
+        elif parte in DIAS_SEMANA:
+            dias.add(DIAS_SEMANA.index(parte))
+        else:
+            raise ValueError(f"Día de la semana inválido: {parte!r}")
+    return frozenset(dias)
+
+
+def leer_regla(datos):
+    """Normaliza una regla de precio por noche (fila de `tarifas` o elemento del JSON); lanza ValueError"""
+    regla = {
+        'id': datos.get('id'),
+        'nombre': (datos.get('nombre') or '').strip(),
+        'tipo': (datos.get('tipo') or '').strip() or None,
+        'desde': _fecha(datos.get('desde'), 'desde'),
+        'hasta': _fecha(datos.get('hasta'), 'hasta'),
+        'dias_semana': _dias_semana(datos.get('dias_semana')),
+        'precio': _decimal(datos.get('precio'), 'precio'),
+        'factor': _decimal(datos.get('factor'), 'factor'),
+        'prioridad': int(datos.get('prioridad') or 0),
+    }
+    if not regla['nombre']:
+        raise ValueError("Cada regla necesita un nombre")
+    if regla['precio'] is None and regla['factor'] is None:
+        raise ValueError(f"La regla {regla['nombre']!r} necesita precio o factor")
+    if (regla['precio'] is not None and regla['precio'] < 0) or (regla['factor'] is not None and regla['factor'] < 0):
+        raise ValueError(f"La regla {regla['nombre']!r} tiene un precio o factor negativo")
+    if regla['desde'] and regla['hasta'] and regla['hasta'] <= regla['desde']:
+        raise ValueError(f"La regla {regla['nombre']!r} termina antes de empezar")
+    return regla
+
+
+def leer_descuento(datos):
+    """Normaliza un descuento por duración de estadía; lanza ValueError"""
+    descuento = {
+        'tipo': (datos.get('tipo') or '').strip() or None,
+        'noches_minimas': int(datos.get('noches_minimas') or 0),
+        'porcentaje': _decimal(datos.get('porcentaje'), 'porcentaje'),
+    }
+    if descuento['noches_minimas'] < 1:
+        raise ValueError("noches_minimas debe ser al menos 1")
+    if descuento['porcentaje'] is None or not (0 <= descuento['porcentaje'] <= 100):
+        raise ValueError("porcentaje debe estar entre 0 y 100")
+    return descuento
+
+
+def texto_dias_semana(dias):
+    return ','.join(str(dia) for dia in sorted(dias)) if dias else None
+
+
+class TablaTarifas:
+    """Reglas de precio por noche y descuentos por estadía, compiladas en arreglos de centavos.
+
+    Las reglas que coinciden con una noche (tipo, temporada [desde, hasta) y día de la semana) se
+    aplican por prioridad: la que tiene precio reemplaza el precio vigente y la que tiene factor lo
+    multiplica, así que una temporada alta y un recargo de fin de semana se combinan. El precio de
+    cada noche se redondea a centavos.
+
+    Cada (tipo, precio base, año) se compila una sola vez en la suma acumulada de los precios por
+    noche en centavos enteros: el subtotal de cualquier estadía es una resta, sin recorrer noches,
+    y todas las habitaciones con el mismo tipo y precio base comparten el resultado.
+    """
+
+    def __init__(self, reglas=(), descuentos=()):
+        self.reglas = sorted(reglas, key=lambda r: (r['prioridad'], r['id'] or 0))
+        self.descuentos = list(descuentos)
+        self._lock = threading.Lock()
+        self._acumulados = {}
+
+    def __len__(self):
+        return len(self.reglas) + len(self.descuentos)
+
+    def precio_noche(self, tipo, precio_base, fecha):
+        precio = Decimal(str(precio_base))
+        dia = fecha.weekday()
+        for regla in self.reglas:
+            if ((regla['tipo'] is None or regla['tipo'] == tipo)
+                    and (regla['desde'] is None or fecha >= regla['desde'])
+                    and (regla['hasta'] is None or fecha < regla['hasta'])
+                    and (regla['dias_semana'] is None or dia in regla['dias_semana'])):
+                if regla['precio'] is not None:
+                    precio = regla['precio']
+                if regla['factor'] is not None:
+                    precio *= regla['factor']
+        return precio.quantize(CENTAVOS, ROUND_HALF_UP)
+
+    def _acumulado(self, tipo, precio_base, anio):
+        clave = (tipo, precio_base, anio)
+        acumulado = self._acumulados.get(clave)
+        if acumulado is None:
+            inicio = date(anio, 1, 1)
+            dias = 366 if calendar.isleap(anio) else 365
+            centavos = (int(self.precio_noche(tipo, precio_base, inicio + timedelta(days=i)) * 100)
+                        for i in range(dias))
+            acumulado = [0, *accumulate(centavos)]
+            with self._lock:
+                self._acumulados[clave] = acumulado
+        return acumulado
+
+    def subtotal(self, tipo, precio_base, primera_noche, noches):
+        """Suma exacta de los precios de `noches` noches desde `primera_noche`"""
+        precio_base = Decimal(str(precio_base))
+        total = 0
+        fecha = primera_noche
+        while noches > 0:
+            acumulado = self._acumulado(tipo, precio_base, fecha.year)
+            inicio = fecha.timetuple().tm_yday - 1
+            tramo = min(noches, len(acumulado) - 1 - inicio)
+            total += acumulado[inicio + tramo] - acumulado[inicio]
+            fecha += timedelta(days=tramo)
+            noches -= tramo
+        return Decimal(total).scaleb(-2)
+
+    def porcentaje_descuento(self, tipo, noches):
+        """El mayor descuento por duración que alcanza la estadía"""
+        return max((d['porcentaje'] for d in self.descuentos
+                    if d['noches_minimas'] <= noches and (d['tipo'] is None or d['tipo'] == tipo)),
+                   default=Decimal('0'))
+
+    def cotizar(self, tipo, precio_base, fecha_entrada, noches):
+        """Cotización de una estadía: subtotal por noches, descuento por duración y total en Decimal"""
+        primera_noche = fecha_entrada.date() if isinstance(fecha_entrada, datetime) else fecha_entrada
+        subtotal = self.subtotal(tipo, precio_base, primera_noche, noches)
+        porcentaje = self.porcentaje_descuento(tipo, noches)
+        descuento = (subtotal * porcentaje / 100).quantize(CENTAVOS, ROUND_HALF_UP)
+        total = subtotal - descuento
+        return {
+            'noches': noches,
+            'subtotal': subtotal,
+            'porcentaje_descuento': porcentaje,
+            'descuento': descuento,
+            'monto_total': total,
+            'precio_promedio': (total / noches).quantize(CENTAVOS, ROUND_HALF_UP),
+        }
+
+    def cotizar_habitaciones(self, habitaciones, fecha_entrada, noches):
+        """Copias de las habitaciones con su cotización; se calcula una vez por (tipo, precio base)"""
+        cotizaciones = {}
+        resultado = []
+        for habitacion in habitaciones:
+            clave = (habitacion['tipo'], Decimal(str(habitacion['precio_por_noche'])))
+            cotizacion = cotizaciones.get(clave)
+            if cotizacion is None:
+                cotizacion = cotizaciones[clave] = self.cotizar(*clave, fecha_entrada, noches)
+            resultado.append({**habitacion, **cotizacion})
+        return resultado